@@ -0,0 +1,174 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Ollama Simulado (Benchmarks)
+# benchmarks/mock_ollama.py
+# -----------------------------------------------------------------
+#
+# Servidor HTTP que responde como o Ollama ('/api/chat', '/api/tags' e '/api/ps'),
+# com latência e velocidade de geração configuráveis. As respostas são
+# determinísticas: mesmo pedido, mesma resposta, mesmo tempo.
+#
+#   latência de um pedido = latency_ms + completion_tokens / tokens_per_s
+#
+# Como o Ollama real (OLLAMA_NUM_PARALLEL), só 'parallel' pedidos são
+# atendidos ao mesmo tempo; os outros esperam na fila.
+#
+# Para usar sozinho (ex: com a API apontando para ele):
+# python benchmarks/mock_ollama.py --port 11500 --latency-ms 50 --tokens-per-s 200
+# ATOMIC_OLLAMA_HOST=http://localhost:11500 uvicorn core.main_api:app
+#
+# -----------------------------------------------------------------
+
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOllamaConfig:
+    def __init__(self, latency_ms: float = 50, tokens_per_s: float = 200,
+                 completion_tokens: int = 32, parallel: int = 4):
+        self.latency_ms = latency_ms
+        self.tokens_per_s = tokens_per_s
+        self.completion_tokens = completion_tokens
+        self.parallel = parallel
+
+
+def _completion(completion_tokens: int):
+    """Resposta fixa em JSON (serve para agentes 'json' e 'text'), em pedaços."""
+    words = ["tok"] * completion_tokens
+    pieces = ['{"text": "'] + [word + " " for word in words] + ['"}']
+    return pieces
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "MockOllama/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # sem log por pedido (atrapalharia as medições)
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/api/tags", "/api/ps"):
+            self._send_json({"models": []})
+        elif self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config: MockOllamaConfig = self.server.config
+        model = request.get("model", "mock")
+        prompt_chars = sum(len(m.get("content", "")) for m in request.get("messages", []))
+        pieces = _completion(config.completion_tokens)
+        token_delay = 1.0 / config.tokens_per_s if config.tokens_per_s else 0.0
+
+        with self.server.slots:
+            started = time.perf_counter()
+            time.sleep(config.latency_ms / 1000)
+            final = {
+                "model": model,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": prompt_chars // 4,
+                "eval_count": config.completion_tokens,
+            }
+
+            if request.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for piece in pieces:
+                    if piece.startswith("tok"):
+                        time.sleep(token_delay)
+                    self._write_chunk({
+                        "model": model, "created_at": final["created_at"],
+                        "message": {"role": "assistant", "content": piece}, "done": False,
+                    })
+                self._finish_timings(final, started, config)
+                self._write_chunk({**final, "message": {"role": "assistant", "content": ""}})
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(token_delay * config.completion_tokens)
+                self._finish_timings(final, started, config)
+                self._send_json({**final, "message": {"role": "assistant", "content": "".join(pieces)}})
+
+    def _finish_timings(self, final: dict, started: float, config: MockOllamaConfig):
+        total_ns = int((time.perf_counter() - started) * 1e9)
+        final["total_duration"] = total_ns
+        final["eval_duration"] = max(1, total_ns - int(config.latency_ms * 1e6))
+
+    def _write_chunk(self, payload: dict):
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockOllamaServer:
+    """Servidor em uma thread; 'url' é o valor para ATOMIC_OLLAMA_HOST."""
+
+    def __init__(self, config: MockOllamaConfig, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), MockOllamaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config
+        self.httpd.slots = threading.BoundedSemaphore(max(1, config.parallel))
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama simulado para benchmarks do AtomicEngine.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latência até o primeiro token.")
+    parser.add_argument("--tokens-per-s", type=float, default=200, help="Velocidade de geração.")
+    parser.add_argument("--completion-tokens", type=int, default=32, help="Tokens gerados por resposta.")
+    parser.add_argument("--parallel", type=int, default=4, help="Pedidos atendidos ao mesmo tempo.")
+    args = parser.parse_args()
+
+    config = MockOllamaConfig(args.latency_ms, args.tokens_per_s, args.completion_tokens, args.parallel)
+    server = MockOllamaServer(config, args.host, args.port)
+    print(f"✅ Ollama simulado em {server.url} "
+          f"(latência {args.latency_ms} ms, {args.tokens_per_s} tokens/s, {args.parallel} em paralelo)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
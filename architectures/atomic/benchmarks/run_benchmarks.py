@@ -0,0 +1,427 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Benchmarks do AtomicEngine
+# benchmarks/run_benchmarks.py
+# -----------------------------------------------------------------
+#
+# Mede o motor sem depender de serviços externos:
+# - Ollama: servidor simulado (benchmarks/mock_ollama.py);
+# - Ferramentas locais: os scripts de 'organisms/tools/' (já são
+#   simulações determinísticas);
+# - Neo4j: escrita simulada com latência fixa (--db-latency-ms).
+#
+# Cenários: 'proc_matricula_001' (a Molécula real) e Moléculas
+# sintéticas de profundidade (linear_dN) e largura (fanout_wN),
+# em vários níveis de concorrência.
+#
+# Relata p50/p95/p99, vazão e o overhead por passo (tempo do passo
+# menos o tempo nos backends e na fila do modelo, medido pelos spans
+# de 'core/tracing.py') e compara com 'benchmarks/baseline.json'.
+#
+# Para executar (na pasta 'architectures/atomic'):
+# python -m benchmarks.run_benchmarks
+# python -m benchmarks.run_benchmarks --update-baseline
+#
+# -----------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from benchmarks.mock_ollama import MockOllamaConfig, MockOllamaServer
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+SCENARIOS = ("proc_matricula_001", "linear_d4", "linear_d8", "fanout_w4", "fanout_w8")
+
+# Spans que são tempo de backend (não do motor); ver core/tracing.py
+BACKEND_SPANS = {"llm.call", "tool.spawn", "tool.io", "db.write"}
+
+
+# --- Moléculas e Organismos do benchmark ---
+
+BENCH_LLM_AGENT = {
+    "agent_id": "bench_llm",
+    "type": "llm_chat",
+    "output_schema": "json",
+    "llm_config": {
+        "model": "bench-model",
+        "system_prompt": "Você é um agente de benchmark.",
+        "cache": False,
+    },
+}
+
+
+def _ocr_step():
+    return {
+        "step": 1, "name": "leitura_OCR", "agent": "agent_OCR.yaml",
+        "input": "$.input_trigger.file_path", "output_variable": "raw_text",
+    }
+
+
+def _llm_step(number: int, name: str, input_spec, output_variable: str):
+    return {
+        "step": number, "name": name, "agent": "bench_llm.yaml",
+        "input": input_spec, "prompt": f"Processe a etapa {name}.",
+        "output_variable": output_variable,
+    }
+
+
+def linear_molecule(depth: int) -> dict:
+    """OCR seguido de 'depth' passos LLM em sequência."""
+    steps = [_ocr_step()]
+    for i in range(1, depth + 1):
+        previous = f"$.steps[{i - 1}].{steps[-1]['output_variable']}"
+        steps.append(_llm_step(i + 1, f"etapa_{i}", previous, f"saida_{i}"))
+    return {"chain_id": f"linear_d{depth}", "steps": steps}
+
+
+def fanout_molecule(width: int) -> dict:
+    """OCR, 'width' passos LLM independentes e um passo que junta tudo."""
+    steps = [_ocr_step()]
+    for i in range(1, width + 1):
+        steps.append(_llm_step(i + 1, f"ramo_{i}", "$.steps[0].raw_text", f"ramo_{i}"))
+    join_input = {f"ramo_{i}": f"$.steps[{i}].ramo_{i}" for i in range(1, width + 1)}
+    steps.append(_llm_step(width + 2, "juncao", join_input, "resultado"))
+    return {"chain_id": f"fanout_w{width}", "steps": steps}
+
+
+def prepare_workspace(workspace: str):
+    """
+    Copia as Moléculas/Organismos reais para 'workspace' (com os caches
+    do LLM, exato e semântico, desligados, para medir as chamadas) e
+    grava os sintéticos.
+    """
+    from core.atomic_engine import MOLECULES_DIR, ORGANISMS_DIR
+
+    molecules_dir = os.path.join(workspace, "molecules")
+    organisms_dir = os.path.join(workspace, "organisms")
+    os.makedirs(molecules_dir)
+    os.makedirs(organisms_dir)
+
+    shutil.copy(os.path.join(MOLECULES_DIR, "proc_matricula_001.yaml"), molecules_dir)
+    for name in os.listdir(ORGANISMS_DIR):
+        if not name.endswith(".yaml"):
+            continue
+        with open(os.path.join(ORGANISMS_DIR, name), "r", encoding="utf-8") as f:
+            agent = yaml.safe_load(f)
+        if agent.get("type") == "llm_chat":
+            agent["llm_config"]["cache"] = False
+            agent["llm_config"]["semantic_cache"] = False
+        with open(os.path.join(organisms_dir, name), "w", encoding="utf-8") as f:
+            yaml.safe_dump(agent, f, allow_unicode=True, sort_keys=False)
+
+    with open(os.path.join(organisms_dir, "bench_llm.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(BENCH_LLM_AGENT, f, allow_unicode=True, sort_keys=False)
+    for molecule in (linear_molecule(4), linear_molecule(8), fanout_molecule(4), fanout_molecule(8)):
+        with open(os.path.join(molecules_dir, f"{molecule['chain_id']}.yaml"), "w", encoding="utf-8") as f:
+            yaml.safe_dump(molecule, f, allow_unicode=True, sort_keys=False)
+    return molecules_dir, organisms_dir
+
+
+def install_mock_graph_db(engine, latency_ms: float):
+    """Troca as escritas no Neo4j por uma escrita simulada (latência fixa)."""
+    from core.tracing import span
+
+    def save(input_data):
+        with span("db.write", db="mock"):
+            time.sleep(latency_ms / 1000)
+        return {"status": "success", "node_id": "mock"}
+
+    async def asave(input_data):
+        with span("db.write", db="mock"):
+            await asyncio.sleep(latency_ms / 1000)
+        return {"status": "success", "node_id": "mock"}
+
+    engine._save_to_graph_db = save
+    engine._asave_to_graph_db = asave
+
+
+# --- Medição ---
+
+def percentile(values, p: float) -> float:
+    """Percentil com interpolação linear (p entre 0 e 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def step_timings(trace: dict):
+    """
+    Para cada span de passo, retorna (overhead_ms, fila_ms): a duração
+    do passo menos o tempo nos backends e na fila do semáforo do modelo.
+    """
+    children = {}
+    for s in trace["spans"]:
+        children.setdefault(s["parent_id"], []).append(s)
+
+    def backend_and_queue(span_id):
+        backend = queue = 0.0
+        for child in children.get(span_id, []):
+            duration = child["duration_ms"] or 0.0
+            if child["name"] in BACKEND_SPANS:
+                backend += duration
+            elif child["name"] == "llm.queue":
+                inner_backend, inner_queue = backend_and_queue(child["span_id"])
+                backend += inner_backend
+                queue += duration - inner_backend
+            else:
+                inner_backend, inner_queue = backend_and_queue(child["span_id"])
+                backend += inner_backend
+                queue += inner_queue
+        return backend, queue
+
+    timings = []
+    for s in trace["spans"]:
+        if s["name"].startswith("step:") and s["duration_ms"] is not None:
+            backend, queue = backend_and_queue(s["span_id"])
+            timings.append((max(0.0, s["duration_ms"] - backend - queue), queue))
+    return timings
+
+
+def summarize(latencies, wall_s, overheads, queues, errors):
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "runs": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "throughput_rps": round(len(latencies) / wall_s, 3) if wall_s else 0.0,
+        "step_overhead_ms_mean": round(sum(overheads) / len(overheads), 3) if overheads else None,
+        "step_overhead_ms_p95": round(percentile(overheads, 95), 3) if overheads else None,
+        "llm_queue_ms_mean": round(sum(queues) / len(queues), 3) if queues else None,
+    }
+
+
+def _collect(result, overheads, queues):
+    from core.tracing import trace_store
+
+    trace = trace_store.get(result.get("trace_id", ""))
+    if trace is not None:
+        for overhead, queue in step_timings(trace.to_dict()):
+            overheads.append(overhead)
+            queues.append(queue)
+    return 1 if "error" in result else 0
+
+
+def _trigger(chain_id: str, index: int) -> dict:
+    # Um arquivo diferente por execução: nada de coalescência entre execuções
+    return {"file_path": f"docs/bench_{chain_id}_{index:05d}.pdf", "force_refresh": False}
+
+
+async def run_async(engine, chain_id: str, iterations: int, concurrency: int, offset: int = 0):
+    limit = asyncio.Semaphore(concurrency)
+    latencies, overheads, queues = [], [], []
+    errors = 0
+
+    async def one(index: int):
+        nonlocal errors
+        async with limit:
+            started = time.perf_counter()
+            result = await engine.arun_chain(chain_id, _trigger(chain_id, offset + index))
+            latencies.append(time.perf_counter() - started)
+            errors += _collect(result, overheads, queues)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    return summarize(latencies, time.perf_counter() - started, overheads, queues, errors)
+
+
+def run_sync(engine, chain_id: str, iterations: int, concurrency: int, offset: int = 0):
+    latencies, overheads, queues = [], [], []
+
+    def one(index: int):
+        started = time.perf_counter()
+        result = engine.run_chain(chain_id, _trigger(chain_id, offset + index))
+        return time.perf_counter() - started, result
+
+    started = time.perf_counter()
+    errors = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, result in pool.map(one, range(iterations)):
+            latencies.append(latency)
+            errors += _collect(result, overheads, queues)
+    return summarize(latencies, time.perf_counter() - started, overheads, queues, errors)
+
+
+def run_plan(engine, plan, mode: str, iterations: int, warmup: int):
+    """
+    Executa cada (chave, cadeia, concorrência) do plano: aquecimento e
+    medição. No modo async tudo roda em um único event loop (os clientes
+    assíncronos do motor ficam presos ao loop em que foram usados).
+    """
+    async def run_all_async():
+        results, offset = {}, 0
+        for key, chain_id, concurrency in plan:
+            print(f"▶️ {key}")
+            await run_async(engine, chain_id, warmup, concurrency, offset)
+            results[key] = await run_async(engine, chain_id, iterations, concurrency, offset + warmup)
+            offset += warmup + iterations
+        return results
+
+    if mode == "async":
+        return asyncio.run(run_all_async())
+
+    results, offset = {}, 0
+    for key, chain_id, concurrency in plan:
+        print(f"▶️ {key}")
+        run_sync(engine, chain_id, warmup, concurrency, offset)
+        results[key] = run_sync(engine, chain_id, iterations, concurrency, offset + warmup)
+        offset += warmup + iterations
+    return results
+
+
+# --- Baseline ---
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float):
+    """Retorna as linhas de regressão (p95 mais alto ou vazão mais baixa que a tolerância)."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: vazão {previous['throughput_rps']} -> {current['throughput_rps']} cadeias/s"
+            )
+    return regressions
+
+
+def _delta(current, previous):
+    if not previous:
+        return ""
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def print_report(results: dict, baseline: dict):
+    header = (f"{'cenário':<32} {'n':>4} {'erros':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'cadeias/s':>10} {'overhead/passo ms':>18} {'fila ms':>8} {'Δp95':>6}")
+    print(header)
+    print("-" * len(header))
+    for key, r in results.items():
+        previous = baseline.get("results", {}).get(key, {})
+        overhead = r["step_overhead_ms_mean"]
+        queue = r["llm_queue_ms_mean"]
+        print(f"{key:<32} {r['runs']:>4} {r['errors']:>5} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['throughput_rps']:>10.2f} "
+              f"{overhead if overhead is not None else '-':>18} {queue if queue is not None else '-':>8} "
+              f"{_delta(r['p95_ms'], previous.get('p95_ms')):>6}")
+
+
+# --- Runner ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks determinísticos do AtomicEngine.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Cenários separados por vírgula.")
+    parser.add_argument("--concurrency", default="1,8", help="Níveis de concorrência (cadeias simultâneas).")
+    parser.add_argument("--iterations", type=int, default=30, help="Execuções medidas por cenário/nível.")
+    parser.add_argument("--warmup", type=int, default=3, help="Execuções de aquecimento (não medidas).")
+    parser.add_argument("--mode", choices=("async", "sync"), default="async",
+                        help="'async' = arun_chain (API); 'sync' = run_chain (threads).")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Ollama simulado: latência até o 1º token.")
+    parser.add_argument("--tokens-per-s", type=float, default=1000, help="Ollama simulado: tokens por segundo.")
+    parser.add_argument("--completion-tokens", type=int, default=16, help="Ollama simulado: tokens por resposta.")
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="Ollama simulado: pedidos em paralelo.")
+    parser.add_argument("--db-latency-ms", type=float, default=5, help="Latência da escrita simulada no Neo4j.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Grava os resultados como novo baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Variação aceita antes de acusar regressão.")
+    parser.add_argument("--output", help="Grava os resultados (JSON) neste arquivo.")
+    args = parser.parse_args()
+
+    settings = {
+        "mode": args.mode,
+        "iterations": args.iterations,
+        "latency_ms": args.latency_ms,
+        "tokens_per_s": args.tokens_per_s,
+        "completion_tokens": args.completion_tokens,
+        "ollama_parallel": args.ollama_parallel,
+        "db_latency_ms": args.db_latency_ms,
+    }
+
+    server = MockOllamaServer(MockOllamaConfig(
+        args.latency_ms, args.tokens_per_s, args.completion_tokens, args.ollama_parallel
+    )).start()
+    workspace = tempfile.mkdtemp(prefix="atomic_bench_")
+    # Lidas na importação do motor: precisam estar definidas antes
+    os.environ["ATOMIC_OLLAMA_HOST"] = server.url
+    os.environ["ATOMIC_HOT_RELOAD"] = "0"
+    os.environ.setdefault("ATOMIC_TRACING", "1")
+    # Estado em disco (blobs, checkpoints) vai para o workspace, apagado no fim
+    os.environ["ATOMIC_BLOB_DIR"] = os.path.join(workspace, "blobs")
+    os.environ["ATOMIC_CHECKPOINT_DIR"] = os.path.join(workspace, "checkpoints")
+
+    from core.atomic_engine import AtomicEngine
+    from core.registry import MoleculeRegistry
+    from core.tracing import trace_store
+
+    try:
+        molecules_dir, organisms_dir = prepare_workspace(workspace)
+        engine = AtomicEngine()
+        engine.registry = MoleculeRegistry(molecules_dir, organisms_dir)
+        install_mock_graph_db(engine, args.db_latency_ms)
+        trace_store.max_traces = max(trace_store.max_traces, args.iterations * 2)
+
+        scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+        levels = [int(level) for level in args.concurrency.split(",")]
+        plan = [
+            (f"{chain_id}|{args.mode}|c{concurrency}", chain_id, concurrency)
+            for chain_id in scenarios for concurrency in levels
+        ]
+        results = run_plan(engine, plan, args.mode, args.iterations, args.warmup)
+        engine.tool_pools.close()
+    finally:
+        server.stop()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print()
+    print_report(results, baseline)
+    report = {"settings": settings, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n✅ Baseline atualizado: {args.baseline}")
+        return
+
+    if baseline:
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        comparable = baseline.get("settings") == settings
+        if regressions:
+            print("\n⚠️ Regressões (tolerância de {:.0%}):".format(args.tolerance))
+            for line in regressions:
+                print(f"   - {line}")
+        if not comparable:
+            print("\n⚠️ Baseline gravado com outras configurações: comparação apenas indicativa.")
+        elif regressions:
+            sys.exit(1)
+        else:
+            print("\n✅ Sem regressões em relação ao baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,40 @@
 # core/atomic_engine.py
 # -----------------------------------------------------------------
 
-import yaml
 import os
+import re
+import sys
 import json
+import time
+import atexit
+import threading
 import subprocess
-import ollama
-from neo4j import GraphDatabase
-from redis import Redis
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from core.scheduler import run_dag, arun_dag, step_levels, StepExecutionError
+from core.registry import MoleculeRegistry, ChainDefinitionError, compile_value
+from core.tool_pool import ToolPoolManager
+from core.llm_cache import LLMResponseCache, llm_cache_key, cache_settings
+from core.llm_limiter import ModelLimiter, model_concurrency
+from core.metrics import (
+    instrument_chain, observe_step, observe_step_output, observe_llm_call, observe_prompt,
+    TOOL_SPAWN_DURATION, TOOL_RUN_DURATION
+)
+from core.tracing import span, start_trace, traced_chain
+from core.graph_writer import GraphWriter, GRAPH_WRITE_ACK
+from core.connections import ConnectionManager, ServiceConnection, CONNECT_TIMEOUT_S
+from core.prompt_cache import MemoizedPromptBuilder
+from core.ollama_pool import OllamaPool, hedge_setting
+from core.blob_store import blob_store
+from core.checkpoints import checkpoint_store
+from core.context_packing import packing_settings, pack_context
+from core.semantic_cache import SemanticCache, semantic_cache_settings
+from core.text_chunking import (
+    chunking_settings, split_sections, merge_extractions, parse_json_object, loads as loads_json, CHUNK_INSTRUCTION
+)
 
 # --- Importações da Galáxia (AI Reusables Framework) ---
 # (Assumindo que 'ai_reusables' está no PYTHONPATH)
@@ -27,6 +54,77 @@ MOLECULES_DIR = os.path.join(BASE_DIR, "molecules")
 ORGANISMS_DIR = os.path.join(BASE_DIR, "organisms")
 TOOLS_DIR = os.path.join(os.path.join(ORGANISMS_DIR, "tools"))
 
+# --- Configuração de Infra (docker-compose.yml) ---
+OLLAMA_HOST = os.environ.get("ATOMIC_OLLAMA_HOST", "http://localhost:11434")
+# Vários servidores Ollama (core/ollama_pool.py), separados por vírgula
+OLLAMA_HOSTS = [
+    host.strip() for host in os.environ.get("ATOMIC_OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()
+]
+NEO4J_URI = os.environ.get("ATOMIC_NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.environ.get("ATOMIC_NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.environ.get("ATOMIC_NEO4J_PASSWORD", "sua-senha-segura-aqui")
+REDIS_URL = os.environ.get("ATOMIC_REDIS_URL", "redis://localhost:6379/0")
+# Quanto tempo o Ollama mantém o modelo (e o prefixo já processado) na
+# memória depois de cada chamada; 'llm_config.keep_alive' sobrescreve
+OLLAMA_KEEP_ALIVE = os.environ.get("ATOMIC_OLLAMA_KEEP_ALIVE", "30m")
+# Pool de conexões do driver Neo4j (compartilhado pelo escritor em lote)
+NEO4J_POOL_OPTIONS = {
+    "max_connection_pool_size": int(os.environ.get("ATOMIC_NEO4J_POOL_SIZE", "50")),
+    "connection_acquisition_timeout": float(os.environ.get("ATOMIC_NEO4J_POOL_ACQUIRE_TIMEOUT_S", "30")),
+    "max_connection_lifetime": float(os.environ.get("ATOMIC_NEO4J_CONNECTION_LIFETIME_S", "3600")),
+    "liveness_check_timeout": float(os.environ.get("ATOMIC_NEO4J_LIVENESS_CHECK_S", "60")),
+    "connection_timeout": CONNECT_TIMEOUT_S,
+}
+
+# --- Execução ---
+# Quantos passos independentes de uma Molécula podem rodar ao mesmo tempo
+MAX_PARALLEL_STEPS = int(os.environ.get("ATOMIC_MAX_PARALLEL_STEPS", "4"))
+# Lote ('arun_chain_batch'): chamadas simultâneas por grupo de modelo
+BATCH_MAX_CONCURRENCY = int(os.environ.get("ATOMIC_BATCH_MAX_CONCURRENCY", "16"))
+# Tempo máximo (s) de um script em 'organisms/tools/'
+LOCAL_TOOL_TIMEOUT = int(os.environ.get("ATOMIC_LOCAL_TOOL_TIMEOUT", "300"))
+# Ferramentas locais rodam em workers persistentes (core/tool_pool.py),
+# salvo 'local_tool_config.worker_pool.enabled: false' no Organismo
+USE_TOOL_WORKERS = os.environ.get("ATOMIC_TOOL_WORKERS", "1") == "1"
+# Recarrega Moléculas/Organismos alterados em disco (watchfiles)
+HOT_RELOAD = os.environ.get("ATOMIC_HOT_RELOAD", "1") == "1"
+
+# Rótulos/propriedades do Neo4j não podem ser parametrizados; validamos o nome
+CYPHER_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# --- Clientes da infra ---
+# As bibliotecas (ollama, neo4j, redis) só são importadas quando o
+# primeiro cliente é criado (core/connections.py): importar o motor é rápido.
+
+def _ollama_timeout():
+    import httpx
+    # Só a conexão tem limite: a geração pode demorar o quanto precisar
+    return httpx.Timeout(None, connect=CONNECT_TIMEOUT_S)
+
+def _create_ollama_client(host: str):
+    import ollama
+    return ollama.Client(host=host, timeout=_ollama_timeout())
+
+def _create_ollama_async_client(host: str):
+    import ollama
+    return ollama.AsyncClient(host=host, timeout=_ollama_timeout())
+
+def _create_neo4j_driver():
+    from neo4j import GraphDatabase
+    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), **NEO4J_POOL_OPTIONS)
+
+def _create_neo4j_async_driver():
+    from neo4j import AsyncGraphDatabase
+    return AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), **NEO4J_POOL_OPTIONS)
+
+def _create_redis_client():
+    from redis import Redis
+    return Redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=CONNECT_TIMEOUT_S)
+
+def _create_redis_async_client():
+    from redis.asyncio import Redis as AsyncRedis
+    return AsyncRedis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=CONNECT_TIMEOUT_S)
+
 class AtomicEngine:
     """
     O AtomicEngine (SLE Engine) é o orquestrador central.
@@ -34,24 +132,57 @@ class AtomicEngine:
     Esta versão é integrada ao AI Reusables Framework.
     """
 
-    def __init__(self):
+    def __init__(self, max_parallel_steps: int = MAX_PARALLEL_STEPS):
         print("Iniciando o AtomicEngine...")
+        self.max_parallel_steps = max_parallel_steps
+
+        # --- Registro de Moléculas/Organismos (YAML lido uma vez, caminhos compilados) ---
+        self.registry = MoleculeRegistry(MOLECULES_DIR, ORGANISMS_DIR)
+        if HOT_RELOAD:
+            self.registry.start_watching()
+
+        # --- Workers persistentes das ferramentas locais ---
+        self.tool_pools = ToolPoolManager(default_timeout_s=LOCAL_TOOL_TIMEOUT)
         # --- Conexões (Ollama, Neo4j, Redis) ---
-        # (O código de conexão existente vai aqui... omitido por brevidade)
-        # ...
-        try:
-            self.ollama_client = ollama.Client(host='http://localhost:11434')
-            self.ollama_client.list()
-            print("✅ Conectado ao Ollama.")
-        except Exception as e:
-            self.ollama_client = None
-            print(f"⚠️ Erro ao conectar ao Ollama: {e}.")
-        # ... (Neo4j e Redis) ...
+        # Nada conecta aqui: os clientes são criados no primeiro uso e os
+        # health checks rodam em segundo plano ('start_health_checks').
+        self.connections = ConnectionManager()
+        # O "cliente" do Ollama é o pool de hosts (roteamento, failover e hedging)
+        self.ollama_pool = OllamaPool(OLLAMA_HOSTS, _create_ollama_client, _create_ollama_async_client)
+        self.connections.register(ServiceConnection(
+            "Ollama", lambda: self.ollama_pool, lambda pool: pool.check(),
+            async_factory=lambda: self.ollama_pool, async_close=lambda pool: pool.aclose(),
+            details=self.ollama_pool.status,
+        ))
+        self.connections.register(ServiceConnection(
+            "Neo4j", _create_neo4j_driver, lambda driver: driver.verify_connectivity(),
+            async_factory=_create_neo4j_async_driver, async_close=lambda driver: driver.close(),
+            # Reaplica o WAL do GraphWriter assim que o Neo4j responde
+            on_up=lambda: self.graph_writer,
+        ))
+        self.connections.register(ServiceConnection(
+            "Redis", _create_redis_client, lambda client: client.ping(),
+            async_factory=_create_redis_async_client, async_close=lambda client: client.aclose(),
+        ))
+
+        # --- Cache de respostas do LLM (Redis, com LRU local de fallback) ---
+        # Criado no primeiro uso; ele mesmo cai para o LRU se o Redis falhar
+        self._llm_cache = None
+        # --- Cache semântico (pedidos parecidos; 'llm_config.semantic_cache') ---
+        self.semantic_cache = SemanticCache(lambda: self.ollama_client)
+        # --- Concorrência por modelo e coalescência de pedidos idênticos ---
+        self.llm_limiter = ModelLimiter()
+        # --- Escritas no grafo em lote (UNWIND + MERGE), com write-ahead log ---
+        self._graph_writer = None
+        self._lazy_lock = threading.Lock()
 
         # --- Inicializa os Módulos da Galáxia ---
         if FRAMEWORK_INTEGRADO:
             PROMPT_MODULES_PATH = os.path.join(BASE_DIR, "../core_engineering/prompt_modular")
-            self.prompt_builder = PromptBuilder(base_path=PROMPT_MODULES_PATH)
+            # Prompts montados ficam em memória até algum módulo mudar no disco
+            self.prompt_builder = MemoizedPromptBuilder(
+                PromptBuilder(base_path=PROMPT_MODULES_PATH), PROMPT_MODULES_PATH
+            )
             self.scheme_adapter = SchemeAdapter()
             print("✅ Framework (PromptBuilder, SchemeAdapter) integrado.")
         else:
@@ -59,29 +190,383 @@ class AtomicEngine:
             self.scheme_adapter = None
             print("⚠️ Framework NÃO integrado. Funcionalidade limitada.")
 
-    # ... _load_yaml, _load_molecule, _load_organism ...
-    # (Estas funções permanecem as mesmas)
+    # --- Clientes (criados no primeiro uso; None se o último health check falhou) ---
+
+    def start_health_checks(self):
+        """Health checks de Ollama, Neo4j e Redis em segundo plano (não bloqueia)."""
+        self.connections.start_health_checks()
+
+    @property
+    def ollama_client(self):
+        return self.connections["Ollama"].get()
+
+    @property
+    def ollama_async_client(self):
+        return self.connections["Ollama"].get_async()
+
+    @property
+    def neo4j_driver(self):
+        return self.connections["Neo4j"].get()
+
+    @property
+    def neo4j_async_driver(self):
+        return self.connections["Neo4j"].get_async()
+
+    @property
+    def redis_client(self):
+        return self.connections["Redis"].get()
+
+    @property
+    def redis_async_client(self):
+        return self.connections["Redis"].get_async()
 
-    # ... _resolve_input ...
-    # (Esta função permanece a mesma)
+    @property
+    def llm_cache(self) -> LLMResponseCache:
+        if self._llm_cache is None:
+            with self._lazy_lock:
+                if self._llm_cache is None:
+                    redis = self.connections["Redis"]
+                    self._llm_cache = LLMResponseCache(redis.client(), redis.async_client())
+        return self._llm_cache
 
-    # ... run_chain ...
-    # (Esta função permanece a mesma)
+    @property
+    def graph_writer(self):
+        """O GraphWriter (criado quando o Neo4j é usado pela primeira vez)."""
+        driver = self.neo4j_driver
+        if driver is None:
+            return None
+        if self._graph_writer is None:
+            with self._lazy_lock:
+                if self._graph_writer is None:
+                    self._graph_writer = GraphWriter(driver)
+                    atexit.register(self._graph_writer.close)
+        return self._graph_writer
 
-    def _execute_step(self, step_config: dict, agent_config: dict, context: dict):
+    # --- Carregamento (Moléculas e Organismos) ---
+
+    def _load_molecule(self, chain_id: str):
+        """YAML de 'molecules/<chain_id>.yaml' (via registro, com cache)."""
+        return self.registry.get_molecule_definition(chain_id)
+
+    def _load_organism(self, agent_file: str):
+        """YAML de 'organisms/<agent_file>' (via registro, com cache)."""
+        return self.registry.get_organism(agent_file)
+
+    # --- Contexto ---
+
+    def _resolve_input(self, input_spec, context: dict):
+        """
+        Resolve um 'input' avulso contra o contexto.
+        (Os passos das Moléculas usam os acessores pré-compilados do registro.)
+        """
+        return blob_store.resolve(compile_value(input_spec)(context))
+
+    def _step_input(self, step, context: dict):
+        """
+        O input do passo, com as referências do blob store resolvidas.
+        Ferramentas locais com 'local_tool_config.blob_refs: true' recebem
+        a referência (com o 'path' do arquivo) e leem o conteúdo sozinhas.
+        """
+        input_data = step.resolve_input(context)
+        if step.agent_type == "local_tool" and (step.agent_config.get("local_tool_config") or {}).get("blob_refs"):
+            return blob_store.tool_handles(input_data)
+        return blob_store.resolve(input_data)
+
+    # --- Execução da Cadeia ---
+
+    def _prepare_chain(self, chain_id: str):
+        """
+        Retorna a Molécula compilada (passos, grafo e agentes).
+        Lança ChainDefinitionError se algo estiver faltando ou inválido.
+        """
+        return self.registry.get_molecule(chain_id)
+
+    def _step_failure(self, molecule, error: StepExecutionError, context: dict, run_id: str = None):
+        """
+        Monta o dict de erro de uma cadeia que falhou em um passo.
+        Com o 'run_id', o cliente pode retomar a execução ('resume').
+        """
+        step = molecule.steps[error.step_index]
+        failure = {
+            "error": f"Falha no passo {step.number} ('{step.name}'): {error}",
+            "context": context,
+        }
+        if run_id:
+            failure["run_id"] = run_id
+        return failure
+
+    def _chain_result(self, molecule, context: dict, run_id: str = None):
+        """Monta o resultado final de uma cadeia bem-sucedida."""
+        result = {
+            "chain_id": molecule.chain_id,
+            "status": "success",
+            "output_report": molecule.build_output_report(context),
+            "context": context,
+        }
+        if run_id:
+            result["run_id"] = run_id
+        return result
+
+    @instrument_chain
+    @traced_chain
+    def run_chain(self, chain_id: str, trigger_input: dict, max_parallel_steps: int = None,
+                  run_id: str = None, resume: bool = False):
+        """
+        Executa uma Molécula.
+
+        Os passos formam um grafo (DAG) a partir das referências
+        '$.steps[i]' em 'input'/'prompt'. Passos independentes rodam em
+        paralelo, até 'max_parallel_steps' (ou 'max_parallel_steps' da
+        própria Molécula, ou o padrão do motor).
+
+        Com um 'run_id' (devolvido no resultado), cada passo concluído vai
+        para o checkpoint da execução; sem ele, nada é gravado. Com
+        'resume=True' (exige o 'run_id'), os passos já concluídos com o
+        mesmo input e agente não rodam de novo (core/checkpoints.py).
+        """
+        try:
+            molecule = self._prepare_chain(chain_id)
+        except ChainDefinitionError as e:
+            return {"error": str(e)}
+
+        if max_parallel_steps is None:
+            max_parallel_steps = molecule.max_parallel_steps or self.max_parallel_steps
+
+        # Cada passo grava na sua própria posição: a saída não depende da ordem de término
+        context = {"input_trigger": trigger_input, "steps": [None] * len(molecule.steps)}
+        try:
+            checkpoint = checkpoint_store.open(chain_id, run_id, resume)
+        except ValueError as e:
+            return {"error": str(e)}
+
+        def execute(index: int):
+            step = molecule.steps[index]
+            fingerprint = checkpoint.fingerprint(step, context)
+            reused, output = checkpoint.lookup(step, fingerprint)
+            if reused:
+                print(f"⏭️ Passo {step.number}: {step.name} (checkpoint)")
+                context["steps"][index] = {step.output_variable: output}
+                return
+            print(f"▶️ Passo {step.number}: {step.name}")
+            output = self._execute_step(step, context)
+            # Saídas grandes vão para o blob store; o contexto guarda a referência
+            output = blob_store.offload(output)
+            context["steps"][index] = {step.output_variable: output}
+            checkpoint.save(step, fingerprint, output)
+
+        try:
+            run_dag(molecule.graph, execute, max_parallel_steps)
+        except StepExecutionError as e:
+            return self._step_failure(molecule, e, context, checkpoint.run_id)
+
+        return self._chain_result(molecule, context, checkpoint.run_id)
+
+    @instrument_chain
+    @traced_chain
+    async def arun_chain(self, chain_id: str, trigger_input: dict, max_parallel_steps: int = None, emit=None,
+                         run_id: str = None, resume: bool = False):
+        """
+        Versão asyncio de 'run_chain' (mesmos 'run_id'/'resume').
+        Os passos viram tasks no event loop: chamadas ao Ollama, aos
+        scripts locais, ao Neo4j e ao Redis não seguram nenhuma thread.
+
+        'emit(event)' (opcional) recebe os eventos de progresso
+        (step_start, token, tool_chunk, step_end, step_error, step_skipped);
+        veja 'astream_chain'.
+        """
+        try:
+            molecule = self._prepare_chain(chain_id)
+        except ChainDefinitionError as e:
+            return {"error": str(e)}
+
+        if max_parallel_steps is None:
+            max_parallel_steps = molecule.max_parallel_steps or self.max_parallel_steps
+
+        context = {"input_trigger": trigger_input, "steps": [None] * len(molecule.steps)}
+        try:
+            checkpoint = await asyncio.to_thread(checkpoint_store.open, chain_id, run_id, resume)
+        except ValueError as e:
+            return {"error": str(e)}
+
+        async def execute(index: int):
+            step = molecule.steps[index]
+            fingerprint = checkpoint.fingerprint(step, context)
+            reused, output = checkpoint.lookup(step, fingerprint)
+            if reused:
+                print(f"⏭️ Passo {step.number}: {step.name} (checkpoint)")
+                context["steps"][index] = {step.output_variable: output}
+                if emit is not None:
+                    emit({"event": "step_skipped", "step": step.number, "name": step.name,
+                          "output_variable": step.output_variable, "output": output})
+                return
+            print(f"▶️ Passo {step.number}: {step.name}")
+            if emit is None:
+                output = await self._aexecute_step(step, context)
+                output = await asyncio.to_thread(blob_store.offload, output)
+                context["steps"][index] = {step.output_variable: output}
+                await asyncio.to_thread(checkpoint.save, step, fingerprint, output)
+                return
+
+            event = {"step": step.number, "name": step.name, "output_variable": step.output_variable}
+            emit({"event": "step_start", **event})
+            started = time.perf_counter()
+            try:
+                output = await self._aexecute_step(
+                    step, context,
+                    on_token=lambda content: emit({"event": "token", **event, "content": content}),
+                    on_chunk=lambda chunk: emit({"event": "tool_chunk", **event, "chunk": chunk}),
+                )
+            except Exception as e:
+                emit({"event": "step_error", **event, "error": str(e)})
+                raise
+            output = await asyncio.to_thread(blob_store.offload, output)
+            context["steps"][index] = {step.output_variable: output}
+            await asyncio.to_thread(checkpoint.save, step, fingerprint, output)
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            emit({"event": "step_end", **event, "duration_ms": duration_ms, "output": output})
+
+        try:
+            await arun_dag(molecule.graph, execute, max_parallel_steps)
+        except StepExecutionError as e:
+            return self._step_failure(molecule, e, context, checkpoint.run_id)
+
+        return self._chain_result(molecule, context, checkpoint.run_id)
+
+    async def astream_chain(self, chain_id: str, trigger_input: dict, max_parallel_steps: int = None,
+                            run_id: str = None, resume: bool = False):
+        """
+        Executa a cadeia e entrega os eventos enquanto ela roda:
+        'step_start', 'token' (pedaços da resposta dos passos 'llm_chat'),
+        'tool_chunk' (resultados parciais das ferramentas locais, ex: cada
+        página do OCR, na ordem),
+        'step_end' (com 'duration_ms' e a saída do passo), 'step_error',
+        'step_skipped' (reaproveitado do checkpoint) e, por último,
+        'chain_end' com o resultado completo.
+        """
+        events = asyncio.Queue()
+        run = asyncio.ensure_future(
+            self.arun_chain(chain_id, trigger_input, max_parallel_steps, emit=events.put_nowait,
+                            run_id=run_id, resume=resume)
+        )
+        try:
+            while True:
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait({next_event, run}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_event.done():
+                    next_event.cancel()
+                    break
+                yield next_event.result()
+            while not events.empty():
+                yield events.get_nowait()
+            yield {"event": "chain_end", "result": run.result()}
+        finally:
+            # Cliente desconectou no meio: não deixa a cadeia rodando à toa
+            if not run.done():
+                run.cancel()
+
+    def _batch_group_key(self, step):
+        """Passos que usam o mesmo modelo/ferramenta caem no mesmo grupo."""
+        agent_config = step.agent_config
+        agent_type = agent_config.get("type")
+        if agent_type == "llm_chat":
+            return ("llm_chat", agent_config["llm_config"]["model"])
+        if agent_type == "local_tool":
+            return ("local_tool", agent_config["local_tool_config"]["script_path"])
+        return (agent_type, self._internal_tool_name(agent_config))
+
+    async def arun_chain_batch(self, chain_id: str, trigger_inputs: list, max_concurrency: int = None):
+        """
+        Executa a mesma Molécula para vários gatilhos, passo a passo
+        ("step-major"): cada nível do grafo roda para o lote inteiro antes
+        do próximo. Dentro do nível, os passos são agrupados por modelo,
+        e cada grupo dispara suas chamadas juntas (até 'max_concurrency'),
+        mantendo o modelo carregado e aquecido.
+
+        Retorna um resultado por gatilho, na mesma ordem da entrada.
+        Um item que falha não impede os outros.
+        """
+        # O lote inteiro é um trace só (os spans dos itens ficam lado a lado)
+        with start_trace("chain_batch", chain_id=chain_id, items=len(trigger_inputs)):
+            return await self._arun_chain_batch(chain_id, trigger_inputs, max_concurrency)
+
+    async def _arun_chain_batch(self, chain_id: str, trigger_inputs: list, max_concurrency: int = None):
+        try:
+            molecule = self._prepare_chain(chain_id)
+        except ChainDefinitionError as e:
+            return [{"error": str(e)} for _ in trigger_inputs]
+
+        limit = asyncio.Semaphore(max(1, max_concurrency or BATCH_MAX_CONCURRENCY))
+        contexts = [{"input_trigger": trigger, "steps": [None] * len(molecule.steps)} for trigger in trigger_inputs]
+        failures = [None] * len(trigger_inputs)
+
+        async def execute(step, item: int):
+            async with limit:
+                try:
+                    output = await self._aexecute_step(step, contexts[item])
+                    output = await asyncio.to_thread(blob_store.offload, output)
+                    contexts[item]["steps"][step.index] = {step.output_variable: output}
+                except Exception as e:
+                    if failures[item] is None or step.index < failures[item].step_index:
+                        failures[item] = StepExecutionError(step.index, e)
+
+        for level in step_levels(molecule.graph):
+            groups = {}
+            for index in level:
+                step = molecule.steps[index]
+                groups.setdefault(self._batch_group_key(step), []).append(step)
+
+            for (_, target), steps in groups.items():
+                pending = [
+                    (step, item) for step in steps
+                    for item in range(len(trigger_inputs)) if failures[item] is None
+                ]
+                if not pending:
+                    continue
+                print(f"▶️ Lote: {', '.join(step.name for step in steps)} ({target}) x {len(pending)}")
+                await asyncio.gather(*(execute(step, item) for step, item in pending))
+
+        return [
+            self._step_failure(molecule, failures[item], contexts[item]) if failures[item]
+            else self._chain_result(molecule, contexts[item])
+            for item in range(len(trigger_inputs))
+        ]
+
+    def _execute_step(self, step, context: dict):
+        """Executa um passo, com as métricas de duração e payload (core/metrics.py)."""
+        # Resolve o input (pode vir do trigger ou de outro passo) com o acessor compilado
+        input_data = self._step_input(step, context)
+        with span(f"step:{step.name}", step=step.number, agent_type=step.agent_type), \
+                observe_step(step, input_data):
+            output = self._dispatch_step(step, context, input_data)
+        observe_step_output(step, output)
+        return output
+
+    async def _aexecute_step(self, step, context: dict, on_token=None, on_chunk=None):
+        """
+        Versão asyncio de '_execute_step'.
+        'on_token' (opcional) recebe os pedaços da resposta dos agentes LLM;
+        'on_chunk', os resultados parciais das ferramentas locais em streaming.
+        """
+        # Ler um blob (disco/Redis) não deve travar o event loop
+        input_data = await asyncio.to_thread(self._step_input, step, context)
+        with span(f"step:{step.name}", step=step.number, agent_type=step.agent_type), \
+                observe_step(step, input_data):
+            output = await self._adispatch_step(step, context, input_data, on_token, on_chunk)
+        observe_step_output(step, output)
+        return output
+
+    def _dispatch_step(self, step, context: dict, input_data: any):
         """
         O Dispatcher.
         Verifica o 'tipo' de agente e chama a ferramenta correta.
         (Refatorado para simplicidade)
         """
-        agent_type = agent_config.get("type")
-        
-        # Resolve o input (pode vir do trigger ou de outro passo)
-        input_data = self._resolve_input(step_config.get("input"), context)
+        agent_config = step.agent_config
+        agent_type = step.agent_type
         
         # --- Estratégia 1: Agente LLM (Refatorado) ---
         if agent_type == "llm_chat":
-            step_prompt = self._resolve_input(step_config.get("prompt"), context)
+            step_prompt = blob_store.resolve(step.resolve_prompt(context))
             
             return self._run_llm_chat(
                 agent_config=agent_config,
@@ -91,33 +576,52 @@ class AtomicEngine:
 
         # --- Estratégia 2: Ferramenta Interna (Agente MCP) ---
         elif agent_type == "internal_tool":
-            tool_name = agent_config.get("function_name") # Ex: "save_to_graph_db"
+            tool_name = self._internal_tool_name(agent_config) # Ex: "save_to_graph_db"
             return self._run_internal_tool(tool_name, input_data)
             
         # --- Estratégia 3: Script Local (Apenas para ferramentas reais, ex: OCR) ---
         elif agent_type == "local_tool":
-            script_path = os.path.join(TOOLS_DIR, agent_config["local_tool_config"]["script_path"])
-            return self._run_local_script(script_path, input_data)
+            return self._run_local_tool(agent_config, input_data)
             
         else:
             raise ValueError(f"Tipo de Agente desconhecido: {agent_type}")
 
+    async def _adispatch_step(self, step, context: dict, input_data: any, on_token=None, on_chunk=None):
+        """O Dispatcher, versão asyncio (mesmas estratégias de '_dispatch_step')."""
+        agent_config = step.agent_config
+        agent_type = step.agent_type
+
+        if agent_type == "llm_chat":
+            step_prompt = blob_store.resolve(step.resolve_prompt(context))
+            return await self._arun_llm_chat(
+                agent_config=agent_config,
+                step_prompt=step_prompt,
+                context_data=input_data,
+                on_token=on_token
+            )
+
+        elif agent_type == "internal_tool":
+            tool_name = self._internal_tool_name(agent_config)
+            return await self._arun_internal_tool(tool_name, input_data)
+
+        elif agent_type == "local_tool":
+            return await self._arun_local_tool(agent_config, input_data, on_chunk)
+
+        else:
+            raise ValueError(f"Tipo de Agente desconhecido: {agent_type}")
+
     # --- Ferramentas de Execução (REFATORADAS) ---
 
-    def _run_llm_chat(self, agent_config: dict, step_prompt: str, context_data: any):
+    def _build_llm_messages(self, agent_config: dict, step_prompt: str, context_data: any):
         """
-        Chama o cliente Ollama, mas agora usando
-        o PromptBuilder e o SchemeAdapter do Framework.
+        Monta as mensagens (system + user) de um passo 'llm_chat',
+        usando o PromptBuilder do Framework quando disponível.
         """
-        model = agent_config["llm_config"]["model"]
-        print(f"Chamando LLM (Ollama): {model}")
-        if not self.ollama_client:
-            raise Exception("Cliente Ollama não está conectado.")
-            
         # 1. Construir o System Prompt (Refatoração 2: PromptBuilder)
         if self.prompt_builder and "prompt_modules" in agent_config:
             modules = agent_config["prompt_modules"] # Ex: ['persona/expert.yaml', 'format/json.yaml']
-            system_prompt = self.prompt_builder.build(modules)
+            with span("prompt.build", modules=len(modules)):
+                system_prompt = self.prompt_builder.build(modules)
         else:
             # Fallback para o método antigo se o framework não for encontrado
             system_prompt = agent_config["llm_config"].get("system_prompt", "Você é um assistente prestativo.")
@@ -125,34 +629,511 @@ class AtomicEngine:
         # 2. Construir o User Prompt (combinando prompt do passo e contexto)
         # O 'context_data' é o output do passo anterior (ex: o markdown do OCR)
         # O 'step_prompt' é a instrução do 'molecules/*.yaml'
-        user_prompt = f"Contexto para analisar:\n---\n{context_data}\n---\n\nTarefa:\n{step_prompt}"
-        
+        # A parte estável (sistema + tarefa) vem primeiro e o contexto, que
+        # muda a cada execução, por último: o Ollama reaproveita o prefixo.
+        # O contexto vai em JSON compacto e, com 'llm_config.context_budget',
+        # sem os campos não usados e dentro do orçamento (core/context_packing.py).
+        model = agent_config["llm_config"]["model"]
+        with span("prompt.pack", model=model) as pack_span:
+            context_text, packing = pack_context(context_data, step_prompt, packing_settings(agent_config))
+            if pack_span and packing:
+                pack_span.set(raw_tokens=packing["raw_tokens"], tokens=packing["tokens"],
+                              dropped_fields=packing["dropped_fields"], truncated=packing["truncated"])
+        user_prompt = f"Tarefa:\n{step_prompt}\n\nContexto para analisar:\n---\n{context_text}\n---"
+
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
-        
-        response = self.ollama_client.chat(model=model, messages=messages)
-        content = response['message']['content']
-        
+        observe_prompt(model, messages, packing)
+        return messages
+
+    def _parse_llm_content(self, agent_config: dict, content: str):
+        """Converte a resposta do LLM no 'output_schema' do agente."""
         # 3. Forçar o Esquema (Refatoração 3: SchemeAdapter)
         output_schema = agent_config.get("output_schema", "text")
         
         if output_schema == "json" and self.scheme_adapter:
             # Usa o 'SchemeAdapter' para limpar e validar o JSON
-            return self.scheme_adapter.map_schema_from_text(content)
+            with span("schema.map", chars=len(content)):
+                return self.scheme_adapter.map_schema_from_text(content)
         
         # Fallback se o 'SchemeAdapter' falhar ou não for JSON
         if output_schema == "json" and (content.strip().startswith('{') or content.strip().startswith('[')):
              try:
-                return json.loads(content)
+                return loads_json(content)
              except json.JSONDecodeError:
                 pass # Cai para o raw_text
                 
         return {"raw_text": content}
 
-    # ... _run_internal_tool ...
-    # (Esta função permanece a mesma)
+    def _chunk_llm_context(self, agent_config: dict, context_data: any):
+        """
+        (pedaços do contexto, config) para a extração em map-reduce, ou
+        (None, None) se o Organismo não usa 'llm_config.chunking' ou se o
+        texto já cabe em um prompt. Se o contexto é um objeto (ex: a saída
+        inteira do OCR), o texto vem do campo 'chunking.text_field'.
+        """
+        chunking = chunking_settings(agent_config)
+        if chunking is None:
+            return None, None
+        text = context_data.get(chunking["text_field"]) if isinstance(context_data, dict) else context_data
+        if not isinstance(text, str) or len(text) <= chunking["max_chars"]:
+            return None, None
+        return split_sections(text, chunking["max_chars"]), chunking
+
+    def _merge_chunk_results(self, results: list, chunking: dict, chunk_span=None):
+        """Junta as saídas dos pedaços (core/text_chunking.py) em uma só."""
+        extracted = []
+        for result in results:
+            # Sem 'output_schema: json' cada pedaço volta como texto: o JSON é lido aqui
+            if isinstance(result, dict) and set(result) == {"raw_text"}:
+                result = parse_json_object(str(result["raw_text"]))
+            if isinstance(result, dict):
+                extracted.append(result)
+        if chunk_span:
+            chunk_span.set(failed=len(results) - len(extracted))
+        if not extracted:
+            # Nenhum pedaço voltou JSON: devolve os textos, como um prompt só faria
+            return {"raw_text": "\n".join(str(result.get("raw_text", "")) for result in results)}
+        merged, conflicts = merge_extractions(extracted, chunking["fields"])
+        if conflicts:
+            print(f"⚠️ Extração em pedaços: valores diferentes para {', '.join(conflicts)} (mantido o mais frequente).")
+            if chunk_span:
+                chunk_span.set(conflicts=len(conflicts))
+        return merged
+
+    def _run_llm_chat_chunked(self, agent_config: dict, step_prompt: str, chunks: list, chunking: dict):
+        """Um prompt por pedaço, em paralelo (até 'max_parallel'), e a junção dos JSONs."""
+        model = agent_config["llm_config"]["model"]
+        print(f"Extração em {len(chunks)} pedaços: {model}")
+        chunk_prompt = f"{step_prompt}\n\n{CHUNK_INSTRUCTION}"
+        with span("llm.chunked", model=model, chunks=len(chunks)) as chunk_span:
+            with ThreadPoolExecutor(max_workers=min(chunking["max_parallel"], len(chunks))) as pool:
+                # Cada pedaço com uma cópia do contexto (os spans ficam sob este)
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_llm_chat, agent_config, chunk_prompt, chunk)
+                    for chunk in chunks
+                ]
+                results = [future.result() for future in futures]
+            return self._merge_chunk_results(results, chunking, chunk_span)
+
+    async def _arun_llm_chat_chunked(self, agent_config: dict, step_prompt: str, chunks: list, chunking: dict):
+        """Versão asyncio de '_run_llm_chat_chunked'."""
+        model = agent_config["llm_config"]["model"]
+        print(f"Extração em {len(chunks)} pedaços (async): {model}")
+        chunk_prompt = f"{step_prompt}\n\n{CHUNK_INSTRUCTION}"
+        semaphore = asyncio.Semaphore(chunking["max_parallel"])
+
+        async def extract(chunk: str):
+            async with semaphore:
+                return await self._arun_llm_chat(agent_config, chunk_prompt, chunk)
+
+        with span("llm.chunked", model=model, chunks=len(chunks)) as chunk_span:
+            results = await asyncio.gather(*(extract(chunk) for chunk in chunks))
+            return self._merge_chunk_results(results, chunking, chunk_span)
+
+    def _run_llm_chat(self, agent_config: dict, step_prompt: str, context_data: any):
+        """
+        Chama o cliente Ollama, mas agora usando
+        o PromptBuilder e o SchemeAdapter do Framework.
+        """
+        # Texto longo + 'llm_config.chunking': map-reduce em prompts curtos
+        chunks, chunking = self._chunk_llm_context(agent_config, context_data)
+        if chunks:
+            return self._run_llm_chat_chunked(agent_config, step_prompt, chunks, chunking)
+
+        model = agent_config["llm_config"]["model"]
+        options = agent_config["llm_config"].get("options")
+        keep_alive = agent_config["llm_config"].get("keep_alive", OLLAMA_KEEP_ALIVE)
+        messages = self._build_llm_messages(agent_config, step_prompt, context_data)
+
+        # Cache endereçado por conteúdo (core/llm_cache.py)
+        cache = cache_settings(agent_config)
+        request_key = llm_cache_key(model, messages, options)
+        with span("llm.cache", model=model) as cache_span:
+            content = self.llm_cache.get(request_key, model) if cache else None
+            if cache_span:
+                cache_span.set(hit=content is not None)
+        if content is not None:
+            print(f"Cache do LLM (hit): {model}")
+            return self._parse_llm_content(agent_config, content)
+
+        # Pedido parecido já respondido? (core/semantic_cache.py)
+        semantic = semantic_cache_settings(agent_config)
+        lookup = self._semantic_lookup(model, messages, options, semantic, step_prompt)
+        if lookup and lookup.content is not None:
+            print(f"Cache semântico do LLM (hit, similaridade {lookup.similarity:.3f}): {model}")
+            return self._parse_llm_content(agent_config, lookup.content)
+
+        if not self.ollama_client:
+            raise Exception("Cliente Ollama não está conectado.")
+
+        def upstream():
+            print(f"Chamando LLM (Ollama): {model}")
+            started = time.perf_counter()
+            with span("llm.call", model=model) as call_span:
+                response = self.ollama_client.chat(
+                    model=model, messages=messages, options=options, keep_alive=keep_alive,
+                    hedge=hedge_setting(agent_config)
+                )
+                self._annotate_llm_span(call_span, response)
+            observe_llm_call(model, time.perf_counter() - started, response)
+            content = response['message']['content']
+            if cache:
+                self.llm_cache.set(request_key, content, cache["ttl_s"])
+            if lookup:
+                self._semantic_store(lookup, content, semantic)
+            return content
+
+        # Semáforo por modelo + pedidos idênticos em andamento compartilham a chamada (core/llm_limiter.py)
+        with span("llm.queue", model=model) as queue_span:
+            content, coalesced = self.llm_limiter.call(model, request_key, model_concurrency(agent_config), upstream)
+            if queue_span:
+                queue_span.set(coalesced=coalesced)
+        return self._parse_llm_content(agent_config, content)
+
+    async def _arun_llm_chat(self, agent_config: dict, step_prompt: str, context_data: any, on_token=None):
+        """
+        Versão asyncio de '_run_llm_chat' (ollama.AsyncClient, via httpx).
+        Com 'on_token', usa o chat em streaming do Ollama e repassa cada
+        pedaço da resposta assim que ele chega (não vale para a extração
+        em pedaços: os JSONs só fazem sentido depois de juntados).
+        """
+        chunks, chunking = self._chunk_llm_context(agent_config, context_data)
+        if chunks:
+            return await self._arun_llm_chat_chunked(agent_config, step_prompt, chunks, chunking)
+
+        model = agent_config["llm_config"]["model"]
+        options = agent_config["llm_config"].get("options")
+        keep_alive = agent_config["llm_config"].get("keep_alive", OLLAMA_KEEP_ALIVE)
+        messages = self._build_llm_messages(agent_config, step_prompt, context_data)
+
+        cache = cache_settings(agent_config)
+        request_key = llm_cache_key(model, messages, options)
+        with span("llm.cache", model=model) as cache_span:
+            content = await self.llm_cache.aget(request_key, model) if cache else None
+            if cache_span:
+                cache_span.set(hit=content is not None)
+        if content is not None:
+            print(f"Cache do LLM (hit): {model}")
+            if on_token:
+                on_token(content)
+            return self._parse_llm_content(agent_config, content)
+
+        semantic = semantic_cache_settings(agent_config)
+        # O embedding e a busca são CPU (ou I/O síncrono): fora do event loop
+        lookup = (await asyncio.to_thread(self._semantic_lookup, model, messages, options, semantic, step_prompt)
+                  if semantic else None)
+        if lookup and lookup.content is not None:
+            print(f"Cache semântico do LLM (hit, similaridade {lookup.similarity:.3f}): {model}")
+            if on_token:
+                on_token(lookup.content)
+            return self._parse_llm_content(agent_config, lookup.content)
+
+        if not self.ollama_async_client:
+            raise Exception("Cliente Ollama não está conectado.")
+
+        async def upstream():
+            print(f"Chamando LLM (Ollama, async): {model}")
+            started = time.perf_counter()
+            with span("llm.call", model=model, stream=bool(on_token)) as call_span:
+                if on_token:
+                    parts = []
+                    stream = await self.ollama_async_client.achat(
+                        model=model, messages=messages, options=options, keep_alive=keep_alive, stream=True
+                    )
+                    response = None
+                    async for chunk in stream:
+                        piece = chunk['message']['content']
+                        if piece:
+                            parts.append(piece)
+                            on_token(piece)
+                        response = chunk  # o último pedaço ('done') traz os contadores de tokens
+                    content = "".join(parts)
+                else:
+                    response = await self.ollama_async_client.achat(
+                        model=model, messages=messages, options=options, keep_alive=keep_alive,
+                        hedge=hedge_setting(agent_config)
+                    )
+                    content = response['message']['content']
+                self._annotate_llm_span(call_span, response)
+            observe_llm_call(model, time.perf_counter() - started, response)
+            if cache:
+                await self.llm_cache.aset(request_key, content, cache["ttl_s"])
+            if lookup:
+                await asyncio.to_thread(self._semantic_store, lookup, content, semantic)
+            return content
+
+        with span("llm.queue", model=model) as queue_span:
+            content, coalesced = await self.llm_limiter.acall(
+                model, request_key, model_concurrency(agent_config), upstream
+            )
+            if queue_span:
+                queue_span.set(coalesced=coalesced)
+        if coalesced and on_token:
+            # Quem pegou carona na chamada de outro passo recebe a resposta inteira de uma vez
+            on_token(content)
+        return self._parse_llm_content(agent_config, content)
+
+    def _semantic_lookup(self, model: str, messages: list, options, semantic: dict, task: str):
+        """Busca no cache semântico. None se ele estiver desligado ou se a busca falhar."""
+        if semantic is None or not self.semantic_cache.available:
+            return None
+        with span("llm.semantic_cache", model=model) as semantic_span:
+            try:
+                lookup = self.semantic_cache.lookup(model, messages, options, semantic, task)
+            except Exception as e:
+                # Sem o cache semântico o passo continua (só chama o modelo)
+                print(f"⚠️ Cache semântico: falha na busca ({e}).")
+                return None
+            if semantic_span:
+                semantic_span.set(hit=lookup.content is not None, similarity=lookup.similarity)
+        return lookup
+
+    def _semantic_store(self, lookup, content: str, semantic: dict):
+        try:
+            self.semantic_cache.store(lookup, content, semantic["ttl_s"])
+        except Exception as e:
+            print(f"⚠️ Cache semântico: falha ao gravar ({e}).")
+
+    def _annotate_llm_span(self, call_span, response):
+        """Anota o span da chamada ao Ollama com os contadores de tokens."""
+        if call_span is None or response is None:
+            return
+        call_span.set(
+            prompt_tokens=response.get("prompt_eval_count"),
+            completion_tokens=response.get("eval_count"),
+        )
+
+    def _internal_tool_name(self, agent_config: dict):
+        """'function_name' do Organismo (em 'internal_tool_config', como no template)."""
+        tool_config = agent_config.get("internal_tool_config") or {}
+        return tool_config.get("function_name", agent_config.get("function_name"))
+
+    def _select_internal_tool(self, tool_name: str, input_data: any):
+        """
+        Resolve o nome da ferramenta interna (Agente MCP).
+        O 'mcp_tool_dispatcher' escolhe a ferramenta por 'params.tool'
+        (padrão: 'save_to_graph_db').
+        """
+        if tool_name == "mcp_tool_dispatcher":
+            params = (input_data or {}).get("params") or {}
+            tool_name = params.get("tool", "save_to_graph_db")
+        if tool_name not in ("save_to_graph_db", "get_from_cache"):
+            raise ValueError(f"Ferramenta interna desconhecida: {tool_name}")
+        print(f"Executando ferramenta interna: {tool_name}")
+        return tool_name
+
+    def _run_internal_tool(self, tool_name: str, input_data: any):
+        """Executa uma função interna do motor (Agente MCP)."""
+        tool_name = self._select_internal_tool(tool_name, input_data)
+        internal_tools = {
+            "save_to_graph_db": self._save_to_graph_db,
+            "get_from_cache": self._get_from_cache,
+        }
+        return internal_tools[tool_name](input_data)
+
+    async def _arun_internal_tool(self, tool_name: str, input_data: any):
+        """Versão asyncio de '_run_internal_tool'."""
+        tool_name = self._select_internal_tool(tool_name, input_data)
+        internal_tools = {
+            "save_to_graph_db": self._asave_to_graph_db,
+            "get_from_cache": self._aget_from_cache,
+        }
+        return await internal_tools[tool_name](input_data)
+
+    def _build_graph_write(self, input_data: dict):
+        """Valida a entrada de 'save_to_graph_db': (rótulo, chave primária, valor da chave, dados, ack)."""
+        data = input_data.get("data") or {}
+        params = input_data.get("params") or {}
+        label = params.get("entity_type", "Entidade")
+        primary_key = params.get("primary_key")
+        for name in (label, primary_key):
+            if not name or not CYPHER_IDENTIFIER_PATTERN.match(name):
+                raise ValueError(f"Identificador inválido para o Neo4j: {name!r}")
+        if data.get(primary_key) is None:
+            raise ValueError(f"Chave primária '{primary_key}' ausente nos dados.")
+        return label, primary_key, data[primary_key], data, params.get("ack", GRAPH_WRITE_ACK)
+
+    @staticmethod
+    def _graph_write_result(ack: str, node_id) -> dict:
+        if ack == "wal":
+            # Gravado no WAL; o node_id só existe depois do flush do lote
+            return {"status": "queued", "node_id": None}
+        return {"status": "success", "node_id": node_id}
+
+    def _save_to_graph_db(self, input_data: dict):
+        """
+        Salva (MERGE) uma entidade no Neo4j, usando 'primary_key' como chave.
+        A escrita vai para o GraphWriter (core/graph_writer.py), que agrupa
+        as entidades de várias cadeias em um único UNWIND por lote.
+        """
+        if not self.graph_writer:
+            raise Exception("Driver Neo4j não está conectado.")
+
+        label, primary_key, key, data, ack = self._build_graph_write(input_data)
+        with span("db.write", db="neo4j", key=key, ack=ack):
+            node_id = self.graph_writer.submit(label, primary_key, key, data, ack).result()
+        return self._graph_write_result(ack, node_id)
+
+    async def _asave_to_graph_db(self, input_data: dict):
+        """Versão asyncio de '_save_to_graph_db' (o fsync do WAL roda fora do event loop)."""
+        if not self.graph_writer:
+            raise Exception("Driver Neo4j não está conectado.")
+
+        label, primary_key, key, data, ack = self._build_graph_write(input_data)
+        with span("db.write", db="neo4j", key=key, ack=ack):
+            future = await asyncio.to_thread(self.graph_writer.submit, label, primary_key, key, data, ack)
+            node_id = await asyncio.wrap_future(future)
+        return self._graph_write_result(ack, node_id)
+
+    def _get_from_cache(self, input_data: dict):
+        """Lê uma chave do Redis."""
+        if not self.redis_client:
+            raise Exception("Cliente Redis não está conectado.")
+        key = input_data.get("key") if isinstance(input_data, dict) else input_data
+        return {"key": key, "value": self.redis_client.get(key)}
+
+    async def _aget_from_cache(self, input_data: dict):
+        """Versão asyncio de '_get_from_cache' (redis.asyncio)."""
+        if not self.redis_async_client:
+            raise Exception("Cliente Redis não está conectado.")
+        key = input_data.get("key") if isinstance(input_data, dict) else input_data
+        return {"key": key, "value": await self.redis_async_client.get(key)}
+
+    def _local_tool_pool(self, agent_config: dict):
+        """
+        Retorna (script_path, pool). O pool é None quando o Organismo
+        desliga o modo worker ('worker_pool.enabled: false').
+        """
+        tool_config = agent_config["local_tool_config"]
+        script_path = os.path.join(TOOLS_DIR, tool_config["script_path"])
+        pool_config = tool_config.get("worker_pool") or {}
+        if not pool_config.get("enabled", USE_TOOL_WORKERS):
+            return script_path, None
+        return script_path, self.tool_pools.get_pool(script_path, pool_config)
+
+    def _run_local_tool(self, agent_config: dict, input_data: any, on_chunk=None):
+        """
+        Executa uma ferramenta local: no pool de workers ou em um subprocesso novo.
+        'on_chunk' recebe os resultados parciais das ferramentas em streaming
+        (só no modo worker; ex: cada página do OCR).
+        """
+        script_path, pool = self._local_tool_pool(agent_config)
+        if pool is None:
+            return self._run_local_script(script_path, input_data)
+        tool = os.path.basename(script_path)
+        print(f"Executando ferramenta local (worker): {tool}")
+        started = time.perf_counter()
+        with span("tool.io", tool=tool, mode="worker"):
+            response = pool.call(input_data, on_chunk)
+        TOOL_RUN_DURATION.labels(tool=tool, mode="worker").observe(time.perf_counter() - started)
+        return self._parse_worker_response(script_path, response)
+
+    async def _arun_local_tool(self, agent_config: dict, input_data: any, on_chunk=None):
+        """Versão asyncio de '_run_local_tool'."""
+        script_path, pool = self._local_tool_pool(agent_config)
+        if pool is None:
+            return await self._arun_local_script(script_path, input_data)
+        tool = os.path.basename(script_path)
+        print(f"Executando ferramenta local (worker): {tool}")
+        started = time.perf_counter()
+        # O pool é síncrono (threads lendo os pipes); não bloqueia o event loop
+        if on_chunk is not None:
+            loop = asyncio.get_running_loop()
+            on_chunk = functools.partial(loop.call_soon_threadsafe, on_chunk)
+        with span("tool.io", tool=tool, mode="worker"):
+            response = await asyncio.to_thread(pool.call, input_data, on_chunk)
+        TOOL_RUN_DURATION.labels(tool=tool, mode="worker").observe(time.perf_counter() - started)
+        return self._parse_worker_response(script_path, response)
+
+    def _check_tool_output(self, script_path: str, output: any, error: str = None):
+        """Lança erro se a ferramenta falhou; senão, retorna a saída."""
+        if error is None and isinstance(output, dict) and "error" in output:
+            error = output["error"]
+        if error is not None:
+            raise Exception(f"Ferramenta {os.path.basename(script_path)} falhou: {error}")
+        return output
+
+    def _parse_worker_response(self, script_path: str, response: dict):
+        """Interpreta a resposta do protocolo worker ({'output'} ou {'error'})."""
+        return self._check_tool_output(script_path, response.get("output"), response.get("error"))
+
+    def _parse_tool_output(self, script_path: str, returncode: int, stdout: str, stderr: str):
+        """Interpreta o JSON que um script de 'organisms/tools/' imprimiu."""
+        script_name = os.path.basename(script_path)
+        try:
+            output = json.loads(stdout)
+        except json.JSONDecodeError:
+            raise Exception(f"Saída inválida de {script_name}: {stderr.strip()}")
+
+        if returncode != 0 and not (isinstance(output, dict) and "error" in output):
+            return self._check_tool_output(script_path, output, stderr.strip())
+        return self._check_tool_output(script_path, output)
+
+    def _run_local_script(self, script_path: str, input_data: any):
+        """
+        Executa um script de 'organisms/tools/' em um subprocesso.
+        O 'input_data' vai como JSON pelo stdin; a saída é o JSON do stdout.
+        """
+        tool = os.path.basename(script_path)
+        print(f"Executando ferramenta local: {tool}")
+        started = time.perf_counter()
+        with span("tool.spawn", tool=tool, mode="subprocess"):
+            process = subprocess.Popen(
+                [sys.executable, script_path],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+        spawned = time.perf_counter()
+        TOOL_SPAWN_DURATION.labels(tool=tool, mode="subprocess").observe(spawned - started)
+        with span("tool.io", tool=tool, mode="subprocess"):
+            try:
+                stdout, stderr = process.communicate(json.dumps(input_data), timeout=LOCAL_TOOL_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise
+        TOOL_RUN_DURATION.labels(tool=tool, mode="subprocess").observe(time.perf_counter() - spawned)
+        return self._parse_tool_output(script_path, process.returncode, stdout, stderr)
+
+    async def _arun_local_script(self, script_path: str, input_data: any):
+        """Versão asyncio de '_run_local_script' (asyncio subprocess)."""
+        tool = os.path.basename(script_path)
+        print(f"Executando ferramenta local (async): {tool}")
+        started = time.perf_counter()
+        with span("tool.spawn", tool=tool, mode="subprocess"):
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, script_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        spawned = time.perf_counter()
+        TOOL_SPAWN_DURATION.labels(tool=tool, mode="subprocess").observe(spawned - started)
+        with span("tool.io", tool=tool, mode="subprocess"):
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(json.dumps(input_data).encode("utf-8")),
+                    timeout=LOCAL_TOOL_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise Exception(f"Ferramenta {tool} excedeu {LOCAL_TOOL_TIMEOUT}s.")
+        TOOL_RUN_DURATION.labels(tool=tool, mode="subprocess").observe(time.perf_counter() - spawned)
+        return self._parse_tool_output(
+            script_path, process.returncode, stdout.decode("utf-8"), stderr.decode("utf-8")
+        )
 
-    # ... _run_local_script ...
-    # (Esta função permanece a mesma)
+    async def aclose(self):
+        """Fecha os clientes assíncronos (chamado no shutdown da API)."""
+        self.registry.stop_watching()
+        self.tool_pools.close()
+        if self._graph_writer:
+            # Grava o que ainda está no buffer antes de fechar o driver
+            await asyncio.to_thread(self._graph_writer.close)
+        await self.connections.aclose()
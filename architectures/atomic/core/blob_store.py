@@ -0,0 +1,296 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Blob Store (Saídas Grandes dos Passos)
+# core/blob_store.py
+# -----------------------------------------------------------------
+#
+# Saídas de passo maiores que ATOMIC_BLOB_THRESHOLD_BYTES (o markdown
+# do OCR de um documento de centenas de páginas, por exemplo) não
+# ficam no contexto da cadeia: são gravadas UMA vez (endereçadas pelo
+# sha256 do conteúdo) e o contexto guarda só uma referência:
+#
+#   {"$blob": "<sha256>", "kind": "text", "size": 1843200, "preview": "# Ficha de..."}
+#
+# A referência é resolvida só quando um passo precisa do valor (os
+# acessores '$.' do registro e o 'resolve' do motor). A resposta da
+# API traz as referências; o conteúdo sai por GET /api/v1/blobs/{id}.
+#
+# Backends (ATOMIC_BLOB_BACKEND):
+#   disk  - arquivos em '.blobs/' lidos com mmap (padrão);
+#   redis - chaves 'atomic:blob:<id>' com TTL (vários hosts);
+#   off   - desliga (tudo fica no contexto, como antes).
+#
+# Validade: ATOMIC_BLOB_TTL_S contada a partir do último uso (gravar ou
+# ler renova o prazo). No disco, os vencidos são apagados a cada
+# ATOMIC_BLOB_PRUNE_INTERVAL_S, disparado pelas gravações. Os
+# checkpoints (core/checkpoints.py) nunca vivem mais que os blobs
+# para os quais apontam.
+#
+# -----------------------------------------------------------------
+
+import os
+import json
+import mmap
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Iterator
+
+from core.metrics import BLOB_STORE_BYTES
+
+BLOB_BACKEND = os.environ.get("ATOMIC_BLOB_BACKEND", "disk")
+BLOB_THRESHOLD_BYTES = int(os.environ.get("ATOMIC_BLOB_THRESHOLD_BYTES", str(256 * 1024)))
+BLOB_DIR = os.environ.get(
+    "ATOMIC_BLOB_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".blobs"),
+)
+# Blobs sem uso há mais que isso são apagados (disk) ou expiram (redis)
+BLOB_TTL_S = int(os.environ.get("ATOMIC_BLOB_TTL_S", "86400"))
+# Intervalo entre as limpezas dos blobs vencidos (backend disk)
+BLOB_PRUNE_INTERVAL_S = int(os.environ.get("ATOMIC_BLOB_PRUNE_INTERVAL_S", "3600"))
+# A mesma URL do motor (core/atomic_engine.py)
+REDIS_URL = os.environ.get("ATOMIC_REDIS_URL", "redis://localhost:6379/0")
+
+BLOB_REF_KEY = "$blob"
+BLOB_PREVIEW_CHARS = 200
+BLOB_CHUNK_BYTES = 64 * 1024
+REDIS_KEY_PREFIX = "atomic:blob:"
+
+
+class BlobNotFound(Exception):
+    """A referência aponta para um blob que não existe (ou já expirou)."""
+
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, dict) and BLOB_REF_KEY in value
+
+
+# --- Backends ---
+
+class DiskBlobBackend:
+    """Um arquivo por blob ('<dir>/<id[:2]>/<id>'), lido com mmap."""
+
+    def __init__(self, directory: str = BLOB_DIR, ttl_s: int = BLOB_TTL_S,
+                 prune_interval_s: int = BLOB_PRUNE_INTERVAL_S):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        self.prune_interval_s = prune_interval_s
+        # Protege o "existe? renova o prazo" do 'put' contra o 'prune' (neste processo)
+        self._lock = threading.Lock()
+        self._pruned_at = float("-inf")
+        os.makedirs(directory, exist_ok=True)
+        self._schedule_prune()
+
+    def path(self, blob_id: str) -> str:
+        return os.path.join(self.directory, blob_id[:2], blob_id)
+
+    def put(self, blob_id: str, data: bytes):
+        path = self.path(blob_id)
+        with self._lock:
+            if self._touch_path(path):
+                return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Grava em um temporário e renomeia: leitores nunca veem meio arquivo
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with self._lock:
+            os.replace(temp_path, path)
+        self._schedule_prune()
+
+    def touch(self, blob_id: str) -> bool:
+        """Renova o prazo do blob. False se ele não existe mais."""
+        with self._lock:
+            return self._touch_path(self.path(blob_id))
+
+    def _touch_path(self, path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _open(self, blob_id: str):
+        path = self.path(blob_id)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(blob_id)
+        # Ler também conta como uso (o 'prune' mede a partir do último uso)
+        self._touch_path(path)
+        return f
+
+    def read_text(self, blob_id: str) -> str:
+        with self._open(blob_id) as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            # Decodifica direto do mapa (sem uma cópia intermediária em bytes)
+            return str(view, "utf-8")
+
+    def iter_chunks(self, blob_id: str) -> Iterator[bytes]:
+        f = self._open(blob_id)
+
+        def chunks():
+            with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for start in range(0, len(view), BLOB_CHUNK_BYTES):
+                    yield view[start:start + BLOB_CHUNK_BYTES]
+        return chunks()
+
+    def _schedule_prune(self):
+        """Dispara o 'prune' em segundo plano se o último foi há mais de 'prune_interval_s'."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned_at < self.prune_interval_s:
+                return
+            self._pruned_at = now
+        threading.Thread(target=self.prune, name="atomic-blob-prune", daemon=True).start()
+
+    def prune(self):
+        """Apaga os blobs sem uso há mais de 'ttl_s'."""
+        cutoff = time.time() - self.ttl_s
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    with self._lock:
+                        if os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+                            removed += 1
+                except OSError:
+                    pass
+        if removed:
+            print(f"✅ Blob store: {removed} blob(s) expirado(s) removido(s).")
+
+
+class RedisBlobBackend:
+    """Blobs no Redis (com TTL), para quando API e workers rodam em hosts diferentes."""
+
+    def __init__(self, redis_url: str = REDIS_URL, ttl_s: int = BLOB_TTL_S):
+        from redis import Redis
+        # Sem 'decode_responses': os blobs são bytes
+        self.redis = Redis.from_url(redis_url)
+        self.ttl_s = ttl_s
+
+    def put(self, blob_id: str, data: bytes):
+        key = REDIS_KEY_PREFIX + blob_id
+        # Já existe: só renova o TTL
+        if not self.redis.expire(key, self.ttl_s):
+            self.redis.set(key, data, ex=self.ttl_s)
+
+    def touch(self, blob_id: str) -> bool:
+        return bool(self.redis.expire(REDIS_KEY_PREFIX + blob_id, self.ttl_s))
+
+    def _get(self, blob_id: str) -> bytes:
+        # Ler também renova o TTL
+        data = self.redis.getex(REDIS_KEY_PREFIX + blob_id, ex=self.ttl_s)
+        if data is None:
+            raise BlobNotFound(blob_id)
+        return data
+
+    def read_text(self, blob_id: str) -> str:
+        return self._get(blob_id).decode("utf-8")
+
+    def iter_chunks(self, blob_id: str) -> Iterator[bytes]:
+        data = memoryview(self._get(blob_id))
+        return (bytes(data[start:start + BLOB_CHUNK_BYTES]) for start in range(0, len(data), BLOB_CHUNK_BYTES))
+
+
+# --- Store ---
+
+class BlobStore:
+    """Troca saídas grandes por referências e resolve as referências sob demanda."""
+
+    def __init__(self, backend_name: str = BLOB_BACKEND, threshold_bytes: int = BLOB_THRESHOLD_BYTES):
+        self.backend_name = backend_name
+        self.threshold_bytes = threshold_bytes
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend_name != "off"
+
+    @property
+    def backend(self):
+        """Criado no primeiro blob (o Redis só é importado se for usado)."""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    if self.backend_name == "redis":
+                        self._backend = RedisBlobBackend()
+                    elif self.backend_name == "disk":
+                        self._backend = DiskBlobBackend()
+                    else:
+                        raise ValueError(f"ATOMIC_BLOB_BACKEND inválido: {self.backend_name!r}")
+        return self._backend
+
+    def offload(self, value):
+        """Retorna 'value' se for pequeno; senão grava o blob e retorna a referência."""
+        if not self.enabled or value is None or is_blob_ref(value):
+            return value
+        if isinstance(value, str):
+            kind, data = "text", value.encode("utf-8")
+        elif isinstance(value, (dict, list)):
+            kind = "json"
+            data = json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+        else:
+            return value
+        if len(data) <= self.threshold_bytes:
+            return value
+
+        blob_id = hashlib.sha256(kind.encode("ascii") + b"\0" + data).hexdigest()
+        self.backend.put(blob_id, data)
+        BLOB_STORE_BYTES.labels(direction="write").inc(len(data))
+        preview = value[:BLOB_PREVIEW_CHARS] if kind == "text" else None
+        return {BLOB_REF_KEY: blob_id, "kind": kind, "size": len(data), "preview": preview}
+
+    def load(self, ref: dict):
+        """O valor original de uma referência."""
+        text = self.backend.read_text(ref[BLOB_REF_KEY])
+        BLOB_STORE_BYTES.labels(direction="read").inc(ref.get("size") or 0)
+        return json.loads(text) if ref.get("kind") == "json" else text
+
+    def resolve(self, value):
+        """Substitui as referências (em qualquer nível de dicts/listas) pelos valores."""
+        if is_blob_ref(value):
+            return self.load(value)
+        if isinstance(value, dict):
+            return {key: self.resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        return value
+
+    def tool_handles(self, value):
+        """
+        Para ferramentas locais com 'blob_refs: true': as referências ganham
+        o 'path' do arquivo (backend disk), para a ferramenta ler sob demanda.
+        Sem arquivo local (redis), a referência é resolvida aqui.
+        """
+        if is_blob_ref(value):
+            if isinstance(self.backend, DiskBlobBackend):
+                return {**value, "path": self.backend.path(value[BLOB_REF_KEY])}
+            return self.load(value)
+        if isinstance(value, dict):
+            return {key: self.tool_handles(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.tool_handles(item) for item in value]
+        return value
+
+    def touch(self, value) -> bool:
+        """
+        Renova o prazo dos blobs referenciados em 'value' (em qualquer nível).
+        False se algum deles já não existe.
+        """
+        if is_blob_ref(value):
+            return self.backend.touch(value[BLOB_REF_KEY])
+        if isinstance(value, dict):
+            return all([self.touch(item) for item in value.values()])
+        if isinstance(value, list):
+            return all([self.touch(item) for item in value])
+        return True
+
+    def iter_chunks(self, blob_id: str) -> Iterator[bytes]:
+        """O conteúdo bruto em pedaços (para o endpoint de streaming)."""
+        return self.backend.iter_chunks(blob_id)
+
+
+blob_store = BlobStore()
@@ -0,0 +1,243 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Checkpoints das Cadeias (Retomada)
+# core/checkpoints.py
+# -----------------------------------------------------------------
+#
+# Opcional por execução: só quem manda um 'run_id' grava checkpoints.
+# Cada passo concluído é gravado com o 'run_id'. Se a cadeia falhar no passo 4 (ex: o Neo4j piscou), o cliente repete o
+# pedido com o mesmo 'run_id' e 'resume: true': o OCR e a extração
+# (os passos caros) não rodam de novo.
+#
+# Um passo só é reaproveitado se a "impressão digital" bater:
+#
+#   sha256(definição do passo + config do agente + input + prompt)
+#
+# O input entra antes de resolver as referências do blob store (que
+# já são o hash do conteúdo). Se um passo anterior rodar de novo e
+# mudar a saída, os passos seguintes também rodam de novo.
+#
+# Backends (ATOMIC_CHECKPOINT_BACKEND):
+#   disk  - um JSONL por execução em '.checkpoints/' (padrão), os
+#           vencidos apagados a cada ATOMIC_CHECKPOINT_PRUNE_INTERVAL_S;
+#   redis - hash 'atomic:checkpoint:<run_id>' com TTL;
+#   off   - desliga.
+#
+# As saídas grandes continuam no blob store: o checkpoint guarda só
+# a referência. Por isso a validade do checkpoint nunca passa a dos
+# blobs, e um passo só é reaproveitado se os blobs dele ainda existem
+# (o reaproveitamento renova o prazo deles).
+#
+# -----------------------------------------------------------------
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Optional
+
+from core.metrics import CHECKPOINT_STEPS
+from core.blob_store import blob_store, BLOB_TTL_S
+
+CHECKPOINT_BACKEND = os.environ.get("ATOMIC_CHECKPOINT_BACKEND", "disk")
+CHECKPOINT_DIR = os.environ.get(
+    "ATOMIC_CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".checkpoints"),
+)
+# Limitada à dos blobs: um checkpoint não pode apontar para um blob já apagado
+CHECKPOINT_TTL_S = min(int(os.environ.get("ATOMIC_CHECKPOINT_TTL_S", "86400")), BLOB_TTL_S)
+# Intervalo entre as limpezas dos checkpoints vencidos (backend disk)
+CHECKPOINT_PRUNE_INTERVAL_S = int(os.environ.get("ATOMIC_CHECKPOINT_PRUNE_INTERVAL_S", "3600"))
+# A mesma URL do motor (core/atomic_engine.py)
+REDIS_URL = os.environ.get("ATOMIC_REDIS_URL", "redis://localhost:6379/0")
+
+REDIS_KEY_PREFIX = "atomic:checkpoint:"
+RUN_ID_PATTERN = "^[A-Za-z0-9_-]{1,64}$"
+
+
+def step_fingerprint(step, context: dict) -> str:
+    """Hash do que define a saída de um passo (ver o cabeçalho)."""
+    payload = json.dumps(
+        {
+            "chain_id": step.chain_id,
+            "step": step.config,
+            "agent": step.agent_config,
+            "input": step.resolve_input(context),
+            "prompt": step.resolve_prompt(context),
+        },
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --- Backends ---
+
+class DiskCheckpointBackend:
+    """'<dir>/<run_id>.jsonl': uma linha por passo concluído (a última vence)."""
+
+    def __init__(self, directory: str = CHECKPOINT_DIR, ttl_s: int = CHECKPOINT_TTL_S,
+                 prune_interval_s: int = CHECKPOINT_PRUNE_INTERVAL_S):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        self.prune_interval_s = prune_interval_s
+        self._lock = threading.Lock()
+        self._pruned_at = float("-inf")
+        os.makedirs(directory, exist_ok=True)
+        self._schedule_prune()
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.jsonl")
+
+    def load(self, run_id: str) -> Dict[int, dict]:
+        entries = {}
+        try:
+            with open(self._path(run_id), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # última linha cortada por uma queda
+                    entries[entry["index"]] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def save(self, run_id: str, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock, open(self._path(run_id), "a", encoding="utf-8") as f:
+            f.write(line)
+        self._schedule_prune()
+
+    def _schedule_prune(self):
+        """Dispara o 'prune' em segundo plano se o último foi há mais de 'prune_interval_s'."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned_at < self.prune_interval_s:
+                return
+            self._pruned_at = now
+        threading.Thread(target=self.prune, name="atomic-checkpoint-prune", daemon=True).start()
+
+    def prune(self):
+        """Apaga os checkpoints sem uso há mais de 'ttl_s'."""
+        cutoff = time.time() - self.ttl_s
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class RedisCheckpointBackend:
+    """Hash por execução (campo = índice do passo), com TTL."""
+
+    def __init__(self, redis_url: str = REDIS_URL, ttl_s: int = CHECKPOINT_TTL_S):
+        from redis import Redis
+        self.redis = Redis.from_url(redis_url, decode_responses=True)
+        self.ttl_s = ttl_s
+
+    def load(self, run_id: str) -> Dict[int, dict]:
+        fields = self.redis.hgetall(REDIS_KEY_PREFIX + run_id)
+        return {int(index): json.loads(entry) for index, entry in fields.items()}
+
+    def save(self, run_id: str, entry: dict):
+        key = REDIS_KEY_PREFIX + run_id
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(key, entry["index"], json.dumps(entry, ensure_ascii=False, default=str))
+        pipe.expire(key, self.ttl_s)
+        pipe.execute()
+
+
+# --- Store ---
+
+class CheckpointStore:
+    def __init__(self, backend_name: str = CHECKPOINT_BACKEND):
+        self.backend_name = backend_name
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend_name != "off"
+
+    @property
+    def backend(self):
+        """Criado na primeira execução (o Redis só é importado se for usado)."""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    if self.backend_name == "redis":
+                        self._backend = RedisCheckpointBackend()
+                    elif self.backend_name == "disk":
+                        self._backend = DiskCheckpointBackend()
+                    else:
+                        raise ValueError(f"ATOMIC_CHECKPOINT_BACKEND inválido: {self.backend_name!r}")
+        return self._backend
+
+    def open(self, chain_id: str, run_id: Optional[str] = None, resume: bool = False) -> "ChainCheckpoint":
+        """
+        O checkpoint de uma execução. Sem 'run_id', nada é gravado. Com
+        'resume', carrega os passos já concluídos com este 'run_id'.
+        """
+        if resume and not run_id:
+            raise ValueError("'resume' exige o 'run_id' da execução a retomar.")
+        if not (self.enabled and run_id):
+            return ChainCheckpoint(self, chain_id, None, {})
+        entries = {}
+        if resume:
+            try:
+                entries = self.backend.load(run_id)
+            except Exception as e:
+                print(f"⚠️ Checkpoint: não foi possível carregar '{run_id}' ({e}). Rodando do início.")
+        return ChainCheckpoint(self, chain_id, run_id, entries)
+
+
+class ChainCheckpoint:
+    """Os passos já concluídos de uma execução (e a gravação dos novos)."""
+
+    def __init__(self, store: CheckpointStore, chain_id: str, run_id: Optional[str], entries: Dict[int, dict]):
+        self.store = store
+        self.chain_id = chain_id
+        self.run_id = run_id
+        self.entries = entries
+
+    @property
+    def active(self) -> bool:
+        """False quando a execução não pediu checkpoints (sem 'run_id')."""
+        return self.run_id is not None
+
+    def fingerprint(self, step, context: dict) -> Optional[str]:
+        return step_fingerprint(step, context) if self.active else None
+
+    def lookup(self, step, fingerprint: Optional[str]):
+        """(True, saída) se o passo pode ser reaproveitado; senão (False, None)."""
+        entry = self.entries.get(step.index)
+        if fingerprint is None or entry is None or entry.get("fingerprint") != fingerprint:
+            return False, None
+        try:
+            available = blob_store.touch(entry["output"])
+        except Exception as e:
+            available = False
+            print(f"⚠️ Checkpoint: blobs do passo {step.name} inacessíveis ({e}).")
+        if not available:
+            # A saída apontava para um blob que já expirou: o passo roda de novo
+            return False, None
+        CHECKPOINT_STEPS.labels(chain_id=self.chain_id, result="reused").inc()
+        return True, entry["output"]
+
+    def save(self, step, fingerprint: Optional[str], output):
+        """Grava a saída (já passada pelo blob store) de um passo concluído."""
+        if fingerprint is None:
+            return
+        entry = {"index": step.index, "step": step.name, "fingerprint": fingerprint,
+                 "output": output, "saved_at": time.time()}
+        try:
+            self.store.backend.save(self.run_id, entry)
+            CHECKPOINT_STEPS.labels(chain_id=self.chain_id, result="saved").inc()
+        except Exception as e:
+            # Sem checkpoint a cadeia continua; só não dá para retomar deste passo
+            print(f"⚠️ Checkpoint: falha ao gravar o passo {step.name} de '{self.run_id}': {e}")
+
+
+checkpoint_store = CheckpointStore()
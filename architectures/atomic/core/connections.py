@@ -0,0 +1,214 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Conexões com a Infra (Ollama, Neo4j, Redis)
+# core/connections.py
+# -----------------------------------------------------------------
+#
+# O AtomicEngine não conecta nada no '__init__': cada serviço tem uma
+# 'factory' que importa a biblioteca (ollama, neo4j, redis) e cria o
+# cliente no primeiro uso. Os clientes já têm pool de conexões próprio
+# (httpx, driver Neo4j, ConnectionPool do Redis) e são reutilizados.
+#
+# Os health checks rodam em segundo plano, todos ao mesmo tempo, a
+# cada ATOMIC_HEALTH_CHECK_INTERVAL_S. Um serviço fora do ar não
+# atrasa a subida do processo: ele só fica 'down' (e o cliente é
+# tratado como ausente) até o próximo check passar.
+#
+#   unknown -> ainda não verificado (o cliente é usado normalmente)
+#   up      -> último check passou
+#   down    -> último check falhou (o motor trata como "não conectado")
+#
+# A API usa o estado para o '/readyz' (core/main_api.py).
+#
+# -----------------------------------------------------------------
+
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Tempo máximo para abrir uma conexão (cada cliente usa o seu)
+CONNECT_TIMEOUT_S = float(os.environ.get("ATOMIC_CONNECT_TIMEOUT_S", "3"))
+HEALTH_CHECK_INTERVAL_S = float(os.environ.get("ATOMIC_HEALTH_CHECK_INTERVAL_S", "15"))
+# Um check que passa disso conta como falha
+HEALTH_CHECK_TIMEOUT_S = float(os.environ.get("ATOMIC_HEALTH_CHECK_TIMEOUT_S", "5"))
+
+STATUS_UNKNOWN = "unknown"
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+
+
+class ServiceConnection:
+    """Cliente (síncrono e assíncrono) de um serviço, criado no primeiro uso."""
+
+    def __init__(self, name: str, factory: Callable, check: Callable,
+                 async_factory: Optional[Callable] = None, async_close: Optional[Callable] = None,
+                 on_up: Optional[Callable] = None, details: Optional[Callable] = None):
+        self.name = name
+        self.factory = factory
+        self.check = check
+        self.async_factory = async_factory
+        self.async_close = async_close
+        self.on_up = on_up
+        # Estado extra para o '/readyz' (ex: os hosts do pool do Ollama)
+        self.details = details
+        self.status = STATUS_UNKNOWN
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+        self._checking = False
+
+    # --- Clientes ---
+
+    def client(self):
+        """O cliente síncrono (criado na primeira chamada), independente do estado."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.factory()
+        return self._client
+
+    def async_client(self):
+        if self._async_client is None and self.async_factory is not None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = self.async_factory()
+        return self._async_client
+
+    def get(self):
+        """O cliente síncrono, ou None se o último health check falhou."""
+        return None if self.status == STATUS_DOWN else self.client()
+
+    def get_async(self):
+        return None if self.status == STATUS_DOWN else self.async_client()
+
+    # --- Health check ---
+
+    def run_check(self):
+        started = time.perf_counter()
+        try:
+            self.check(self.client())
+        except Exception as e:
+            self._set_status(STATUS_DOWN, str(e) or type(e).__name__)
+        else:
+            self._set_status(STATUS_UP, None)
+        finally:
+            self.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.checked_at = time.time()
+            self._checking = False
+
+    def _set_status(self, status: str, error: Optional[str]):
+        previous, self.status, self.error = self.status, status, error
+        if status == previous:
+            return
+        if status == STATUS_UP:
+            print(f"✅ Conectado ao {self.name}.")
+            if self.on_up:
+                try:
+                    self.on_up()
+                except Exception as e:
+                    print(f"⚠️ {self.name}: erro ao preparar o serviço: {e}")
+        else:
+            print(f"⚠️ Erro ao conectar ao {self.name}: {error}.")
+
+    def to_dict(self) -> dict:
+        result = {
+            "status": self.status,
+            "error": self.error,
+            "checked_at": self.checked_at,
+            "latency_ms": self.latency_ms,
+        }
+        if self.details:
+            result["details"] = self.details()
+        return result
+
+
+class ConnectionManager:
+    """Os serviços do motor e a thread dos health checks."""
+
+    def __init__(self, interval_s: float = HEALTH_CHECK_INTERVAL_S, timeout_s: float = HEALTH_CHECK_TIMEOUT_S):
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.services: Dict[str, ServiceConnection] = {}
+        self._stop = threading.Event()
+        self._first_round = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, service: ServiceConnection) -> ServiceConnection:
+        self.services[service.name] = service
+        return service
+
+    def __getitem__(self, name: str) -> ServiceConnection:
+        return self.services[name]
+
+    # --- Health checks em segundo plano ---
+
+    def start_health_checks(self):
+        """Inicia a thread dos checks (uma vez por processo). Não bloqueia."""
+        if self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.services)), thread_name_prefix="atomic-health-check"
+        )
+        self._thread = threading.Thread(target=self._run, name="atomic-health-checks", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check_all()
+            self._first_round.set()
+            self._stop.wait(self.interval_s)
+
+    def check_all(self):
+        """Roda os checks de todos os serviços ao mesmo tempo (espera até 'timeout_s')."""
+        executor = self._executor or ThreadPoolExecutor(max_workers=max(1, len(self.services)))
+        futures = {}
+        for service in self.services.values():
+            if service._checking:
+                continue  # o check anterior ainda não voltou
+            service._checking = True
+            futures[executor.submit(service.run_check)] = service
+        _, pending = wait(futures, timeout=self.timeout_s)
+        for future in pending:
+            service = futures[future]
+            service._set_status(STATUS_DOWN, f"health check excedeu {self.timeout_s}s")
+        if executor is not self._executor:
+            executor.shutdown(wait=False)
+
+    def wait_for_checks(self, timeout: Optional[float] = None) -> bool:
+        """Espera a primeira rodada de checks (ex: antes de o worker pegar jobs)."""
+        return self._first_round.wait(timeout)
+
+    def status(self) -> Dict[str, dict]:
+        return {name: service.to_dict() for name, service in self.services.items()}
+
+    def ready(self, required: Iterable[str]) -> bool:
+        """Todos os serviços obrigatórios passaram no último check."""
+        return all(
+            name in self.services and self.services[name].status == STATUS_UP
+            for name in required
+        )
+
+    def down(self) -> List[str]:
+        return [name for name, service in self.services.items() if service.status == STATUS_DOWN]
+
+    # --- Encerramento ---
+
+    def stop(self):
+        self._stop.set()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    async def aclose(self):
+        """Para os checks e fecha os clientes assíncronos que foram criados."""
+        self.stop()
+        for service in self.services.values():
+            if service._async_client is not None and service.async_close:
+                result = service.async_close(service._async_client)
+                if asyncio.iscoroutine(result):
+                    await result
@@ -0,0 +1,331 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Empacotamento do Contexto dos Prompts
+# core/context_packing.py
+# -----------------------------------------------------------------
+#
+# O contexto de um passo 'llm_chat' (a saída do passo anterior) vai
+# no fim do prompt. Antes ele entrava como 'str(valor)': dicts viravam
+# o repr do Python, com espaços e aspas que só custam tokens. Aqui:
+#
+#   1. dicts/listas viram JSON compacto (sempre);
+#   2. com 'llm_config.context_budget' no Organismo:
+#      - campos que o prompt do passo não menciona saem (se o prompt
+#        menciona pelo menos um campo; senão, tudo fica);
+#      - se ainda passar de 'max_tokens', o excesso é cortado de forma
+#        determinística (mesmo contexto -> mesmo prompt, e o cache do
+#        LLM continua valendo):
+#          truncate - mantém o começo e o fim do texto;
+#          outline  - mantém todos os títulos do Markdown e o começo
+#                     de cada seção (o orçamento é dividido entre elas).
+#        Em JSON, os textos longos e as listas são encurtados e o
+#        resultado continua sendo JSON válido.
+#
+# Os tokens são estimados (sem o tokenizador do modelo): palavras
+# contam ~1 token a cada 4 letras, dígitos e pontuação 1 cada. Os
+# números reais continuam em 'atomic_llm_tokens' (vindos do Ollama).
+#
+# -----------------------------------------------------------------
+
+import os
+import re
+import json
+from typing import Any, List, Optional, Tuple
+
+from core.text_chunking import HEADING_PATTERN
+
+CONTEXT_MAX_TOKENS = int(os.environ.get("ATOMIC_CONTEXT_MAX_TOKENS", "0"))  # 0 = sem limite
+CONTEXT_OVERFLOW = os.environ.get("ATOMIC_CONTEXT_OVERFLOW", "truncate")
+
+OVERFLOW_MODES = ("truncate", "outline")
+# Parte do orçamento que fica com o começo do texto no modo 'truncate'
+HEAD_SHARE = 0.75
+# Menor tamanho (caracteres) de um texto encurtado dentro de um JSON
+MIN_STRING_CHARS = 16
+
+TOKEN_PATTERN = re.compile(r"\d|[^\W\d]+|[^\w\s]")
+FIELD_PATTERN = re.compile(r"[^\W\d]\w*")
+
+
+def packing_settings(agent_config: dict) -> Optional[dict]:
+    """
+    Lê 'llm_config.context_budget' do Organismo (um número ou um dict).
+    Retorna None se não houver orçamento; senão,
+    {'max_tokens', 'drop_unreferenced', 'overflow'}.
+    """
+    setting = (agent_config.get("llm_config") or {}).get("context_budget", CONTEXT_MAX_TOKENS)
+    if not isinstance(setting, dict):
+        setting = {"max_tokens": setting}
+    max_tokens = int(setting.get("max_tokens") or 0)
+    if max_tokens <= 0:
+        return None
+    overflow = setting.get("overflow", CONTEXT_OVERFLOW)
+    if overflow not in OVERFLOW_MODES:
+        raise ValueError(f"context_budget.overflow inválido: {overflow!r} (use {', '.join(OVERFLOW_MODES)})")
+    return {
+        "max_tokens": max_tokens,
+        "drop_unreferenced": bool(setting.get("drop_unreferenced", True)),
+        "overflow": overflow,
+    }
+
+
+# --- Tokens (estimativa) ---
+
+def _piece_tokens(piece: str) -> int:
+    # Palavras: ~4 letras por token; dígitos e pontuação: 1 token cada
+    return (len(piece) + 3) // 4 if piece[0].isalpha() or piece[0] == "_" else 1
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa (determinística) de tokens de um texto."""
+    return sum(_piece_tokens(piece) for piece in TOKEN_PATTERN.findall(text))
+
+
+def _cut(text: str, max_tokens: int, from_end: bool = False) -> str:
+    """O maior começo (ou fim) de 'text' com até 'max_tokens' tokens."""
+    if max_tokens <= 0:
+        return ""
+    matches = list(TOKEN_PATTERN.finditer(text))
+    if from_end:
+        matches.reverse()
+    total, position = 0, (len(text) if from_end else 0)
+    for match in matches:
+        total += _piece_tokens(match.group())
+        if total > max_tokens:
+            break
+        position = match.start() if from_end else match.end()
+    return text[position:] if from_end else text[:position]
+
+
+def _omitted(tokens: int) -> str:
+    return f"[... ~{tokens} tokens omitidos ...]"
+
+
+# --- Serialização ---
+
+def serialize(value: Any) -> str:
+    """Texto do contexto: strings como estão; o resto em JSON compacto."""
+    if isinstance(value, str):
+        return value
+    try:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+# --- Campos não mencionados no prompt ---
+
+def _named(key, prompt: str, names: set) -> bool:
+    """O campo 'key' aparece no prompt (já em minúsculas)?"""
+    key = str(key).lower()
+    if FIELD_PATTERN.fullmatch(key):
+        return key in names  # palavra inteira: 'id' não casa com 'idade'
+    return key in prompt  # ex: 'data-nascimento', 'Nome Completo'
+
+
+def _mentions(value, prompt: str, names: set) -> bool:
+    """Algum campo (em qualquer nível) de 'value' aparece no prompt?"""
+    if isinstance(value, dict):
+        return any(_named(key, prompt, names) or _mentions(item, prompt, names) for key, item in value.items())
+    if isinstance(value, list):
+        return any(_mentions(item, prompt, names) for item in value)
+    return False
+
+
+def _keep_referenced(value, prompt: str, names: set):
+    """
+    Remove os campos que o prompt não menciona. Um campo mencionado fica
+    inteiro; um campo não mencionado fica só se algum campo dentro dele
+    for mencionado (e, nele, só esses campos).
+    """
+    if isinstance(value, list):
+        return [_keep_referenced(item, prompt, names) for item in value]
+    if not isinstance(value, dict) or not _mentions(value, prompt, names):
+        return value
+    kept = {}
+    for key, item in value.items():
+        if _named(key, prompt, names):
+            kept[key] = item
+        elif _mentions(item, prompt, names):
+            kept[key] = _keep_referenced(item, prompt, names)
+    return kept
+
+
+def drop_unreferenced(value, prompt: str):
+    """'value' sem os campos que o prompt não menciona (igual, se não menciona nenhum)."""
+    if not isinstance(value, (dict, list)):
+        return value
+    prompt = (prompt or "").lower()
+    return _keep_referenced(value, prompt, set(FIELD_PATTERN.findall(prompt)))
+
+
+# --- Corte do excesso: texto ---
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Mantém o começo e o fim do texto, com um aviso do que saiu no meio."""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    # O aviso do que saiu também conta no orçamento
+    max_tokens = max(0, max_tokens - estimate_tokens(_omitted(total)))
+    head = _cut(text, int(max_tokens * HEAD_SHARE))
+    tail = _cut(text, max_tokens - estimate_tokens(head), from_end=True)
+    omitted = total - estimate_tokens(head) - estimate_tokens(tail)
+    return f"{head}\n{_omitted(omitted)}\n{tail}"
+
+
+def _split_headings(text: str) -> List[Tuple[str, str]]:
+    """(linha do título, corpo) de cada seção; o texto antes do 1º título tem título vazio."""
+    starts = [match.start() for match in HEADING_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = []
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        section = text[start:end]
+        if HEADING_PATTERN.match(section):
+            heading, _, body = section.partition("\n")
+        else:
+            heading, body = "", section
+        sections.append((heading, body))
+    return sections
+
+
+def outline_text(text: str, max_tokens: int) -> str:
+    """
+    Mantém todos os títulos e o começo de cada seção. O orçamento que
+    sobra das seções curtas vai para as longas.
+    """
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    sections = _split_headings(text)
+    # Títulos e um aviso de corte por seção entram antes no orçamento
+    marker = estimate_tokens(_omitted(total))
+    room = max_tokens - sum(estimate_tokens(heading) + marker for heading, _ in sections)
+    if len(sections) < 2 or room <= 0:
+        return truncate_text(text, max_tokens)
+
+    sizes = [estimate_tokens(body) for _, body in sections]
+    shares = [0] * len(sections)
+    pending = sorted(range(len(sections)), key=lambda index: sizes[index])
+    for position, index in enumerate(pending):
+        shares[index] = min(sizes[index], room // (len(pending) - position))
+        room -= shares[index]
+
+    parts = []
+    for (heading, body), size, share in zip(sections, sizes, shares):
+        if heading:
+            parts.append(heading)
+        if share >= size:
+            parts.append(body.rstrip("\n"))
+        else:
+            kept = _cut(body, share).rstrip()
+            parts.append(f"{kept}\n{_omitted(size - estimate_tokens(kept))}" if kept else _omitted(size))
+    return "\n".join(part for part in parts if part)
+
+
+# --- Corte do excesso: JSON ---
+
+def _shorten(value, max_chars: int, max_items: Optional[int]):
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return value[:max_chars] + "…"
+    if isinstance(value, dict):
+        return {key: _shorten(item, max_chars, max_items) for key, item in value.items()}
+    if isinstance(value, list):
+        items = value if max_items is None or len(value) <= max_items else value[:max_items]
+        shortened = [_shorten(item, max_chars, max_items) for item in items]
+        if len(items) < len(value):
+            shortened.append(f"... (+{len(value) - len(items)} itens)")
+        return shortened
+    return value
+
+
+def _longest_string(value) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return max((_longest_string(item) for item in value.values()), default=0)
+    if isinstance(value, list):
+        return max((_longest_string(item) for item in value), default=0)
+    return 0
+
+
+def _longest_list(value) -> int:
+    if isinstance(value, dict):
+        return max((_longest_list(item) for item in value.values()), default=0)
+    if isinstance(value, list):
+        return max([len(value)] + [_longest_list(item) for item in value])
+    return 0
+
+
+def _largest_fitting(high: int, low: int, fits) -> Optional[int]:
+    """Busca binária: o maior n em [low, high] com fits(n), ou None."""
+    if not fits(low):
+        return None
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def shrink_json(value, max_tokens: int) -> str:
+    """
+    JSON compacto com até 'max_tokens': primeiro encurta os textos mais
+    longos (todos com o mesmo limite), depois as listas. Se nem assim
+    couber, corta o JSON como texto.
+    """
+    text = serialize(value)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    def fits_chars(max_chars: int) -> bool:
+        return estimate_tokens(serialize(_shorten(value, max_chars, None))) <= max_tokens
+
+    max_chars = _largest_fitting(_longest_string(value), MIN_STRING_CHARS, fits_chars)
+    if max_chars is not None:
+        return serialize(_shorten(value, max_chars, None))
+
+    def fits_items(max_items: int) -> bool:
+        return estimate_tokens(serialize(_shorten(value, MIN_STRING_CHARS, max_items))) <= max_tokens
+
+    max_items = _largest_fitting(_longest_list(value), 1, fits_items)
+    if max_items is not None:
+        return serialize(_shorten(value, MIN_STRING_CHARS, max_items))
+    return truncate_text(text, max_tokens)
+
+
+# --- Entrada ---
+
+def pack_context(context_data: Any, step_prompt: str, settings: Optional[dict]) -> Tuple[str, dict]:
+    """
+    O texto do contexto para o prompt e um resumo do que foi feito:
+    {'raw_tokens', 'tokens', 'dropped_fields', 'truncated'} (tokens
+    só com orçamento; sem ele, só a serialização compacta).
+    """
+    if settings is None:
+        return serialize(context_data), {}
+
+    raw_text = serialize(context_data)
+    stats = {"raw_tokens": estimate_tokens(raw_text), "dropped_fields": False, "truncated": False}
+    value = context_data
+    if settings["drop_unreferenced"] and isinstance(value, (dict, list)):
+        value = drop_unreferenced(value, step_prompt)
+        stats["dropped_fields"] = value != context_data
+
+    text = serialize(value)
+    tokens = estimate_tokens(text)
+    if tokens > settings["max_tokens"]:
+        stats["truncated"] = True
+        if isinstance(value, (dict, list)):
+            text = shrink_json(value, settings["max_tokens"])
+        elif settings["overflow"] == "outline":
+            text = outline_text(text, settings["max_tokens"])
+        else:
+            text = truncate_text(text, settings["max_tokens"])
+        tokens = estimate_tokens(text)
+    stats["tokens"] = tokens
+    return text, stats
@@ -0,0 +1,313 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Mapa Cognitivo (Neo4j -> React Flow)
+# core/graph_map.py
+# -----------------------------------------------------------------
+#
+# Consultas de '/api/v1/graph/map'. Nunca devolve o grafo inteiro:
+#
+#   - vizinhança: 'center' (elementId) + 'depth' saltos;
+#   - viewport:   'bbox' sobre as posições salvas pelo front (_x, _y);
+#   - rótulo:     'label' (ex: Aluno), usa os índices do rótulo;
+#
+# sempre com 'limit' nós por página e um 'cursor' para a próxima.
+#
+# Deltas: toda escrita (GraphWriter, layout) grava 'n._changed_at'
+# (ms). Cada resposta traz 'version'; com 'since=<version>' a próxima
+# consulta devolve só o que mudou depois disso. Como os timestamps
+# são do início da transação, o delta repete uma pequena janela
+# (ATOMIC_GRAPH_DELTA_OVERLAP_MS): o front faz "upsert" por id.
+#
+# Cache: as respostas ficam em memória por ATOMIC_GRAPH_MAP_CACHE_TTL_S
+# (e são invalidadas quando o GraphWriter deste processo grava um
+# lote). O ETag é o hash do corpo; com If-None-Match a API responde 304.
+#
+# -----------------------------------------------------------------
+
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+GRAPH_MAP_DEFAULT_LIMIT = int(os.environ.get("ATOMIC_GRAPH_MAP_DEFAULT_LIMIT", "500"))
+GRAPH_MAP_MAX_LIMIT = int(os.environ.get("ATOMIC_GRAPH_MAP_MAX_LIMIT", "2000"))
+# Arestas por página (contadas a partir dos nós da página)
+GRAPH_MAP_EDGE_LIMIT = int(os.environ.get("ATOMIC_GRAPH_MAP_EDGE_LIMIT", "5000"))
+GRAPH_MAP_MAX_DEPTH = 3
+GRAPH_MAP_CACHE_TTL_S = float(os.environ.get("ATOMIC_GRAPH_MAP_CACHE_TTL_S", "5"))
+GRAPH_MAP_CACHE_MAX_ENTRIES = int(os.environ.get("ATOMIC_GRAPH_MAP_CACHE_MAX_ENTRIES", "256"))
+GRAPH_DELTA_OVERLAP_MS = int(os.environ.get("ATOMIC_GRAPH_DELTA_OVERLAP_MS", "2000"))
+
+# Propriedades internas (não vão para 'data.properties')
+INTERNAL_PREFIX = "_"
+# Propriedades usadas como rótulo do nó, nesta ordem
+DISPLAY_PROPERTIES = ("nome", "name", "titulo", "title")
+
+
+class GraphMapQuery:
+    """Parâmetros já validados de uma consulta ao mapa."""
+
+    def __init__(self, limit: int = GRAPH_MAP_DEFAULT_LIMIT, cursor: Optional[str] = None,
+                 center: Optional[str] = None, depth: int = 1, label: Optional[str] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None, since: Optional[int] = None):
+        self.limit = limit
+        self.cursor = cursor
+        self.center = center
+        self.depth = depth
+        self.label = label
+        self.bbox = bbox
+        self.since = since
+
+    def cache_key(self) -> str:
+        return json.dumps(self.__dict__, sort_keys=True, default=str)
+
+
+# --- Cursor (keyset: _changed_at, elementId) ---
+
+def encode_cursor(changed_at: int, node_id: str) -> str:
+    raw = json.dumps([changed_at, node_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    """Lança ValueError se o cursor não veio desta API."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        changed_at, node_id = json.loads(raw)
+        return int(changed_at), str(node_id)
+    except Exception:
+        raise ValueError("Cursor inválido.")
+
+
+def parse_bbox(value: str) -> Tuple[float, float, float, float]:
+    """'x_min,y_min,x_max,y_max' -> tupla. Lança ValueError."""
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError("bbox deve ser 'x_min,y_min,x_max,y_max'.")
+    x_min, y_min, x_max, y_max = (float(part) for part in parts)
+    if x_min > x_max or y_min > y_max:
+        raise ValueError("bbox com mínimo maior que o máximo.")
+    return x_min, y_min, x_max, y_max
+
+
+# --- Cypher ---
+
+def build_nodes_query(query: GraphMapQuery) -> Tuple[str, dict]:
+    """MATCH dos nós da página, ordenados por (_changed_at, elementId)."""
+    # O rótulo já foi validado (CYPHER_IDENTIFIER_PATTERN) pela API
+    label = f":{query.label}" if query.label else ""
+    parameters = {"limit": query.limit}
+    if query.center:
+        cypher = (
+            "MATCH (c) WHERE elementId(c) = $center "
+            f"MATCH (c)-[*0..{query.depth}]-(n{label}) "
+            "WITH DISTINCT n "
+        )
+        parameters["center"] = query.center
+    else:
+        cypher = f"MATCH (n{label}) "
+        cypher += "WITH n "
+
+    conditions = []
+    if query.bbox:
+        conditions.append("n._x >= $x_min AND n._x <= $x_max AND n._y >= $y_min AND n._y <= $y_max")
+        parameters.update(zip(("x_min", "y_min", "x_max", "y_max"), query.bbox))
+    if query.since is not None:
+        conditions.append("coalesce(n._changed_at, 0) > $since")
+        parameters["since"] = query.since - GRAPH_DELTA_OVERLAP_MS
+    if query.cursor:
+        after_changed_at, after_id = decode_cursor(query.cursor)
+        conditions.append(
+            "(coalesce(n._changed_at, 0) > $after_changed_at OR "
+            "(coalesce(n._changed_at, 0) = $after_changed_at AND elementId(n) > $after_id))"
+        )
+        parameters.update(after_changed_at=after_changed_at, after_id=after_id)
+    if conditions:
+        cypher += "WHERE " + " AND ".join(conditions) + " "
+
+    # limit + 1: descobre se há próxima página sem um COUNT
+    cypher += (
+        "RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS properties, "
+        "coalesce(n._changed_at, 0) AS changed_at "
+        "ORDER BY changed_at, id LIMIT $limit + 1"
+    )
+    return cypher, parameters
+
+
+EDGES_QUERY = (
+    "MATCH (n)-[r]->(m) WHERE elementId(n) IN $ids "
+    "RETURN elementId(r) AS id, elementId(n) AS source, elementId(m) AS target, "
+    "type(r) AS type, properties(r) AS properties "
+    "LIMIT $edge_limit"
+)
+
+LAYOUT_QUERY = (
+    "UNWIND $positions AS p "
+    "MATCH (n) WHERE elementId(n) = p.id "
+    "SET n._x = p.x, n._y = p.y, n._changed_at = timestamp() "
+    "RETURN count(n) AS updated"
+)
+
+
+# --- Formato do React Flow (@xyflow) ---
+
+def _public(properties: dict) -> dict:
+    return {k: v for k, v in properties.items() if not k.startswith(INTERNAL_PREFIX)}
+
+
+def _default_position(node_id: str) -> dict:
+    """Posição estável (hash do id) para nós que o front ainda não posicionou."""
+    digest = hashlib.md5(node_id.encode("utf-8")).digest()
+    return {"x": int.from_bytes(digest[:2], "big") % 2000, "y": int.from_bytes(digest[2:4], "big") % 2000}
+
+
+def to_flow_node(record: dict) -> dict:
+    properties = record["properties"]
+    display = next((properties[key] for key in DISPLAY_PROPERTIES if properties.get(key)), None)
+    first_label = record["labels"][0] if record["labels"] else "Nó"
+    if "_x" in properties and "_y" in properties:
+        position = {"x": properties["_x"], "y": properties["_y"]}
+    else:
+        position = _default_position(record["id"])
+    return {
+        "id": record["id"],
+        "position": position,
+        "data": {
+            "label": f"{first_label}: {display}" if display else first_label,
+            "labels": record["labels"],
+            "properties": _public(properties),
+            "version": properties.get("_version"),
+        },
+    }
+
+
+def to_flow_edge(record: dict) -> dict:
+    return {
+        "id": record["id"],
+        "source": record["source"],
+        "target": record["target"],
+        "label": record["type"],
+        "data": _public(record["properties"]),
+    }
+
+
+def build_page(query: GraphMapQuery, node_records: List[dict], edge_records: List[dict]) -> dict:
+    """Monta a resposta (nós, arestas, cursor e versão) a partir dos registros."""
+    has_more = len(node_records) > query.limit
+    node_records = node_records[:query.limit]
+    last = node_records[-1] if node_records else None
+    next_cursor = encode_cursor(last["changed_at"], last["id"]) if has_more else None
+
+    # 'version' só avança na última página: o front continua pelo cursor antes
+    version = query.since or 0
+    if last is not None and not has_more:
+        version = max(version, last["changed_at"])
+    return {
+        "nodes": [to_flow_node(record) for record in node_records],
+        "edges": [to_flow_edge(record) for record in edge_records],
+        "next_cursor": next_cursor,
+        "version": version,
+        "delta": query.since is not None,
+    }
+
+
+# --- Cache em memória (TTL + LRU) ---
+
+class GraphMapCache:
+    """Corpo JSON + ETag por consulta. A chave inclui a geração do GraphWriter."""
+
+    def __init__(self, ttl_s: float = GRAPH_MAP_CACHE_TTL_S, max_entries: int = GRAPH_MAP_CACHE_MAX_ENTRIES):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (body, etag, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key: str, body: bytes, etag: str):
+        if self.ttl_s <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (body, etag, time.monotonic() + self.ttl_s)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class GraphMapService:
+    """Consulta o Neo4j (driver assíncrono) e guarda as páginas no cache."""
+
+    def __init__(self, neo4j_async_driver, graph_writer=None, cache: Optional[GraphMapCache] = None):
+        self.driver = neo4j_async_driver
+        self.graph_writer = graph_writer
+        self.cache = cache or GraphMapCache()
+
+    def _cache_key(self, query: GraphMapQuery) -> str:
+        generation = self.graph_writer.generation if self.graph_writer else 0
+        return f"{generation}|{query.cache_key()}"
+
+    async def page(self, query: GraphMapQuery) -> Tuple[bytes, str]:
+        """Corpo JSON da página e o ETag (do cache, se ainda válido)."""
+        key = self._cache_key(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        cypher, parameters = build_nodes_query(query)
+
+        async def read(tx):
+            result = await tx.run(cypher, parameters)
+            nodes = [record.data() async for record in result]
+            ids = [record["id"] for record in nodes[:query.limit]]
+            edges = []
+            if ids:
+                result = await tx.run(EDGES_QUERY, ids=ids, edge_limit=GRAPH_MAP_EDGE_LIMIT)
+                edges = [record.data() async for record in result]
+            return nodes, edges
+
+        async with self.driver.session() as session:
+            node_records, edge_records = await session.execute_read(read)
+
+        page = build_page(query, node_records, edge_records)
+        body = json.dumps(page, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        etag = etag_for(body)
+        self.cache.set(key, body, etag)
+        return body, etag
+
+    async def save_layout(self, positions: List[dict]) -> int:
+        """Grava as posições arrastadas no front (_x, _y); também contam como mudança."""
+        async with self.driver.session() as session:
+            async def write(tx):
+                result = await tx.run(LAYOUT_QUERY, positions=positions)
+                record = await result.single()
+                return record["updated"]
+            updated = await session.execute_write(write)
+        self.cache.clear()
+        return updated
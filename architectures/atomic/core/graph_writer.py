@@ -0,0 +1,362 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Escritor em Lote do Grafo (Neo4j)
+# core/graph_writer.py
+# -----------------------------------------------------------------
+#
+# Fica por trás do 'save_to_graph_db' (Agente MCP). Em vez de uma
+# transação por entidade, as escritas entram em um buffer e vão para
+# o Neo4j em lotes:
+#
+#   UNWIND $rows AS row
+#   MERGE (n:Aluno {cpf_aluno: row.key})
+#   SET n += row.data, n._version = coalesce(n._version, 0) + 1,
+#       n._changed_at = timestamp()
+#
+# O lote sai quando junta ATOMIC_GRAPH_BATCH_SIZE escritas ou quando
+# a mais antiga espera ATOMIC_GRAPH_FLUSH_INTERVAL_MS.
+#
+# Durabilidade: cada escrita é gravada (com fsync) em um write-ahead
+# log ANTES de ser confirmada. Cada processo (API, workers) tem o seu
+# arquivo em ATOMIC_GRAPH_WAL_DIR, preso com um lock exclusivo (fcntl)
+# enquanto o processo vive. Ao iniciar, o writer adota os WALs cujo
+# lock está livre (o dono caiu): as entradas que não chegaram ao Neo4j
+# passam para o seu próprio WAL e são reaplicadas (o MERGE é
+# idempotente). WALs de processos vivos nunca são lidos nem truncados.
+#
+# Confirmação ('ack'):
+#   "commit" (padrão) - espera o lote ser gravado e retorna o node_id;
+#   "wal"             - retorna logo após o fsync no WAL (status "queued");
+#                       para importações em massa.
+#
+# -----------------------------------------------------------------
+
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock, os WALs órfãos não são adotados
+    fcntl = None
+
+GRAPH_BATCH_SIZE = int(os.environ.get("ATOMIC_GRAPH_BATCH_SIZE", "200"))
+GRAPH_FLUSH_INTERVAL_MS = float(os.environ.get("ATOMIC_GRAPH_FLUSH_INTERVAL_MS", "50"))
+GRAPH_WRITE_ACK = os.environ.get("ATOMIC_GRAPH_WRITE_ACK", "commit")
+GRAPH_WAL_DIR = os.environ.get(
+    "ATOMIC_GRAPH_WAL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".graph_wal"),
+)
+# O WAL é truncado quando passa deste tamanho e não há nada pendente
+GRAPH_WAL_MAX_BYTES = int(os.environ.get("ATOMIC_GRAPH_WAL_MAX_BYTES", str(64 * 1024 * 1024)))
+# Espera antes de tentar de novo um lote que falhou por erro temporário
+GRAPH_RETRY_BACKOFF_S = 1.0
+
+WRITE_ACKS = ("commit", "wal")
+
+
+class GraphWrite:
+    """Uma escrita pendente: MERGE de (label {primary_key: key}) com 'data'."""
+
+    __slots__ = ("seq", "label", "primary_key", "key", "data", "ack", "future")
+
+    def __init__(self, seq: int, label: str, primary_key: str, key, data: dict, ack: str):
+        self.seq = seq
+        self.label = label
+        self.primary_key = primary_key
+        self.key = key
+        self.data = data
+        self.ack = ack
+        self.future: Future = Future()
+
+    def to_wal(self) -> dict:
+        return {"seq": self.seq, "label": self.label, "primary_key": self.primary_key,
+                "key": self.key, "data": self.data}
+
+
+def _read_pending(file) -> Tuple[List[dict], int]:
+    """Entradas aceitas e ainda não gravadas de um WAL; e o maior 'seq' visto."""
+    file.seek(0)
+    entries: Dict[int, dict] = {}
+    last_seq = 0
+    for line in file:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # última linha cortada por uma queda
+        if "done" in record:
+            entries.pop(record["done"], None)
+        else:
+            entries[record["seq"]] = record
+            last_seq = max(last_seq, record["seq"])
+    file.seek(0, os.SEEK_END)
+    return [entries[seq] for seq in sorted(entries)], last_seq
+
+
+def _try_lock(file) -> bool:
+    """Lock exclusivo sem esperar. False se outro processo já o tem."""
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+class WriteAheadLog:
+    """
+    Log de escritas em JSONL, um arquivo por processo
+    ('<dir>/graph_writes.<pid>.<id>.wal'). Entradas: {'seq', 'label', ...}
+    (escrita aceita) e {'done': seq} (gravada no Neo4j ou descartada).
+    """
+
+    def __init__(self, directory: str = GRAPH_WAL_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"graph_writes.{os.getpid()}.{uuid.uuid4().hex[:8]}.wal")
+        self._file = open(self.path, "a+", encoding="utf-8")
+        if fcntl is not None:
+            # Mantido até o 'close' (ou até o processo morrer): marca o WAL como "em uso"
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._appended = 0
+        self._synced = 0
+
+    def pending(self) -> Tuple[List[dict], int]:
+        """Entradas deste WAL ainda não gravadas; e o maior 'seq' visto."""
+        with self._lock:
+            return _read_pending(self._file)
+
+    def adopt_orphans(self, start_seq: int) -> List[dict]:
+        """
+        Passa para este WAL as entradas pendentes dos WALs sem dono (lock
+        livre: o processo caiu) e apaga os órfãos. Retorna as entradas
+        adotadas, renumeradas a partir de 'start_seq' + 1.
+        """
+        if fcntl is None:
+            return []
+        adopted: List[dict] = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".wal") or path == self.path:
+                continue
+            try:
+                orphan = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue  # adotado por outro processo
+            with orphan:
+                if not _try_lock(orphan):
+                    continue  # dono vivo
+                try:
+                    # Outro processo pode ter adotado (e apagado) antes do nosso lock
+                    if os.fstat(orphan.fileno()).st_ino != os.stat(path).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries, _ = _read_pending(orphan)
+                for record in entries:
+                    start_seq += 1
+                    record = dict(record, seq=start_seq)
+                    adopted.append(record)
+                    self._write_line(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                # As entradas precisam estar no nosso WAL (fsync) antes de apagar o órfão
+                self._sync()
+                os.remove(path)
+        return adopted
+
+    def _write_line(self, line: str) -> int:
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._appended += 1
+            return self._appended
+
+    def _sync(self, position: Optional[int] = None):
+        # Group commit: um único fsync cobre todas as escritas anexadas até aqui
+        with self._sync_lock:
+            if position is not None and self._synced >= position:
+                return
+            with self._lock:
+                target = self._appended
+            os.fsync(self._file.fileno())
+            self._synced = target
+
+    def append(self, write: GraphWrite):
+        """Grava a escrita e só retorna depois do fsync."""
+        position = self._write_line(json.dumps(write.to_wal(), ensure_ascii=False, default=str) + "\n")
+        self._sync(position)
+
+    def mark_done(self, seqs: List[int]):
+        # Sem fsync: se a marca se perder, a escrita é reaplicada (MERGE idempotente)
+        with self._lock:
+            self._file.write("".join(json.dumps({"done": seq}) + "\n" for seq in seqs))
+            self._file.flush()
+
+    def truncate_if_large(self):
+        with self._lock:
+            if self._file.tell() > GRAPH_WAL_MAX_BYTES:
+                self._file.truncate(0)
+                self._file.seek(0)
+                os.fsync(self._file.fileno())
+
+    def close(self, discard: bool = False):
+        """Fecha (e solta o lock). Com 'discard', apaga o arquivo: nada pendente."""
+        with self._lock:
+            if discard:
+                os.remove(self.path)
+            self._file.close()
+
+
+def _batch_query(label: str, primary_key: str) -> str:
+    # Rótulo e propriedade já validados (CYPHER_IDENTIFIER_PATTERN no motor)
+    return (
+        "UNWIND $rows AS row "
+        f"MERGE (n:{label} {{{primary_key}: row.key}}) "
+        "SET n += row.data, n._version = coalesce(n._version, 0) + 1, n._changed_at = timestamp() "
+        "RETURN row.i AS i, elementId(n) AS node_id"
+    )
+
+
+class GraphWriter:
+    """Buffer + thread de flush + WAL, sobre o driver Neo4j síncrono."""
+
+    def __init__(self, driver, batch_size: int = GRAPH_BATCH_SIZE,
+                 flush_interval_ms: float = GRAPH_FLUSH_INTERVAL_MS, wal_dir: str = GRAPH_WAL_DIR):
+        self.driver = driver
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.wal = WriteAheadLog(wal_dir)
+        self._buffer: List[GraphWrite] = []
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        # Escritas aceitas (no WAL) que ainda não foram gravadas nem descartadas
+        self._unsettled = 0
+        # Incrementa a cada lote gravado (invalida o cache do mapa do grafo)
+        self.generation = 0
+
+        pending = self.wal.adopt_orphans(start_seq=0)
+        self._seq = len(pending)
+        if pending:
+            print(f"⚠️ Grafo: reaplicando {len(pending)} escrita(s) de WALs órfãos que não chegaram ao Neo4j.")
+            self._unsettled = len(pending)
+            for record in pending:
+                self._buffer.append(GraphWrite(
+                    record["seq"], record["label"], record["primary_key"], record["key"], record["data"], "wal"
+                ))
+            self._oldest = time.monotonic()
+
+        self._thread = threading.Thread(target=self._run, name="atomic-graph-writer", daemon=True)
+        self._thread.start()
+
+    # --- Entrada ---
+
+    def submit(self, label: str, primary_key: str, key, data: dict, ack: str = GRAPH_WRITE_ACK) -> Future:
+        """
+        Registra a escrita no WAL e a coloca no buffer. O Future resolve
+        com o node_id (ack 'commit') ou logo após o fsync (ack 'wal').
+        """
+        if ack not in WRITE_ACKS:
+            raise ValueError(f"'ack' inválido: {ack!r} (use {', '.join(WRITE_ACKS)}).")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("GraphWriter já foi fechado.")
+            self._seq += 1
+            self._unsettled += 1
+            write = GraphWrite(self._seq, label, primary_key, key, data, ack)
+
+        self.wal.append(write)
+        if ack == "wal":
+            write.future.set_result(None)
+
+        with self._cond:
+            self._buffer.append(write)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            # Acorda o flusher: lote cheio, ou primeira escrita (começa a contar o intervalo)
+            if len(self._buffer) >= self.batch_size or len(self._buffer) == 1:
+                self._cond.notify()
+        return write.future
+
+    # --- Flush ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._buffer) >= self.batch_size:
+                        break
+                    if self._buffer:
+                        remaining = self._oldest + self.flush_interval_s - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed and not self._buffer:
+                    return
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                self._oldest = time.monotonic() if self._buffer else None
+            self._flush(batch)
+
+    def _flush(self, batch: List[GraphWrite]):
+        groups: Dict[Tuple[str, str], List[GraphWrite]] = {}
+        for write in batch:
+            groups.setdefault((write.label, write.primary_key), []).append(write)
+
+        for (label, primary_key), writes in groups.items():
+            rows = [{"i": i, "key": w.key, "data": w.data} for i, w in enumerate(writes)]
+            try:
+                with self.driver.session() as session:
+                    records = session.execute_write(
+                        lambda tx: list(tx.run(_batch_query(label, primary_key), rows=rows))
+                    )
+            except Exception as e:
+                self._flush_failed(writes, e)
+                continue
+
+            node_ids = {record["i"]: record["node_id"] for record in records}
+            self.generation += 1
+            self._settle(writes)
+            for i, write in enumerate(writes):
+                if not write.future.done():
+                    write.future.set_result(node_ids.get(i))
+
+    def _settle(self, writes: List[GraphWrite]):
+        self.wal.mark_done([w.seq for w in writes])
+        with self._cond:
+            self._unsettled -= len(writes)
+            # Nada pendente (nem a caminho do WAL): o log pode ser zerado
+            if self._unsettled == 0:
+                self.wal.truncate_if_large()
+
+    def _flush_failed(self, writes: List[GraphWrite], error: Exception):
+        retryable = getattr(error, "is_retryable", lambda: False)()
+        print(f"⚠️ Grafo: falha ao gravar lote de {len(writes)} ({error}).")
+        if retryable and not self._closed:
+            # Neo4j fora do ar: as escritas voltam para o buffer (continuam no WAL)
+            time.sleep(GRAPH_RETRY_BACKOFF_S)
+            with self._cond:
+                self._buffer[:0] = writes
+                self._oldest = time.monotonic()
+            return
+        # Erro permanente (ex: dado inválido): não adianta reaplicar
+        self._settle(writes)
+        for write in writes:
+            if not write.future.done():
+                write.future.set_exception(error)
+
+    def close(self, timeout: float = 10):
+        """Grava o que está no buffer e para a thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+        with self._cond:
+            # Tudo gravado: o WAL deste processo não tem mais o que reaplicar
+            discard = self._unsettled == 0 and not self._buffer
+        self.wal.close(discard=discard)
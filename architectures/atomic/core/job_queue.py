@@ -0,0 +1,273 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Fila de Jobs (Redis)
+# core/job_queue.py
+# -----------------------------------------------------------------
+#
+# Execução assíncrona de cadeias: a API só enfileira o job
+# (POST /api/v1/jobs) e responde com o 'job_id'; os workers do motor
+# ('python -m core.job_worker') consomem a fila e gravam o resultado.
+#
+# Layout no Redis:
+#
+#   atomic:jobs:queue:<prioridade>  LIST  ids esperando (high > normal > low)
+#   atomic:jobs:inflight            ZSET  id -> prazo (visibility timeout)
+#   atomic:job:<id>                 HASH  status, chain_id, trigger_input,
+#                                         attempts, result/error, datas
+#
+# Um worker que morre (ou trava) deixa de renovar o prazo do job em
+# 'inflight'; qualquer worker devolve esse job à fila ('requeue_expired')
+# até JOB_MAX_ATTEMPTS tentativas. Todas as transições rodam em scripts
+# Lua, então são atômicas entre processos.
+#
+# -----------------------------------------------------------------
+
+import os
+import json
+import time
+import uuid
+from typing import Optional
+
+JOB_QUEUE_MAX_LENGTH = int(os.environ.get("ATOMIC_JOB_QUEUE_MAX_LENGTH", "1000"))
+JOB_VISIBILITY_TIMEOUT_S = int(os.environ.get("ATOMIC_JOB_VISIBILITY_TIMEOUT_S", "600"))
+JOB_RESULT_TTL_S = int(os.environ.get("ATOMIC_JOB_RESULT_TTL_S", "86400"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("ATOMIC_JOB_MAX_ATTEMPTS", "3"))
+
+# Ordem de consumo: a primeira fila com itens é atendida
+JOB_PRIORITIES = ("high", "normal", "low")
+
+QUEUE_PREFIX = "atomic:jobs:queue:"
+INFLIGHT_KEY = "atomic:jobs:inflight"
+JOB_PREFIX = "atomic:job:"
+
+# KEYS: job, fila de destino, todas as filas | ARGV: limite, job_id, campos...
+SUBMIT_SCRIPT = """
+local pending = 0
+for i = 3, #KEYS do
+    pending = pending + redis.call('LLEN', KEYS[i])
+end
+if pending >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('RPUSH', KEYS[2], ARGV[2])
+return 1
+"""
+
+# KEYS: inflight, filas por prioridade | ARGV: prazo, agora, prefixo do job
+CLAIM_SCRIPT = """
+for i = 2, #KEYS do
+    local job_id = redis.call('LPOP', KEYS[i])
+    if job_id then
+        local job_key = ARGV[3] .. job_id
+        redis.call('ZADD', KEYS[1], ARGV[1], job_id)
+        redis.call('HSET', job_key, 'status', 'running', 'started_at', ARGV[2])
+        redis.call('HINCRBY', job_key, 'attempts', 1)
+        return job_id
+    end
+end
+return false
+"""
+
+# KEYS: inflight | ARGV: agora, prefixo do job, prefixo da fila, tentativas, TTL
+REAP_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, job_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], job_id)
+    local job_key = ARGV[2] .. job_id
+    if redis.call('EXISTS', job_key) == 1 then
+        local attempts = tonumber(redis.call('HGET', job_key, 'attempts') or '0')
+        if attempts >= tonumber(ARGV[4]) then
+            redis.call('HSET', job_key, 'status', 'failed', 'finished_at', ARGV[1],
+                'error', 'Job abandonado: o worker não respondeu em nenhuma das tentativas.')
+            redis.call('EXPIRE', job_key, ARGV[5])
+        else
+            local priority = redis.call('HGET', job_key, 'priority') or 'normal'
+            redis.call('HSET', job_key, 'status', 'queued')
+            redis.call('LPUSH', ARGV[3] .. priority, job_id)
+        end
+    end
+end
+return #expired
+"""
+
+# KEYS: inflight, job | ARGV: job_id, TTL, campos...
+FINISH_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[2], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+class JobQueueFull(Exception):
+    """A fila atingiu JOB_QUEUE_MAX_LENGTH (a API responde 429)."""
+
+
+class JobQueueUnavailable(Exception):
+    """Sem conexão com o Redis."""
+
+
+def _queue_keys():
+    return [QUEUE_PREFIX + priority for priority in JOB_PRIORITIES]
+
+
+def _decode(job_id: str, fields: dict) -> Optional[dict]:
+    """Converte o HASH do Redis no dict retornado pela API."""
+    if not fields:
+        return None
+    job = {
+        "job_id": job_id,
+        "chain_id": fields.get("chain_id"),
+        "status": fields.get("status"),
+        "priority": fields.get("priority"),
+        "attempts": int(fields.get("attempts", 0)),
+        "run_id": fields.get("run_id"),
+    }
+    for key in ("created_at", "started_at", "finished_at"):
+        if key in fields:
+            job[key] = float(fields[key])
+    if "result" in fields:
+        job["result"] = json.loads(fields["result"])
+    if "error" in fields:
+        job["error"] = fields["error"]
+    return job
+
+
+class JobQueue:
+    """
+    Fila de jobs sobre o Redis. Os métodos síncronos são usados pelos
+    workers; 'asubmit'/'aget' pela API (redis.asyncio). Os clientes
+    são os do AtomicEngine (com 'decode_responses=True').
+    """
+
+    def __init__(self, redis_client=None, redis_async_client=None,
+                 max_length: int = JOB_QUEUE_MAX_LENGTH,
+                 visibility_timeout_s: int = JOB_VISIBILITY_TIMEOUT_S,
+                 result_ttl_s: int = JOB_RESULT_TTL_S,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.redis_client = redis_client
+        self.redis_async_client = redis_async_client
+        self.max_length = max_length
+        self.visibility_timeout_s = visibility_timeout_s
+        self.result_ttl_s = result_ttl_s
+        self.max_attempts = max_attempts
+
+    def _submit_args(self, chain_id: str, trigger_input: dict, priority: str,
+                     run_id: Optional[str], resume: bool):
+        if priority not in JOB_PRIORITIES:
+            raise ValueError(f"Prioridade inválida: {priority!r} (use {', '.join(JOB_PRIORITIES)}).")
+        job_id = uuid.uuid4().hex
+        fields = {
+            "chain_id": chain_id,
+            "trigger_input": json.dumps(trigger_input, ensure_ascii=False),
+            # Checkpoints (core/checkpoints.py): sem 'run_id', o próprio job_id
+            "run_id": run_id or job_id,
+            "resume": int(resume),
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": time.time(),
+        }
+        keys = [JOB_PREFIX + job_id, QUEUE_PREFIX + priority] + _queue_keys()
+        args = [self.max_length, job_id]
+        for field, value in fields.items():
+            args += [field, value]
+        return job_id, keys, args
+
+    def _finish_args(self, job_id: str, status: str, result: Optional[dict], error: Optional[str]):
+        keys = [INFLIGHT_KEY, JOB_PREFIX + job_id]
+        args = [job_id, self.result_ttl_s, "status", status, "finished_at", time.time()]
+        if result is not None:
+            args += ["result", json.dumps(result, ensure_ascii=False, default=str)]
+        if error is not None:
+            args += ["error", error]
+        return keys, args
+
+    # --- API (asyncio) ---
+
+    async def asubmit(self, chain_id: str, trigger_input: dict, priority: str = "normal",
+                      run_id: Optional[str] = None, resume: bool = False) -> str:
+        """Enfileira um job. Lança JobQueueFull se a fila estiver cheia."""
+        if self.redis_async_client is None:
+            raise JobQueueUnavailable("Redis não está conectado.")
+        job_id, keys, args = self._submit_args(chain_id, trigger_input, priority, run_id, resume)
+        accepted = await self.redis_async_client.eval(SUBMIT_SCRIPT, len(keys), *keys, *args)
+        if not accepted:
+            raise JobQueueFull(f"Fila de jobs cheia ({self.max_length} pendentes).")
+        return job_id
+
+    async def aget(self, job_id: str) -> Optional[dict]:
+        if self.redis_async_client is None:
+            raise JobQueueUnavailable("Redis não está conectado.")
+        return _decode(job_id, await self.redis_async_client.hgetall(JOB_PREFIX + job_id))
+
+    # --- Workers (síncrono) ---
+
+    def submit(self, chain_id: str, trigger_input: dict, priority: str = "normal",
+               run_id: Optional[str] = None, resume: bool = False) -> str:
+        if self.redis_client is None:
+            raise JobQueueUnavailable("Redis não está conectado.")
+        job_id, keys, args = self._submit_args(chain_id, trigger_input, priority, run_id, resume)
+        if not self.redis_client.eval(SUBMIT_SCRIPT, len(keys), *keys, *args):
+            raise JobQueueFull(f"Fila de jobs cheia ({self.max_length} pendentes).")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        if self.redis_client is None:
+            raise JobQueueUnavailable("Redis não está conectado.")
+        return _decode(job_id, self.redis_client.hgetall(JOB_PREFIX + job_id))
+
+    def claim(self) -> Optional[dict]:
+        """
+        Tira o próximo job (por prioridade) da fila e o marca como
+        'running' em 'inflight'. Retorna {'job_id', 'chain_id',
+        'trigger_input', 'run_id', 'resume'} ou None se a fila estiver vazia.
+        """
+        now = time.time()
+        keys = [INFLIGHT_KEY] + _queue_keys()
+        job_id = self.redis_client.eval(
+            CLAIM_SCRIPT, len(keys), *keys, now + self.visibility_timeout_s, now, JOB_PREFIX
+        )
+        if not job_id:
+            return None
+        chain_id, trigger_input, run_id, resume, attempts = self.redis_client.hmget(
+            JOB_PREFIX + job_id, "chain_id", "trigger_input", "run_id", "resume", "attempts"
+        )
+        return {
+            "job_id": job_id,
+            "chain_id": chain_id,
+            "trigger_input": json.loads(trigger_input) if trigger_input else {},
+            "run_id": run_id or job_id,
+            # Reentrega (o worker anterior morreu): retoma dos passos já concluídos
+            "resume": resume == "1" or int(attempts or 0) > 1,
+        }
+
+    def depth(self) -> dict:
+        """Jobs esperando por prioridade e em execução ('inflight')."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in _queue_keys():
+            pipe.llen(key)
+        pipe.zcard(INFLIGHT_KEY)
+        counts = pipe.execute()
+        return dict(zip(JOB_PRIORITIES + ("inflight",), counts))
+
+    def heartbeat(self, job_id: str):
+        """Renova o prazo de um job em execução (só se ainda estiver em 'inflight')."""
+        self.redis_client.zadd(INFLIGHT_KEY, {job_id: time.time() + self.visibility_timeout_s}, xx=True)
+
+    def complete(self, job_id: str, result: dict):
+        """Grava o resultado. Cadeias que retornam 'error' ficam como 'failed'."""
+        status = "failed" if "error" in result else "succeeded"
+        keys, args = self._finish_args(job_id, status, result, result.get("error"))
+        self.redis_client.eval(FINISH_SCRIPT, len(keys), *keys, *args)
+
+    def fail(self, job_id: str, error: str):
+        keys, args = self._finish_args(job_id, "failed", None, error)
+        self.redis_client.eval(FINISH_SCRIPT, len(keys), *keys, *args)
+
+    def requeue_expired(self) -> int:
+        """Devolve à fila os jobs cujo worker parou de renovar o prazo."""
+        return self.redis_client.eval(
+            REAP_SCRIPT, 1, INFLIGHT_KEY,
+            time.time(), JOB_PREFIX, QUEUE_PREFIX, self.max_attempts, self.result_ttl_s
+        )
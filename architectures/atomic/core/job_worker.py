@@ -0,0 +1,141 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Worker da Fila de Jobs
+# core/job_worker.py
+# -----------------------------------------------------------------
+#
+# Processo separado da API que consome a fila de 'core/job_queue.py'
+# e executa as cadeias com o AtomicEngine. Escala independente da API:
+# suba quantos processos (ou containers) forem necessários.
+#
+# Para executar (na pasta 'architectures/atomic'):
+# python -m core.job_worker --concurrency 4
+#
+# As métricas do worker (Prometheus) ficam em :9101/metrics
+# ('--metrics-port 0' desliga).
+#
+# SIGINT/SIGTERM: para de pegar jobs novos e termina os que já estão
+# rodando. Se o processo morrer no meio, o job volta para a fila depois
+# do visibility timeout.
+#
+# -----------------------------------------------------------------
+
+import os
+import signal
+import argparse
+import threading
+
+from prometheus_client import start_http_server
+
+from core.atomic_engine import AtomicEngine
+from core.job_queue import JobQueue
+from core.metrics import JOB_QUEUE_DEPTH
+
+JOB_WORKER_CONCURRENCY = int(os.environ.get("ATOMIC_JOB_WORKER_CONCURRENCY", "2"))
+# Espera entre consultas quando a fila está vazia
+JOB_POLL_INTERVAL_S = float(os.environ.get("ATOMIC_JOB_POLL_INTERVAL_S", "0.5"))
+JOB_WORKER_METRICS_PORT = int(os.environ.get("ATOMIC_JOB_WORKER_METRICS_PORT", "9101"))
+
+
+class JobWorker:
+    """Executa jobs da fila em 'concurrency' threads."""
+
+    def __init__(self, engine: AtomicEngine, job_queue: JobQueue, concurrency: int = JOB_WORKER_CONCURRENCY):
+        self.engine = engine
+        self.job_queue = job_queue
+        self.concurrency = max(1, concurrency)
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        if not self._stop.is_set():
+            print("⚠️ Parando o worker: terminando os jobs em execução...")
+        self._stop.set()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, name=f"atomic-job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                requeued = self.job_queue.requeue_expired()
+                if requeued:
+                    print(f"⚠️ {requeued} job(s) com o prazo vencido voltaram para a fila.")
+                for queue_name, count in self.job_queue.depth().items():
+                    JOB_QUEUE_DEPTH.labels(queue=queue_name).set(count)
+                job = self.job_queue.claim()
+            except Exception as e:
+                print(f"⚠️ Erro ao consultar a fila de jobs: {e}")
+                self._stop.wait(JOB_POLL_INTERVAL_S * 10)
+                continue
+
+            if job is None:
+                self._stop.wait(JOB_POLL_INTERVAL_S)
+                continue
+            self._process(job)
+
+    def _process(self, job: dict):
+        job_id = job["job_id"]
+        print(f"▶️ Job {job_id}: {job['chain_id']}")
+
+        # Renova o prazo em 'inflight' enquanto a cadeia roda
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.job_queue.visibility_timeout_s / 3):
+                try:
+                    self.job_queue.heartbeat(job_id)
+                except Exception as e:
+                    print(f"⚠️ Falha ao renovar o prazo do job {job_id}: {e}")
+
+        threading.Thread(target=heartbeat, name=f"atomic-job-heartbeat-{job_id}", daemon=True).start()
+        try:
+            result = self.engine.run_chain(
+                job["chain_id"], job["trigger_input"], run_id=job["run_id"], resume=job["resume"]
+            )
+            self.job_queue.complete(job_id, result)
+            print(f"{'⚠️' if 'error' in result else '✅'} Job {job_id} finalizado.")
+        except Exception as e:
+            print(f"⚠️ Job {job_id} falhou: {e}")
+            try:
+                self.job_queue.fail(job_id, f"Erro interno do motor: {e}")
+            except Exception as redis_error:
+                # Sem Redis: o job volta para a fila pelo visibility timeout
+                print(f"⚠️ Não foi possível gravar a falha do job {job_id}: {redis_error}")
+        finally:
+            done.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de jobs do AtomicEngine.")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY,
+                        help="Jobs executados ao mesmo tempo por este processo.")
+    parser.add_argument("--metrics-port", type=int, default=JOB_WORKER_METRICS_PORT,
+                        help="Porta do /metrics (Prometheus) deste worker. 0 desliga.")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    engine = AtomicEngine()
+    # Os checks rodam em paralelo; o worker só espera a primeira rodada
+    engine.start_health_checks()
+    engine.connections.wait_for_checks(timeout=engine.connections.timeout_s + 1)
+    if not engine.redis_client:
+        raise SystemExit("ERRO FATAL: o worker precisa do Redis (fila de jobs).")
+
+    worker = JobWorker(engine, JobQueue(engine.redis_client), concurrency=args.concurrency)
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+
+    print(f"✅ Worker da fila de jobs iniciado ({worker.concurrency} jobs simultâneos).")
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Cache de Respostas do LLM
+# core/llm_cache.py
+# -----------------------------------------------------------------
+#
+# Cache endereçado por conteúdo na frente do 'ollama_client.chat'.
+# A chave é um hash estável de (modelo, mensagens montadas, options):
+# o mesmo prompt para o mesmo modelo devolve a resposta guardada.
+#
+# Backend principal: Redis (com TTL; o limite de memória é o
+# 'maxmemory' do docker-compose). Se o Redis cair, usa um LRU em
+# memória limitado por bytes.
+#
+# Cada Organismo pode ligar/desligar o cache:
+#
+#   llm_config:
+#     cache:
+#       enabled: true
+#       ttl_s: 86400
+#
+# -----------------------------------------------------------------
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from core.metrics import LLM_CACHE_REQUESTS, LLM_CACHE_BYTES, LLM_CACHE_LOCAL_BYTES
+
+CACHE_ENABLED = os.environ.get("ATOMIC_LLM_CACHE", "1") == "1"
+CACHE_TTL_S = int(os.environ.get("ATOMIC_LLM_CACHE_TTL_S", "86400"))
+# Respostas maiores que isso não são guardadas
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get("ATOMIC_LLM_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+# Limite do LRU local (fallback)
+CACHE_LOCAL_MAX_BYTES = int(os.environ.get("ATOMIC_LLM_CACHE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024)))
+# Depois de uma falha do Redis, espera este tempo antes de tentar de novo
+REDIS_RETRY_S = 30
+
+KEY_PREFIX = "atomic:llm:"
+
+
+def llm_cache_key(model: str, messages: list, options: Optional[dict] = None) -> str:
+    """Hash estável (sha256) das mensagens já montadas."""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "options": options or {}},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return KEY_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_settings(agent_config: dict) -> Optional[dict]:
+    """
+    Lê 'llm_config.cache' do Organismo. Retorna None se o cache estiver
+    desligado para este agente; senão, {'ttl_s': ...}.
+    """
+    setting = (agent_config.get("llm_config") or {}).get("cache", CACHE_ENABLED)
+    if isinstance(setting, bool):
+        setting = {"enabled": setting}
+    if not setting.get("enabled", True):
+        return None
+    return {"ttl_s": int(setting.get("ttl_s", CACHE_TTL_S))}
+
+
+class LocalLRUCache:
+    """LRU em memória, limitado por bytes, com TTL por entrada."""
+
+    def __init__(self, max_bytes: int = CACHE_LOCAL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl_s: int):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl_s)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            LLM_CACHE_LOCAL_BYTES.set(self.size_bytes)
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.size_bytes -= len(value.encode("utf-8"))
+
+
+class LLMResponseCache:
+    """Redis primeiro; LRU local quando o Redis não está disponível."""
+
+    def __init__(self, redis_client=None, redis_async_client=None):
+        self.redis_client = redis_client
+        self.redis_async_client = redis_async_client
+        self.local = LocalLRUCache()
+        self._redis_down_until = 0.0
+
+    def _redis_available(self, client) -> bool:
+        return client is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: Exception):
+        print(f"⚠️ Cache do LLM: Redis indisponível ({error}). Usando LRU local por {REDIS_RETRY_S}s.")
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_S
+
+    def _record_get(self, model: str, backend: str, value: Optional[str]):
+        LLM_CACHE_REQUESTS.labels(model=model, result="hit" if value is not None else "miss", backend=backend).inc()
+        if value is not None:
+            LLM_CACHE_BYTES.labels(direction="read").inc(len(value.encode("utf-8")))
+
+    def _record_set(self, value: str) -> bool:
+        size = len(value.encode("utf-8"))
+        if size > CACHE_MAX_ENTRY_BYTES:
+            return False
+        LLM_CACHE_BYTES.labels(direction="write").inc(size)
+        return True
+
+    # --- Síncrono ---
+
+    def get(self, key: str, model: str) -> Optional[str]:
+        if self._redis_available(self.redis_client):
+            try:
+                value = self.redis_client.get(key)
+                self._record_get(model, "redis", value)
+                return value
+            except Exception as e:
+                self._redis_failed(e)
+        value = self.local.get(key)
+        self._record_get(model, "local", value)
+        return value
+
+    def set(self, key: str, value: str, ttl_s: int):
+        if not self._record_set(value):
+            return
+        if self._redis_available(self.redis_client):
+            try:
+                self.redis_client.set(key, value, ex=ttl_s)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        self.local.set(key, value, ttl_s)
+
+    # --- Asyncio ---
+
+    async def aget(self, key: str, model: str) -> Optional[str]:
+        if self._redis_available(self.redis_async_client):
+            try:
+                value = await self.redis_async_client.get(key)
+                self._record_get(model, "redis", value)
+                return value
+            except Exception as e:
+                self._redis_failed(e)
+        value = self.local.get(key)
+        self._record_get(model, "local", value)
+        return value
+
+    async def aset(self, key: str, value: str, ttl_s: int):
+        if not self._record_set(value):
+            return
+        if self._redis_available(self.redis_async_client):
+            try:
+                await self.redis_async_client.set(key, value, ex=ttl_s)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        self.local.set(key, value, ttl_s)
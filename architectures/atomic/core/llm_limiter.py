@@ -0,0 +1,147 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Limite de Concorrência por Modelo
+# core/llm_limiter.py
+# -----------------------------------------------------------------
+#
+# Fica entre o cache (core/llm_cache.py) e o Ollama:
+#
+# 1. Coalescência ("singleflight"): pedidos idênticos (mesmo modelo,
+#    mensagens e options) que chegam enquanto o primeiro ainda está
+#    rodando esperam por ele e recebem a mesma resposta.
+# 2. Semáforo por modelo: no máximo N chamadas simultâneas ao mesmo
+#    modelo, para o Ollama não ficar trocando modelos na GPU.
+#
+# O limite vem do Organismo (ou de ATOMIC_LLM_MAX_CONCURRENCY):
+#
+#   llm_config:
+#     model: "gpt-oss:20b"
+#     max_concurrency: 2
+#
+# As chamadas síncronas (threads) e asyncio (event loop) têm semáforos
+# separados: cada processo usa, na prática, só um dos dois caminhos.
+# No asyncio, semáforos e voos em andamento são de cada event loop
+# (um 'asyncio.run' novo, no job_worker ou nos testes, começa do zero):
+# primitivas do asyncio não podem ser usadas em outro loop.
+#
+# -----------------------------------------------------------------
+
+import os
+import time
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+
+from core.metrics import LLM_QUEUE_WAIT, LLM_COALESCED_REQUESTS
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("ATOMIC_LLM_MAX_CONCURRENCY", "4"))
+
+
+def model_concurrency(agent_config: dict) -> int:
+    """Lê 'llm_config.max_concurrency' do Organismo."""
+    limit = (agent_config.get("llm_config") or {}).get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+    return max(1, int(limit))
+
+
+class _LoopState:
+    """Semáforos e voos em andamento de UM event loop."""
+
+    __slots__ = ("semaphores", "flights", "__weakref__")
+
+    def __init__(self):
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.flights: Dict[str, asyncio.Future] = {}
+
+
+class ModelLimiter:
+    """Semáforos por modelo + coalescência de pedidos idênticos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._flights: Dict[str, Future] = {}
+        # Um estado por event loop; some junto com o loop
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+    def _semaphore(self, model: str, limit: int) -> threading.BoundedSemaphore:
+        # O limite é fixado no primeiro uso do modelo (Organismos com o mesmo modelo dividem o semáforo)
+        with self._lock:
+            if model not in self._semaphores:
+                self._semaphores[model] = threading.BoundedSemaphore(limit)
+            return self._semaphores[model]
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is None:
+                state = self._loops[loop] = _LoopState()
+            return state
+
+    # --- Síncrono ---
+
+    def call(self, model: str, flight_key: str, limit: int, upstream: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        Executa 'upstream()' respeitando o limite do modelo. Retorna
+        (conteúdo, coalescido): 'coalescido' é True se a resposta veio
+        de uma chamada idêntica que já estava em andamento.
+        """
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = Future()
+        if not leader:
+            LLM_COALESCED_REQUESTS.labels(model=model).inc()
+            return flight.result(), True
+
+        try:
+            semaphore = self._semaphore(model, limit)
+            started = time.perf_counter()
+            with semaphore:
+                LLM_QUEUE_WAIT.labels(model=model).observe(time.perf_counter() - started)
+                content = upstream()
+            flight.set_result(content)
+            return content, False
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(flight_key, None)
+
+    # --- Asyncio ---
+
+    async def acall(self, model: str, flight_key: str, limit: int, upstream) -> Tuple[str, bool]:
+        """Versão asyncio de 'call' ('upstream' é uma função que retorna uma coroutine)."""
+        state = self._loop_state()
+        flight = state.flights.get(flight_key)
+        if flight is not None:
+            LLM_COALESCED_REQUESTS.labels(model=model).inc()
+            # shield: o cancelamento de um seguidor não cancela o líder
+            return await asyncio.shield(flight), True
+
+        flight = state.flights[flight_key] = asyncio.get_running_loop().create_future()
+        try:
+            # O limite é fixado no primeiro uso do modelo neste loop
+            semaphore = state.semaphores.get(model)
+            if semaphore is None:
+                semaphore = state.semaphores[model] = asyncio.Semaphore(limit)
+            started = time.perf_counter()
+            async with semaphore:
+                LLM_QUEUE_WAIT.labels(model=model).observe(time.perf_counter() - started)
+                content = await upstream()
+            flight.set_result(content)
+            return content, False
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                flight.cancel()
+            else:
+                flight.set_exception(e)
+            raise
+        finally:
+            state.flights.pop(flight_key, None)
+            # Ninguém esperando: evita o aviso "Future exception was never retrieved"
+            if flight.done() and not flight.cancelled():
+                flight.exception()
@@ -12,16 +12,28 @@
 #
 # -----------------------------------------------------------------
 
+import os
+import json
 import uvicorn
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel, Field
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Body, Query, Path, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response, JSONResponse
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, Any, List, Optional
 
 # Métricas do Prometheus (da Stack C e requirements.txt)
 from prometheus_client import make_asgi_app, Counter
 
 # O Motor (nosso código principal)
-from core.atomic_engine import AtomicEngine
+from core.atomic_engine import AtomicEngine, CYPHER_IDENTIFIER_PATTERN
+from core.job_queue import JobQueue, JobQueueFull, JobQueueUnavailable, JOB_PRIORITIES
+from core.tracing import trace_store, render_waterfall
+from core.blob_store import blob_store, BlobNotFound
+from core.checkpoints import RUN_ID_PATTERN
+from core.graph_map import (
+    GraphMapService, GraphMapQuery, parse_bbox, decode_cursor, etag_matches,
+    GRAPH_MAP_DEFAULT_LIMIT, GRAPH_MAP_MAX_LIMIT, GRAPH_MAP_MAX_DEPTH
+)
 
 # --- Modelos de Dados (Pydantic) ---
 # Define a "forma" dos dados que a API espera.
@@ -40,17 +52,70 @@ class ChainRequest(BaseModel):
         description="Os dados de entrada para o gatilho. Ex: {'file_path': '/tmp/doc.pdf'}",
         examples=[{"file_path": "docs/fatura_exemplo.pdf"}]
     )
+    run_id: Optional[str] = Field(
+        default=None,
+        pattern=RUN_ID_PATTERN,
+        description="ID da execução: liga os checkpoints (retomada). Omitido: nada é gravado."
+    )
+    resume: bool = Field(
+        default=False,
+        description="Retoma a execução 'run_id': passos já concluídos (mesmo input e agente) não rodam de novo. Exige o 'run_id'."
+    )
+
+    @model_validator(mode="after")
+    def _resume_needs_run_id(self):
+        # Sem 'run_id' não há o que retomar (422 em vez de rodar tudo de novo em silêncio)
+        if self.resume and not self.run_id:
+            raise ValueError("'resume' exige o 'run_id' da execução a retomar.")
+        return self
+
+class BatchChainRequest(BaseModel):
+    """
+    Corpo da requisição para executar a mesma cadeia sobre vários gatilhos
+    (ex: a importação de todas as fichas de matrícula de um período).
+    """
+    chain_id: str = Field(
+        ...,
+        description="O ID da 'molécula' a ser executada para cada item.",
+        examples=["proc_matricula_001"]
+    )
+    trigger_inputs: List[Dict[str, Any]] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        description="Um gatilho por item. Os resultados voltam na mesma ordem.",
+        examples=[[{"file_path": "docs/ficha_001.pdf"}, {"file_path": "docs/ficha_002.pdf"}]]
+    )
+    max_concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Máximo de chamadas simultâneas por modelo (padrão do motor se omitido)."
+    )
+
+class JobRequest(ChainRequest):
+    """
+    Corpo da requisição para enfileirar uma cadeia (execução assíncrona
+    pelos workers de 'core/job_worker.py').
+    """
+    priority: str = Field(
+        default="normal",
+        pattern=f"^({'|'.join(JOB_PRIORITIES)})$",
+        description="Prioridade na fila: 'high', 'normal' ou 'low'."
+    )
+
+class NodePosition(BaseModel):
+    id: str = Field(..., description="O elementId do nó (campo 'id' de /api/v1/graph/map).")
+    x: float
+    y: float
+
+class GraphLayoutRequest(BaseModel):
+    """Posições dos nós depois que o usuário os arrasta no mapa."""
+    positions: List[NodePosition] = Field(..., min_length=1, max_length=5000)
 
 # --- Inicialização ---
 
 print("INFO:     Iniciando o servidor FastAPI...")
 
-app = FastAPI(
-    title="Atomic Architecture API (MCP)",
-    description="O gateway de API unificado (api_mcp) e o motor de execução (AtomicEngine).",
-    version="1.0.0"
-)
-
 # Cria a instância única do motor que será usada pela API
 try:
     engine = AtomicEngine()
@@ -60,6 +125,34 @@ except Exception as e:
     print("ERRO FATAL: Verifique as conexões (Docker, Neo4j, Redis, Ollama).")
     engine = None
 
+# Fila de jobs e mapa do grafo: criados no primeiro pedido (ver 'get_job_queue')
+_job_queue: Optional[JobQueue] = None
+_graph_map: Optional[GraphMapService] = None
+
+# Serviços que o /readyz exige (nomes de 'engine.connections')
+READY_SERVICES = [
+    name.strip() for name in os.environ.get("ATOMIC_READY_SERVICES", "Ollama,Neo4j,Redis").split(",") if name.strip()
+]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inicia os health checks (em segundo plano: a API sobe sem esperar
+    Ollama, Neo4j e Redis) e fecha os clientes do motor no shutdown.
+    """
+    if engine:
+        engine.start_health_checks()
+    yield
+    if engine:
+        await engine.aclose()
+
+app = FastAPI(
+    title="Atomic Architecture API (MCP)",
+    description="O gateway de API unificado (api_mcp) e o motor de execução (AtomicEngine).",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
 # --- Métricas (Prometheus) ---
 # Adiciona o endpoint /metrics que o Prometheus (Stack C) irá ler
 metrics_app = make_asgi_app()
@@ -78,7 +171,7 @@ CHAIN_COUNTER = Counter(
 def get_status():
     """Verifica a saúde da API e do motor."""
     engine_status = "online"
-    if not engine or not engine.neo4j_driver or not engine.redis_client or not engine.ollama_client:
+    if not engine or engine.connections.down():
         engine_status = "degradado (verifique os logs do motor)"
     
     return {
@@ -87,10 +180,51 @@ def get_status():
         "message": "Bem-vindo à Atomic Architecture API (MCP)"
     }
 
+@app.get("/healthz", tags=["Status"])
+def liveness():
+    """Liveness: o processo está de pé. Não depende da infra."""
+    return {"status": "alive"}
+
+@app.get("/readyz", tags=["Status"])
+def readiness():
+    """
+    Readiness: o motor subiu e os serviços de ATOMIC_READY_SERVICES
+    passaram no último health check. Responde 503 até lá.
+    """
+    if not engine:
+        return JSONResponse(status_code=503, content={"ready": False, "services": {}})
+    ready = engine.connections.ready(READY_SERVICES)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "required": READY_SERVICES, "services": engine.connections.status()}
+    )
+
+def get_job_queue() -> JobQueue:
+    """A fila de jobs (Redis). Lança 503 se o motor ou o Redis estiverem fora."""
+    global _job_queue
+    if not engine:
+        raise HTTPException(status_code=503, detail="Motor não inicializado. Verifique os serviços de infra (Docker).")
+    if engine.redis_client is None:
+        raise HTTPException(status_code=503, detail="Fila de jobs indisponível: Redis não está conectado.")
+    if _job_queue is None:
+        _job_queue = JobQueue(engine.redis_client, engine.redis_async_client)
+    return _job_queue
+
+def get_graph_map() -> GraphMapService:
+    """O serviço do mapa do grafo (Neo4j). Lança 503 se o Neo4j estiver fora."""
+    global _graph_map
+    if not engine or engine.neo4j_async_driver is None:
+        raise HTTPException(status_code=503, detail="Neo4j não está conectado. Verifique os serviços de infra (Docker).")
+    if _graph_map is None:
+        _graph_map = GraphMapService(engine.neo4j_async_driver, engine.graph_writer)
+    return _graph_map
+
 @app.post("/api/v1/run_chain", tags=["Engine"], response_model=Dict[str, Any])
-def execute_chain(request: ChainRequest = Body(...)):
+async def execute_chain(request: ChainRequest = Body(...)):
     """
     Ponto de entrada principal para executar uma cadeia semântica (Molécula).
+    Roda no event loop ('arun_chain'): não ocupa uma thread do threadpool
+    enquanto espera o Ollama, os scripts locais, o Neo4j ou o Redis.
     """
     if not engine:
         CHAIN_COUNTER.labels(chain_id=request.chain_id, status="failed").inc()
@@ -103,42 +237,238 @@ def execute_chain(request: ChainRequest = Body(...)):
     
     try:
         # Executa a cadeia usando o motor
-        result = engine.run_chain(
+        result = await engine.arun_chain(
             chain_id=request.chain_id,
-            trigger_input=request.trigger_input
+            trigger_input=request.trigger_input,
+            run_id=request.run_id,
+            resume=request.resume
         )
         
         if "error" in result:
             CHAIN_COUNTER.labels(chain_id=request.chain_id, status="error").inc()
-            raise HTTPException(status_code=400, detail=result["error"])
+            # O trace do erro fica em /api/v1/debug/traces/{X-Trace-Id};
+            # com o X-Run-Id (e 'resume': true) o cliente retoma do passo que falhou
+            headers = {}
+            if "trace_id" in result:
+                headers["X-Trace-Id"] = result["trace_id"]
+            if "run_id" in result:
+                headers["X-Run-Id"] = result["run_id"]
+            raise HTTPException(status_code=400, detail=result["error"], headers=headers or None)
         
         CHAIN_COUNTER.labels(chain_id=request.chain_id, status="success").inc()
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         CHAIN_COUNTER.labels(chain_id=request.chain_id, status="failed").inc()
         print(f"ERRO:     Falha crítica ao executar a cadeia {request.chain_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno do motor: {str(e)}")
 
+@app.post("/api/v1/run_chain/stream", tags=["Engine"])
+async def stream_chain(
+    request: ChainRequest = Body(...),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="'ndjson' ou 'sse' (Server-Sent Events)")
+):
+    """
+    Executa uma cadeia e envia o progresso enquanto ela roda: um evento
+    por passo iniciado/concluído (nome, output_variable, duração), os
+    tokens dos passos LLM ao vivo e, no fim, 'chain_end' com o resultado.
+    """
+    if not engine:
+        CHAIN_COUNTER.labels(chain_id=request.chain_id, status="failed").inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Motor não inicializado. Verifique os serviços de infra (Docker)."
+        )
+
+    print(f"INFO:     Recebida requisição (streaming) para a cadeia: {request.chain_id}")
+
+    async def event_stream():
+        async for event in engine.astream_chain(
+            request.chain_id, request.trigger_input, run_id=request.run_id, resume=request.resume
+        ):
+            if event["event"] == "chain_end":
+                status = "error" if "error" in event["result"] else "success"
+                CHAIN_COUNTER.labels(chain_id=request.chain_id, status=status).inc()
+            payload = json.dumps(event, ensure_ascii=False, default=str)
+            if format == "sse":
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+@app.post("/api/v1/run_chain_batch", tags=["Engine"], response_model=Dict[str, Any])
+async def execute_chain_batch(request: BatchChainRequest = Body(...)):
+    """
+    Executa uma cadeia para muitos gatilhos de uma vez, passo a passo:
+    cada passo roda para o lote inteiro, agrupando as chamadas ao mesmo
+    modelo. Cada item traz seu resultado (ou 'error'), na ordem da entrada.
+    """
+    if not engine:
+        CHAIN_COUNTER.labels(chain_id=request.chain_id, status="failed").inc(len(request.trigger_inputs))
+        raise HTTPException(
+            status_code=503,
+            detail="Motor não inicializado. Verifique os serviços de infra (Docker)."
+        )
+
+    print(f"INFO:     Recebido lote de {len(request.trigger_inputs)} itens para a cadeia: {request.chain_id}")
+
+    try:
+        results = await engine.arun_chain_batch(
+            chain_id=request.chain_id,
+            trigger_inputs=request.trigger_inputs,
+            max_concurrency=request.max_concurrency
+        )
+    except Exception as e:
+        CHAIN_COUNTER.labels(chain_id=request.chain_id, status="failed").inc(len(request.trigger_inputs))
+        print(f"ERRO:     Falha crítica ao executar o lote da cadeia {request.chain_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro interno do motor: {str(e)}")
+
+    failed = sum(1 for result in results if "error" in result)
+    CHAIN_COUNTER.labels(chain_id=request.chain_id, status="error").inc(failed)
+    CHAIN_COUNTER.labels(chain_id=request.chain_id, status="success").inc(len(results) - failed)
+    return {
+        "chain_id": request.chain_id,
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+@app.post("/api/v1/jobs", tags=["Jobs"], status_code=202)
+async def submit_job(request: JobRequest = Body(...)):
+    """
+    Enfileira uma cadeia e retorna o 'job_id' na hora. Acompanhe com
+    GET /api/v1/jobs/{job_id}. Responde 429 se a fila estiver cheia.
+    """
+    job_queue = get_job_queue()
+    try:
+        job_id = await job_queue.asubmit(
+            request.chain_id, request.trigger_input, request.priority, request.run_id, request.resume
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except JobQueueUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Fila de jobs indisponível: {e}")
+
+    print(f"INFO:     Job {job_id} enfileirado para a cadeia: {request.chain_id}")
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/api/v1/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str = Path(..., pattern="^[0-9a-f]{32}$")):
+    """
+    Status do job ('queued', 'running', 'succeeded' ou 'failed') e, quando
+    terminado, o resultado da cadeia. Resultados expiram depois de
+    ATOMIC_JOB_RESULT_TTL_S.
+    """
+    job_queue = get_job_queue()
+    try:
+        job = await job_queue.aget(job_id)
+    except JobQueueUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Fila de jobs indisponível: {e}")
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' não encontrado (ou expirado).")
+    return job
+
+@app.get("/api/v1/blobs/{blob_id}", tags=["Engine"])
+def get_blob(blob_id: str = Path(..., pattern="^[0-9a-f]{64}$")):
+    """
+    Conteúdo de uma saída grande guardada no blob store. No resultado das
+    cadeias ela aparece como referência: {"$blob": "<id>", "kind", "size", "preview"}.
+    O conteúdo é enviado em pedaços (sem carregar o blob inteiro na memória).
+    """
+    try:
+        chunks = blob_store.iter_chunks(blob_id)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail=f"Blob '{blob_id}' não encontrado (ou expirado).")
+    return StreamingResponse(chunks, media_type="application/octet-stream")
+
+# --- Debug: traces das cadeias (core/tracing.py) ---
+
+@app.get("/api/v1/debug/traces", tags=["Debug"])
+def list_traces(limit: int = Query(50, ge=1, le=500)):
+    """Traces mais recentes deste processo (buffer circular em memória)."""
+    return {"traces": trace_store.recent(limit)}
+
+@app.get("/api/v1/debug/traces/{trace_id}", tags=["Debug"])
+def get_trace(
+    trace_id: str,
+    format: str = Query("waterfall", pattern="^(waterfall|json)$", description="'waterfall' (texto) ou 'json'")
+):
+    """
+    Um trace completo: um span por passo e os filhos (prompt, modelo,
+    SchemeAdapter, I/O das ferramentas, escritas no banco). O 'trace_id'
+    vem no resultado de /api/v1/run_chain.
+    """
+    trace = trace_store.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace '{trace_id}' não encontrado (ou já saiu do buffer).")
+    if format == "json":
+        return trace.to_dict()
+    return PlainTextResponse(render_waterfall(trace.to_dict()))
+
 # --- Endpoints da API MCP (Exemplos) ---
 # O frontend usará estes endpoints para o "mapa cognitivo"
 
 @app.get("/api/v1/graph/map", tags=["Graph (MCP)"])
-def get_cognitive_map():
-    """
-    (NÃO IMPLEMENTADO) Retorna os nós e arestas do Neo4j
-    para o frontend React (@xyflow).
-    """
-    # TODO: Chamar 'engine.neo4j_driver' para buscar nós
-    # Exemplo de dados que o App.tsx espera:
-    nodes = [
-        {"id": "mcp", "position": {"x": 0, "y": 0}, "data": {"label": "🤖 Agent MCP"}},
-        {"id": "ocr", "position": {"x": -200, "y": 150}, "data": {"label": "📄 Agent OCR"}},
-    ]
-    edges = [
-        {"id": "mcp-ocr", "source": "mcp", "target": "ocr", "label": "Chama"},
-    ]
-    return {"nodes": nodes, "edges": edges}
+async def get_cognitive_map(
+    limit: int = Query(GRAPH_MAP_DEFAULT_LIMIT, ge=1, le=GRAPH_MAP_MAX_LIMIT, description="Máximo de nós por página."),
+    cursor: Optional[str] = Query(None, description="'next_cursor' da página anterior."),
+    center: Optional[str] = Query(None, description="elementId do nó central (vizinhança)."),
+    depth: int = Query(1, ge=0, le=GRAPH_MAP_MAX_DEPTH, description="Saltos a partir de 'center'."),
+    label: Optional[str] = Query(None, description="Só nós com este rótulo. Ex: 'Aluno'."),
+    bbox: Optional[str] = Query(None, description="Viewport 'x_min,y_min,x_max,y_max' (posições salvas)."),
+    since: Optional[int] = Query(None, ge=0, description="'version' de uma resposta anterior: só o que mudou."),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Nós e arestas do Neo4j para o frontend React (@xyflow), nunca o grafo
+    inteiro: no máximo 'limit' nós por página (siga 'next_cursor'),
+    filtrados por vizinhança ('center' + 'depth'), viewport ('bbox') ou
+    rótulo. Para atualizar o mapa, consulte de novo com 'since=<version>'.
+    Responde 304 quando o 'If-None-Match' bate com o ETag.
+    """
+    graph_map = get_graph_map()
+    try:
+        if label and not CYPHER_IDENTIFIER_PATTERN.match(label):
+            raise ValueError(f"Rótulo inválido: {label!r}")
+        if cursor:
+            decode_cursor(cursor)
+        query = GraphMapQuery(
+            limit=limit, cursor=cursor, center=center, depth=depth, label=label,
+            bbox=parse_bbox(bbox) if bbox else None, since=since
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        body, etag = await graph_map.page(query)
+    except Exception as e:
+        print(f"ERRO:     Falha ao consultar o mapa do grafo: {e}")
+        raise HTTPException(status_code=503, detail=f"Erro ao consultar o Neo4j: {e}")
+
+    # 'no-cache': o navegador sempre revalida (barato: 304 sem corpo)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.put("/api/v1/graph/layout", tags=["Graph (MCP)"])
+async def save_graph_layout(request: GraphLayoutRequest = Body(...)):
+    """
+    Salva as posições dos nós arrastados no mapa. São elas que o filtro
+    'bbox' (viewport) de /api/v1/graph/map usa.
+    """
+    graph_map = get_graph_map()
+    try:
+        updated = await graph_map.save_layout([position.model_dump() for position in request.positions])
+    except Exception as e:
+        print(f"ERRO:     Falha ao salvar o layout do grafo: {e}")
+        raise HTTPException(status_code=503, detail=f"Erro ao gravar no Neo4j: {e}")
+    return {"updated": updated}
 
 # --- Runner (para Debug) ---
 if __name__ == "__main__":
@@ -0,0 +1,328 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Métricas do Motor (Prometheus)
+# core/metrics.py
+# -----------------------------------------------------------------
+#
+# Métricas internas do AtomicEngine. Ficam no registro padrão do
+# 'prometheus_client', então aparecem no /metrics do 'main_api.py'
+# (e no servidor de métricas de cada 'core/job_worker.py').
+#
+# -----------------------------------------------------------------
+
+import json
+import time
+import asyncio
+import functools
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets de latência: de chamadas ao Redis (ms) até OCR/LLM grandes (minutos)
+LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Buckets de tamanho (bytes / tokens): potências de 4
+SIZE_BUCKETS = tuple(4 ** i for i in range(2, 13))
+
+# --- Cadeias e passos (core/atomic_engine.py) ---
+
+CHAIN_DURATION = Histogram(
+    "atomic_chain_duration_seconds",
+    "Duração de uma execução completa de cadeia",
+    ["chain_id", "status"],  # status: success/error
+    buckets=LATENCY_BUCKETS
+)
+
+CHAINS_IN_FLIGHT = Gauge(
+    "atomic_chains_in_flight",
+    "Cadeias em execução neste processo",
+    ["chain_id"]
+)
+
+STEP_DURATION = Histogram(
+    "atomic_step_duration_seconds",
+    "Duração de cada passo (por cadeia, passo e tipo de agente)",
+    ["chain_id", "step", "agent_type", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+STEP_PAYLOAD_BYTES = Histogram(
+    "atomic_step_payload_bytes",
+    "Tamanho (JSON) do input recebido e do output produzido por cada passo",
+    ["chain_id", "step", "direction"],  # direction: input/output
+    buckets=SIZE_BUCKETS
+)
+
+# --- Chamadas ao LLM (Ollama) ---
+
+LLM_CALL_DURATION = Histogram(
+    "atomic_llm_call_duration_seconds",
+    "Duração das chamadas ao Ollama (sem cache e sem fila do semáforo)",
+    ["model"],
+    buckets=LATENCY_BUCKETS
+)
+
+LLM_TOKENS = Histogram(
+    "atomic_llm_tokens",
+    "Tokens por chamada ao Ollama",
+    ["model", "kind"],  # kind: prompt/completion
+    buckets=SIZE_BUCKETS
+)
+
+LLM_TOKENS_PER_SECOND = Histogram(
+    "atomic_llm_tokens_per_second",
+    "Velocidade de geração (eval_count / eval_duration do Ollama)",
+    ["model"],
+    buckets=(1, 2.5, 5, 10, 20, 40, 80, 160, 320)
+)
+
+LLM_PROMPT_BYTES = Histogram(
+    "atomic_llm_prompt_bytes",
+    "Tamanho das mensagens enviadas ao modelo (por parte do prompt)",
+    ["model", "part"],  # part: system/user
+    buckets=SIZE_BUCKETS
+)
+
+# --- Contexto dos prompts (core/context_packing.py) ---
+
+CONTEXT_TOKENS = Histogram(
+    "atomic_context_tokens",
+    "Tokens (estimados) do contexto de um passo 'llm_chat' com 'context_budget'",
+    ["model", "stage"],  # stage: raw (antes) / packed (o que vai no prompt)
+    buckets=SIZE_BUCKETS
+)
+
+CONTEXT_PACKING = Counter(
+    "atomic_context_packing_total",
+    "Contextos que perderam campos não mencionados no prompt ou passaram do orçamento",
+    ["model", "action"]  # action: dropped_fields/truncated
+)
+
+# --- Hosts do Ollama (core/ollama_pool.py) ---
+
+OLLAMA_HOST_REQUESTS = Counter(
+    "atomic_ollama_host_requests_total",
+    "Chamadas a cada host do pool do Ollama",
+    ["host", "result"]  # result: ok/error/cancelled
+)
+
+OLLAMA_HOST_IN_FLIGHT = Gauge(
+    "atomic_ollama_host_in_flight",
+    "Chamadas em andamento em cada host do pool do Ollama",
+    ["host"]
+)
+
+OLLAMA_HEDGED_REQUESTS = Counter(
+    "atomic_ollama_hedged_requests_total",
+    "Chamadas que passaram do p95 e ganharam uma cópia em outro host",
+    ["model"]
+)
+
+# --- Ferramentas locais (organisms/tools/) ---
+
+TOOL_SPAWN_DURATION = Histogram(
+    "atomic_tool_spawn_seconds",
+    "Tempo para criar o processo da ferramenta (subprocesso ou worker até o 1º 'ping')",
+    ["tool", "mode"],  # mode: subprocess/worker
+    buckets=LATENCY_BUCKETS
+)
+
+TOOL_RUN_DURATION = Histogram(
+    "atomic_tool_run_seconds",
+    "Tempo de execução de um pedido à ferramenta (I/O pelo stdin/stdout incluído)",
+    ["tool", "mode"],
+    buckets=LATENCY_BUCKETS
+)
+
+# --- Fila de jobs (core/job_queue.py) ---
+
+JOB_QUEUE_DEPTH = Gauge(
+    "atomic_job_queue_depth",
+    "Jobs esperando em cada fila de prioridade (e 'inflight' em execução)",
+    ["queue"]
+)
+
+# --- Checkpoints (core/checkpoints.py) ---
+
+CHECKPOINT_STEPS = Counter(
+    "atomic_checkpoint_steps_total",
+    "Passos gravados no checkpoint (saved) e reaproveitados ao retomar uma execução (reused)",
+    ["chain_id", "result"]
+)
+
+# --- Blob store (core/blob_store.py) ---
+
+BLOB_STORE_BYTES = Counter(
+    "atomic_blob_store_bytes_total",
+    "Bytes de saídas grandes gravados no blob store e lidos de volta",
+    ["direction"]  # write/read
+)
+
+# --- Prompts de sistema (core/prompt_cache.py) ---
+
+PROMPT_BUILD_CACHE = Counter(
+    "atomic_prompt_build_cache_total",
+    "Prompts de sistema servidos do cache (hit) ou montados pelo PromptBuilder (miss)",
+    ["result"]
+)
+
+# --- Cache de respostas do LLM (core/llm_cache.py) ---
+
+LLM_CACHE_REQUESTS = Counter(
+    "atomic_llm_cache_requests_total",
+    "Consultas ao cache de respostas do LLM",
+    ["model", "result", "backend"]  # result: hit/miss; backend: redis/local
+)
+
+LLM_CACHE_BYTES = Counter(
+    "atomic_llm_cache_bytes_total",
+    "Bytes lidos (hits) e gravados no cache de respostas do LLM",
+    ["direction"]  # read/write
+)
+
+LLM_CACHE_LOCAL_BYTES = Gauge(
+    "atomic_llm_cache_local_bytes",
+    "Bytes ocupados pelo cache LRU local (fallback sem Redis)"
+)
+
+# --- Cache semântico do LLM (core/semantic_cache.py) ---
+
+SEMANTIC_CACHE_REQUESTS = Counter(
+    "atomic_semantic_cache_requests_total",
+    "Buscas no cache semântico (hit: vizinho acima do 'threshold' do Organismo)",
+    ["model", "result", "backend"]  # backend: local/qdrant
+)
+
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "atomic_semantic_cache_similarity",
+    "Similaridade do vizinho mais próximo (em acertos e erros): guia o ajuste do 'threshold'",
+    ["model", "result"],
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0)
+)
+
+SEMANTIC_CACHE_EVICTIONS = Counter(
+    "atomic_semantic_cache_evictions_total",
+    "Entradas removidas do cache semântico",
+    ["reason"]  # reason: ttl/capacity
+)
+
+SEMANTIC_CACHE_ENTRIES = Gauge(
+    "atomic_semantic_cache_entries",
+    "Entradas no índice vetorial local do cache semântico"
+)
+
+# --- Limite de concorrência por modelo (core/llm_limiter.py) ---
+
+LLM_QUEUE_WAIT = Histogram(
+    "atomic_llm_queue_wait_seconds",
+    "Tempo esperando uma vaga no semáforo do modelo antes de chamar o Ollama",
+    ["model"],
+    buckets=(0.005, 0.05, 0.25, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+
+LLM_COALESCED_REQUESTS = Counter(
+    "atomic_llm_coalesced_requests_total",
+    "Chamadas ao LLM atendidas por uma chamada idêntica já em andamento",
+    ["model"]
+)
+
+
+# --- Helpers de instrumentação ---
+
+def payload_size(value) -> int:
+    """Tamanho aproximado (bytes) de um payload entre passos."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _observe_chain_end(chain_id: str, result, started: float):
+    CHAINS_IN_FLIGHT.labels(chain_id=chain_id).dec()
+    status = "success" if isinstance(result, dict) and "error" not in result else "error"
+    CHAIN_DURATION.labels(chain_id=chain_id, status=status).observe(time.perf_counter() - started)
+
+
+def instrument_chain(func):
+    """
+    Decorador de 'run_chain'/'arun_chain': duração por cadeia e
+    cadeias em andamento. Funciona com métodos síncronos e async.
+    """
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, chain_id, *args, **kwargs):
+            CHAINS_IN_FLIGHT.labels(chain_id=chain_id).inc()
+            started, result = time.perf_counter(), None
+            try:
+                result = await func(self, chain_id, *args, **kwargs)
+                return result
+            finally:
+                _observe_chain_end(chain_id, result, started)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, chain_id, *args, **kwargs):
+        CHAINS_IN_FLIGHT.labels(chain_id=chain_id).inc()
+        started, result = time.perf_counter(), None
+        try:
+            result = func(self, chain_id, *args, **kwargs)
+            return result
+        finally:
+            _observe_chain_end(chain_id, result, started)
+    return wrapper
+
+
+@contextmanager
+def observe_step(step, input_data):
+    """Mede a duração de um passo ('CompiledStep') e o tamanho do input."""
+    STEP_PAYLOAD_BYTES.labels(chain_id=step.chain_id, step=step.name, direction="input").observe(
+        payload_size(input_data)
+    )
+    started, status = time.perf_counter(), "error"
+    try:
+        yield
+        status = "success"
+    finally:
+        STEP_DURATION.labels(
+            chain_id=step.chain_id, step=step.name, agent_type=step.agent_type, status=status
+        ).observe(time.perf_counter() - started)
+
+
+def observe_step_output(step, output):
+    STEP_PAYLOAD_BYTES.labels(chain_id=step.chain_id, step=step.name, direction="output").observe(
+        payload_size(output)
+    )
+
+
+def observe_prompt(model: str, messages: list, packing: dict):
+    """Tamanho do prompt montado e o que o empacotamento do contexto fez."""
+    for message in messages:
+        LLM_PROMPT_BYTES.labels(model=model, part=message["role"]).observe(len(message["content"].encode("utf-8")))
+    if not packing:
+        return
+    CONTEXT_TOKENS.labels(model=model, stage="raw").observe(packing["raw_tokens"])
+    CONTEXT_TOKENS.labels(model=model, stage="packed").observe(packing["tokens"])
+    for action in ("dropped_fields", "truncated"):
+        if packing[action]:
+            CONTEXT_PACKING.labels(model=model, action=action).inc()
+
+
+def observe_llm_call(model: str, duration_s: float, response):
+    """
+    Registra a chamada ao Ollama. 'response' é a resposta do chat (ou o
+    último pedaço do streaming, que traz os contadores de tokens).
+    """
+    LLM_CALL_DURATION.labels(model=model).observe(duration_s)
+    if response is None:
+        return
+    prompt_tokens = response.get("prompt_eval_count")
+    completion_tokens = response.get("eval_count")
+    eval_duration_ns = response.get("eval_duration")
+    if prompt_tokens is not None:
+        LLM_TOKENS.labels(model=model, kind="prompt").observe(prompt_tokens)
+    if completion_tokens is not None:
+        LLM_TOKENS.labels(model=model, kind="completion").observe(completion_tokens)
+        if eval_duration_ns:
+            LLM_TOKENS_PER_SECOND.labels(model=model).observe(completion_tokens / (eval_duration_ns / 1e9))
@@ -0,0 +1,409 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Pool de Hosts do Ollama
+# core/ollama_pool.py
+# -----------------------------------------------------------------
+#
+# Várias máquinas com Ollama atrás de um só "cliente". Configuração:
+#
+#   ATOMIC_OLLAMA_HOSTS=http://gpu-1:11434,http://gpu-2:11434
+#
+# (sem ela, o pool tem só o ATOMIC_OLLAMA_HOST de sempre).
+#
+# Roteamento: cada chamada vai para o host com o menor custo estimado
+#
+#   latência média do modelo no host x (chamadas em andamento + 1)
+#   + ATOMIC_OLLAMA_COLD_PENALTY_S se o modelo não estiver carregado
+#
+# Os health checks (core/connections.py) leem de cada host os modelos
+# instalados (/api/tags) e os carregados na memória (/api/ps).
+#
+# Falhas: erro de conexão, 5xx ou modelo ausente no host -> a chamada
+# vai para o próximo host (failover). Depois de ATOMIC_OLLAMA_EJECT_AFTER
+# falhas seguidas, o host fica fora por ATOMIC_OLLAMA_EJECT_S.
+#
+# Hedging (opcional, 'llm_config.hedge' ou ATOMIC_OLLAMA_HEDGE=1): se a
+# chamada passar do p95 de latência do modelo, uma cópia vai para um
+# segundo host e vale a resposta que chegar primeiro. Não vale para
+# chamadas em streaming.
+#
+# -----------------------------------------------------------------
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, List, Optional
+
+from core.metrics import OLLAMA_HOST_REQUESTS, OLLAMA_HOST_IN_FLIGHT, OLLAMA_HEDGED_REQUESTS
+from core.tracing import span
+
+OLLAMA_EJECT_AFTER = int(os.environ.get("ATOMIC_OLLAMA_EJECT_AFTER", "2"))
+OLLAMA_EJECT_S = float(os.environ.get("ATOMIC_OLLAMA_EJECT_S", "30"))
+# Custo estimado (s) de carregar o modelo em um host onde ele não está na memória
+OLLAMA_COLD_PENALTY_S = float(os.environ.get("ATOMIC_OLLAMA_COLD_PENALTY_S", "10"))
+OLLAMA_HEDGE = os.environ.get("ATOMIC_OLLAMA_HEDGE", "0") == "1"
+# Só faz hedging depois de conhecer a latência do modelo
+OLLAMA_HEDGE_MIN_SAMPLES = int(os.environ.get("ATOMIC_OLLAMA_HEDGE_MIN_SAMPLES", "20"))
+OLLAMA_HEDGE_PERCENTILE = 0.95
+# Latências guardadas por modelo (para o p95)
+LATENCY_WINDOW = 200
+# Peso da última chamada na média móvel de latência
+LATENCY_EWMA_ALPHA = 0.3
+
+STATUS_UNKNOWN = "unknown"
+STATUS_UP = "up"
+STATUS_DOWN = "down"
+
+
+class OllamaUnavailable(Exception):
+    """Nenhum host do pool pode atender o pedido."""
+
+
+def model_name(model: str) -> str:
+    """'mistral' -> 'mistral:latest' (como o Ollama lista os modelos)."""
+    return model if ":" in model else f"{model}:latest"
+
+
+def is_failover_error(error: Exception) -> bool:
+    """Erros que justificam tentar outro host (o pedido em si não tem problema)."""
+    import httpx
+    from ollama import ResponseError
+    if isinstance(error, ResponseError):
+        # 404: o modelo não está neste host; 5xx: o host está com problema
+        return error.status_code == 404 or error.status_code >= 500
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
+
+def hedge_setting(agent_config: dict) -> bool:
+    """Lê 'llm_config.hedge' do Organismo (padrão: ATOMIC_OLLAMA_HEDGE)."""
+    return bool((agent_config.get("llm_config") or {}).get("hedge", OLLAMA_HEDGE))
+
+
+class OllamaHost:
+    """Um servidor Ollama: clientes (criados no primeiro uso), carga e saúde."""
+
+    def __init__(self, url: str, client_factory, async_client_factory):
+        self.url = url
+        self.client_factory = client_factory
+        self.async_client_factory = async_client_factory
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.status = STATUS_UNKNOWN
+        self.error: Optional[str] = None
+        # None = ainda não sabemos (antes do primeiro health check)
+        self.installed_models: Optional[set] = None
+        self.loaded_models: set = set()
+        self.latency_s: Dict[str, float] = {}
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.client_factory(self.url)
+        return self._client
+
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = self.async_client_factory(self.url)
+        return self._async_client
+
+    def usable(self, now: float) -> bool:
+        return self.status != STATUS_DOWN and now >= self.ejected_until
+
+    def has_model(self, model: str) -> bool:
+        # Lista vazia também conta como "não sabemos" (ex: servidores simulados)
+        return not self.installed_models or model in self.installed_models
+
+    def check(self):
+        """Health check: lista os modelos instalados e os carregados."""
+        client = self.client()
+        try:
+            installed = {m.model for m in client.list().models}
+            loaded = {m.model for m in client.ps().models}
+        except Exception as e:
+            self.status, self.error = STATUS_DOWN, str(e) or type(e).__name__
+            raise
+        self.installed_models, self.loaded_models = installed, loaded
+        self.status, self.error = STATUS_UP, None
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        return {
+            "status": self.status,
+            "error": self.error,
+            "in_flight": self.in_flight,
+            "ejected_for_s": round(self.ejected_until - now, 1) if self.ejected_until > now else 0,
+            "loaded_models": sorted(self.loaded_models),
+            "latency_s": {model: round(latency, 3) for model, latency in self.latency_s.items()},
+        }
+
+
+class OllamaPool:
+    """
+    Clientes de vários hosts com a interface do 'ollama.Client':
+    'chat(...)' (síncrono) e 'achat(...)' (asyncio).
+    """
+
+    def __init__(self, urls: Iterable[str], client_factory, async_client_factory):
+        self.hosts: List[OllamaHost] = [
+            OllamaHost(url.rstrip("/"), client_factory, async_client_factory) for url in urls
+        ]
+        if not self.hosts:
+            raise ValueError("O pool do Ollama precisa de pelo menos um host.")
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # --- Roteamento ---
+
+    def _cost(self, host: OllamaHost, model: str) -> float:
+        latency = host.latency_s.get(model)
+        if latency is None:
+            # Sem histórico neste host: a média dos outros (ou 1s)
+            known = [h.latency_s[model] for h in self.hosts if model in h.latency_s]
+            latency = sum(known) / len(known) if known else 1.0
+        cost = latency * (host.in_flight + 1)
+        if model not in host.loaded_models:
+            cost += OLLAMA_COLD_PENALTY_S
+        return cost
+
+    def _acquire(self, model: str, tried: set) -> Optional[OllamaHost]:
+        """Escolhe o host (e já conta a chamada nele). None se não sobrou nenhum."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [h for h in self.hosts if h not in tried and h.usable(now) and h.has_model(model)]
+            if not candidates:
+                # Último recurso: hosts fora do ar/ejetados também são tentados
+                candidates = [h for h in self.hosts if h not in tried and h.has_model(model)]
+            if not candidates:
+                return None
+            host = min(candidates, key=lambda h: self._cost(h, model))
+            host.in_flight += 1
+            tried.add(host)
+        OLLAMA_HOST_IN_FLIGHT.labels(host=host.url).inc()
+        return host
+
+    def _finish(self, host: OllamaHost, model: str, started: float, outcome):
+        """'outcome': "ok", a exceção da chamada, ou None (cancelada)."""
+        elapsed = time.perf_counter() - started
+        OLLAMA_HOST_IN_FLIGHT.labels(host=host.url).dec()
+        with self._lock:
+            host.in_flight -= 1
+            if outcome == "ok":
+                previous = host.latency_s.get(model)
+                host.latency_s[model] = elapsed if previous is None else (
+                    LATENCY_EWMA_ALPHA * elapsed + (1 - LATENCY_EWMA_ALPHA) * previous
+                )
+                host.loaded_models.add(model)
+                host.failures = 0
+                self._latencies.setdefault(model, deque(maxlen=LATENCY_WINDOW)).append(elapsed)
+            elif isinstance(outcome, Exception) and is_failover_error(outcome):
+                host.failures += 1
+                if host.failures >= OLLAMA_EJECT_AFTER:
+                    host.ejected_until = time.monotonic() + OLLAMA_EJECT_S
+                    host.failures = 0
+                    print(f"⚠️ Ollama: host {host.url} fora do pool por {OLLAMA_EJECT_S}s ({outcome}).")
+        if outcome == "ok":
+            result = "ok"
+        elif isinstance(outcome, Exception):
+            result = "error"
+        else:
+            result = "cancelled"
+        OLLAMA_HOST_REQUESTS.labels(host=host.url, result=result).inc()
+
+    def _hedge_delay(self, model: str, hedge: bool) -> Optional[float]:
+        """O p95 do modelo, se o hedging vale para esta chamada; senão None."""
+        if not hedge:
+            return None
+        now = time.monotonic()
+        if sum(1 for h in self.hosts if h.usable(now) and h.has_model(model)) < 2:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < OLLAMA_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * OLLAMA_HEDGE_PERCENTILE))]
+
+    # --- Síncrono ---
+
+    def _call(self, host: OllamaHost, model: str, kwargs: dict, method: str = "chat"):
+        started = time.perf_counter()
+        outcome = None
+        try:
+            with span("llm.host", host=host.url):
+                response = getattr(host.client(), method)(model=model, **kwargs)
+            outcome = "ok"
+            return response
+        except Exception as e:
+            outcome = e
+            raise
+        finally:
+            self._finish(host, model, started, outcome)
+
+    def _call_failover(self, model: str, kwargs: dict, tried: set, method: str = "chat"):
+        last_error = None
+        while True:
+            host = self._acquire(model, tried)
+            if host is None:
+                raise last_error or OllamaUnavailable(f"Nenhum host do Ollama tem o modelo '{model}'.")
+            try:
+                return self._call(host, model, kwargs, method)
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                last_error = e
+                print(f"⚠️ Ollama: {host.url} falhou ({e}). Tentando outro host.")
+
+    def chat(self, model: str, hedge: bool = False, **kwargs):
+        """Mesmos argumentos do 'ollama.Client.chat' (+ 'hedge')."""
+        model = model_name(model)
+        delay = None if kwargs.get("stream") else self._hedge_delay(model, hedge)
+        tried: set = set()
+        if delay is None:
+            return self._call_failover(model, kwargs, tried)
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(thread_name_prefix="atomic-ollama-hedge")
+        # Os dois pedidos compartilham 'tried': a cópia nunca vai para o mesmo host
+        first = self._executor.submit(contextvars.copy_context().run, self._call_failover, model, kwargs, tried)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        OLLAMA_HEDGED_REQUESTS.labels(model=model).inc()
+        second = self._executor.submit(contextvars.copy_context().run, self._call_failover, model, kwargs, tried)
+        pending, last_error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # O outro pedido termina sozinho; a resposta dele é descartada
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def embed(self, model: str, **kwargs):
+        """Mesmos argumentos do 'ollama.Client.embed' (roteamento e failover, sem hedging)."""
+        return self._call_failover(model_name(model), kwargs, set(), method="embed")
+
+    # --- asyncio ---
+
+    async def _acall(self, host: OllamaHost, model: str, kwargs: dict, method: str = "chat"):
+        started = time.perf_counter()
+        outcome = None
+        try:
+            with span("llm.host", host=host.url):
+                response = await getattr(host.async_client(), method)(model=model, **kwargs)
+            outcome = "ok"
+            return response
+        except Exception as e:
+            outcome = e
+            raise
+        finally:
+            self._finish(host, model, started, outcome)
+
+    async def _acall_failover(self, model: str, kwargs: dict, tried: set, method: str = "chat"):
+        last_error = None
+        while True:
+            host = self._acquire(model, tried)
+            if host is None:
+                raise last_error or OllamaUnavailable(f"Nenhum host do Ollama tem o modelo '{model}'.")
+            try:
+                return await self._acall(host, model, kwargs, method)
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                last_error = e
+                print(f"⚠️ Ollama: {host.url} falhou ({e}). Tentando outro host.")
+
+    async def _astream(self, model: str, kwargs: dict):
+        """Streaming: troca de host só enquanto nenhum pedaço foi entregue."""
+        tried: set = set()
+        last_error = None
+        while True:
+            host = self._acquire(model, tried)
+            if host is None:
+                raise last_error or OllamaUnavailable(f"Nenhum host do Ollama tem o modelo '{model}'.")
+            started = time.perf_counter()
+            outcome, delivered = None, False
+            try:
+                # Sem span aqui: ele ficaria ativo no consumidor entre um pedaço e outro
+                stream = await host.async_client().chat(model=model, **kwargs)
+                async for chunk in stream:
+                    delivered = True
+                    yield chunk
+                outcome = "ok"
+                return
+            except Exception as e:
+                outcome = e
+                if delivered or not is_failover_error(e):
+                    raise
+                last_error = e
+                print(f"⚠️ Ollama: {host.url} falhou ({e}). Tentando outro host.")
+            finally:
+                self._finish(host, model, started, outcome)
+
+    async def achat(self, model: str, hedge: bool = False, **kwargs):
+        """Versão asyncio de 'chat' (com 'stream=True', retorna o iterador assíncrono)."""
+        model = model_name(model)
+        if kwargs.get("stream"):
+            return self._astream(model, kwargs)
+        delay = self._hedge_delay(model, hedge)
+        tried: set = set()
+        if delay is None:
+            return await self._acall_failover(model, kwargs, tried)
+
+        first = asyncio.ensure_future(self._acall_failover(model, kwargs, tried))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        OLLAMA_HEDGED_REQUESTS.labels(model=model).inc()
+        second = asyncio.ensure_future(self._acall_failover(model, kwargs, tried))
+        pending, last_error = {first, second}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # O pedido que perdeu a corrida é cancelado
+            for task in pending:
+                task.cancel()
+
+    async def aembed(self, model: str, **kwargs):
+        """Versão asyncio de 'embed'."""
+        return await self._acall_failover(model_name(model), kwargs, set(), method="embed")
+
+    # --- Health check e estado ---
+
+    def check(self):
+        """Health check de todos os hosts ao mesmo tempo. Falha se nenhum responder."""
+        with ThreadPoolExecutor(max_workers=len(self.hosts)) as executor:
+            futures = {executor.submit(host.check): host for host in self.hosts}
+        errors = [f"{host.url}: {future.exception()}" for future, host in futures.items() if future.exception()]
+        if len(errors) == len(self.hosts):
+            raise OllamaUnavailable("; ".join(errors))
+
+    def status(self) -> Dict[str, dict]:
+        return {host.url: host.to_dict() for host in self.hosts}
+
+    async def aclose(self):
+        """Fecha as conexões dos clientes assíncronos."""
+        for host in self.hosts:
+            if host._async_client is not None:
+                await host._async_client._client.aclose()
+        if self._executor:
+            self._executor.shutdown(wait=False)
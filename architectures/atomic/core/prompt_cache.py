@@ -0,0 +1,55 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Cache dos Prompts de Sistema
+# core/prompt_cache.py
+# -----------------------------------------------------------------
+#
+# O PromptBuilder (ai_reusables) lê os módulos do disco a cada
+# 'build'. Aqui o resultado fica em memória, por lista de módulos,
+# e só é reconstruído quando algum arquivo muda (mtime/tamanho).
+#
+# O prompt de sistema idêntico entre chamadas também é o que permite
+# ao Ollama reaproveitar o prefixo já processado (ver 'keep_alive'
+# em templates/agent_template.yaml).
+#
+# -----------------------------------------------------------------
+
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from core.metrics import PROMPT_BUILD_CACHE
+
+
+class MemoizedPromptBuilder:
+    """Envolve um PromptBuilder: 'build(modules)' com cache invalidado por mtime."""
+
+    def __init__(self, prompt_builder, base_path: str):
+        self.prompt_builder = prompt_builder
+        self.base_path = base_path
+        self._prompts: Dict[Tuple[str, ...], Tuple[tuple, str]] = {}
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, modules: List[str]) -> tuple:
+        fingerprint = []
+        for module in modules:
+            try:
+                stat = os.stat(os.path.join(self.base_path, module))
+                fingerprint.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                fingerprint.append(None)  # o PromptBuilder decide o que fazer
+        return tuple(fingerprint)
+
+    def build(self, modules: List[str]) -> str:
+        key = tuple(modules)
+        fingerprint = self._fingerprint(modules)
+        with self._lock:
+            cached = self._prompts.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            PROMPT_BUILD_CACHE.labels(result="hit").inc()
+            return cached[1]
+
+        PROMPT_BUILD_CACHE.labels(result="miss").inc()
+        prompt = self.prompt_builder.build(modules)
+        with self._lock:
+            self._prompts[key] = (fingerprint, prompt)
+        return prompt
@@ -0,0 +1,285 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Registro de Moléculas e Organismos
+# core/registry.py
+# -----------------------------------------------------------------
+#
+# Lê cada YAML de 'molecules/' e 'organisms/' UMA vez, valida a
+# Molécula e "compila" cada caminho '$.' em um acessor pronto
+# (a string é interpretada só na compilação, não a cada passo).
+#
+# Com o hot-reload ligado (watchfiles), só o arquivo alterado é
+# relido; as Moléculas que dependem dele são recompiladas a partir
+# do YAML já em memória.
+#
+# -----------------------------------------------------------------
+
+import os
+import re
+import atexit
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import yaml
+
+from core.scheduler import build_step_graph
+from core.blob_store import blob_store, is_blob_ref
+
+# Tokens de um caminho '$.': '.chave' ou '[índice]'
+PATH_TOKEN_PATTERN = re.compile(r"\.([^.\[\]]+)|\[(\d+)\]")
+
+
+class ChainDefinitionError(Exception):
+    """A Molécula (ou um de seus agentes) não existe ou é inválida."""
+
+
+# --- Compilação de caminhos '$.' ---
+
+def compile_path(expression: str) -> Callable[[dict], Any]:
+    """
+    Compila um caminho como '$.steps[1].structured_json_data.nome_aluno'
+    em uma função 'accessor(context)'. O acessor retorna None se algum
+    trecho do caminho não existir no contexto.
+
+    Referências do blob store no meio do caminho são carregadas; no fim
+    do caminho, a referência é retornada como está (quem usa resolve).
+    """
+    body = expression[1:]
+    tokens = []
+    position = 0
+    for match in PATH_TOKEN_PATTERN.finditer(body):
+        if match.start() != position:
+            break
+        key, index = match.groups()
+        tokens.append((key, None) if key else (None, int(index)))
+        position = match.end()
+    if position != len(body):
+        raise ChainDefinitionError(f"Caminho inválido: {expression!r}")
+    tokens = tuple(tokens)
+
+    def accessor(context: dict):
+        value = context
+        for key, index in tokens:
+            if is_blob_ref(value):
+                value = blob_store.load(value)
+            if key is not None:
+                value = value.get(key) if isinstance(value, dict) else None
+            else:
+                value = value[index] if isinstance(value, list) and index < len(value) else None
+            if value is None:
+                return None
+        return value
+
+    accessor.expression = expression
+    return accessor
+
+
+def compile_value(spec: Any) -> Callable[[dict], Any]:
+    """
+    Compila um 'input'/'prompt' de passo (string, lista ou dict) em
+    uma função 'resolve(context)'. Strings que começam com '$.' viram
+    acessores; o resto é literal.
+    """
+    if isinstance(spec, str):
+        if spec.startswith("$."):
+            return compile_path(spec)
+        return lambda context: spec
+    if isinstance(spec, list):
+        items = [compile_value(item) for item in spec]
+        return lambda context: [item(context) for item in items]
+    if isinstance(spec, dict):
+        items = [(key, compile_value(value)) for key, value in spec.items()]
+        return lambda context: {key: item(context) for key, item in items}
+    return lambda context: spec
+
+
+# --- Estruturas compiladas ---
+
+class CompiledStep:
+    """Um passo da Molécula com o agente carregado e os caminhos compilados."""
+
+    def __init__(self, chain_id: str, index: int, config: dict, agent_config: dict, dependencies: Set[int]):
+        self.chain_id = chain_id
+        self.index = index
+        self.config = config
+        self.agent_config = agent_config
+        self.agent_type = agent_config.get("type")
+        self.dependencies = dependencies
+        self.name = config.get("name")
+        self.number = config.get("step", index + 1)
+        self.output_variable = config.get("output_variable", "output")
+        self.resolve_input = compile_value(config.get("input"))
+        self.resolve_prompt = compile_value(config.get("prompt"))
+
+
+class CompiledMolecule:
+    """Uma Molécula validada, pronta para ser executada várias vezes."""
+
+    def __init__(self, chain_id: str, definition: dict, steps: List[CompiledStep], agent_files: Set[str]):
+        self.chain_id = chain_id
+        self.definition = definition
+        self.steps = steps
+        self.graph = [step.dependencies for step in steps]
+        self.agent_files = agent_files
+        self.max_parallel_steps = definition.get("max_parallel_steps")
+        report_data = (definition.get("output_report") or {}).get("data") or {}
+        self._resolve_report = compile_value(report_data)
+
+    def build_output_report(self, context: dict):
+        """Resolve o 'output_report.data' com o contexto final."""
+        report = self._resolve_report(context)
+        for key, value in report.items():
+            if value == "CURRENT_TIMESTAMP":
+                report[key] = datetime.now().isoformat()
+        return report
+
+
+# --- Registro ---
+
+class MoleculeRegistry:
+    """
+    Cache de YAMLs (Moléculas e Organismos) e de Moléculas compiladas.
+    As Moléculas são compiladas no primeiro uso e reaproveitadas.
+    """
+
+    def __init__(self, molecules_dir: str, organisms_dir: str):
+        self.molecules_dir = os.path.abspath(molecules_dir)
+        self.organisms_dir = os.path.abspath(organisms_dir)
+        self._documents: Dict[str, Optional[dict]] = {}
+        self._compiled: Dict[str, CompiledMolecule] = {}
+        self._lock = threading.RLock()
+        self._watch_stop: Optional[threading.Event] = None
+        self._watch_thread: Optional[threading.Thread] = None
+
+    # --- Leitura (com cache) ---
+
+    def _document(self, path: str):
+        """Retorna o YAML de 'path' (lido uma vez). None se não existir."""
+        with self._lock:
+            if path not in self._documents:
+                self._documents[path] = self._read_yaml(path)
+            return self._documents[path]
+
+    def _read_yaml(self, path: str):
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f)
+
+    def molecule_path(self, chain_id: str) -> str:
+        return os.path.join(self.molecules_dir, f"{chain_id}.yaml")
+
+    def organism_path(self, agent_file: str) -> str:
+        return os.path.join(self.organisms_dir, agent_file)
+
+    def get_molecule_definition(self, chain_id: str):
+        """YAML bruto da Molécula (ou None)."""
+        return self._document(self.molecule_path(chain_id))
+
+    def get_organism(self, agent_file: str):
+        """YAML do Organismo (ou None)."""
+        return self._document(self.organism_path(agent_file))
+
+    # --- Compilação ---
+
+    def get_molecule(self, chain_id: str) -> CompiledMolecule:
+        """Retorna a Molécula compilada. Lança ChainDefinitionError se inválida."""
+        with self._lock:
+            compiled = self._compiled.get(chain_id)
+            if compiled is None:
+                compiled = self._compile(chain_id)
+                self._compiled[chain_id] = compiled
+            return compiled
+
+    def _compile(self, chain_id: str) -> CompiledMolecule:
+        definition = self.get_molecule_definition(chain_id)
+        if not definition:
+            raise ChainDefinitionError(f"Molécula '{chain_id}' não encontrada.")
+
+        step_configs = definition.get("steps") or []
+        try:
+            graph = build_step_graph(step_configs)
+        except ValueError as e:
+            raise ChainDefinitionError(f"Molécula '{chain_id}' inválida: {e}")
+
+        steps = []
+        agent_files = set()
+        output_variables = {}
+        for index, step_config in enumerate(step_configs):
+            agent_file = step_config.get("agent")
+            agent_config = self.get_organism(agent_file) if agent_file else None
+            if not agent_config:
+                raise ChainDefinitionError(
+                    f"Agente '{agent_file}' não encontrado (passo '{step_config.get('name')}')."
+                )
+            agent_files.add(agent_file)
+
+            output_variable = step_config.get("output_variable", "output")
+            if output_variable in output_variables:
+                raise ChainDefinitionError(
+                    f"Molécula '{chain_id}' inválida: 'output_variable' '{output_variable}' repetida "
+                    f"nos passos {output_variables[output_variable] + 1} e {index + 1}."
+                )
+            output_variables[output_variable] = index
+
+            try:
+                steps.append(CompiledStep(chain_id, index, step_config, agent_config, graph[index]))
+            except ChainDefinitionError as e:
+                raise ChainDefinitionError(f"Molécula '{chain_id}', passo {index + 1}: {e}")
+
+        try:
+            return CompiledMolecule(chain_id, definition, steps, agent_files)
+        except ChainDefinitionError as e:
+            raise ChainDefinitionError(f"Molécula '{chain_id}', output_report: {e}")
+
+    # --- Hot-reload ---
+
+    def reload_file(self, path: str):
+        """
+        Relê apenas 'path' e descarta as Moléculas compiladas que
+        dependem dele (elas recompilam no próximo uso, sem reler disco).
+        """
+        path = os.path.abspath(path)
+        if not path.endswith((".yaml", ".yml")):
+            return
+        with self._lock:
+            self._documents[path] = self._read_yaml(path)
+            if os.path.dirname(path) == self.molecules_dir:
+                chain_id = os.path.splitext(os.path.basename(path))[0]
+                self._compiled.pop(chain_id, None)
+            elif os.path.dirname(path) == self.organisms_dir:
+                agent_file = os.path.basename(path)
+                for chain_id, compiled in list(self._compiled.items()):
+                    if agent_file in compiled.agent_files:
+                        del self._compiled[chain_id]
+        print(f"🔄 Registro recarregado: {os.path.basename(path)}")
+
+    def start_watching(self):
+        """Observa 'molecules/' e 'organisms/' em uma thread (watchfiles)."""
+        try:
+            from watchfiles import watch
+        except ImportError:
+            print("⚠️ 'watchfiles' não encontrado. Hot-reload do registro desligado.")
+            return
+        if self._watch_stop is not None:
+            return
+        self._watch_stop = threading.Event()
+
+        def loop(stop_event: threading.Event):
+            for changes in watch(self.molecules_dir, self.organisms_dir, stop_event=stop_event):
+                for _, path in changes:
+                    self.reload_file(path)
+
+        self._watch_thread = threading.Thread(
+            target=loop, args=(self._watch_stop,), name="atomic-registry-watch", daemon=True
+        )
+        self._watch_thread.start()
+        # A thread do watchfiles precisa terminar antes do interpretador
+        atexit.register(self.stop_watching)
+
+    def stop_watching(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_thread.join(timeout=2)
+            self._watch_stop = None
+            self._watch_thread = None
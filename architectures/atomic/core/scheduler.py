@@ -0,0 +1,178 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Escalonador de Passos (DAG)
+# core/scheduler.py
+# -----------------------------------------------------------------
+#
+# Constrói o grafo de dependências de uma Molécula a partir das
+# referências '$.steps[i]' de cada passo e executa os passos
+# independentes em paralelo (com um limite configurável).
+#
+# Passos que só dependem do gatilho ('$.input_trigger...') ficam
+# prontos imediatamente. A saída é determinística: cada passo grava
+# sempre na sua própria posição do contexto, independente da ordem
+# em que termina.
+#
+# -----------------------------------------------------------------
+
+import re
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, List, Set
+
+# Captura o índice de qualquer referência '$.steps[i]' dentro de uma string
+STEP_REF_PATTERN = re.compile(r"\$\.steps\[(\d+)\]")
+
+# Campos de um passo que podem referenciar saídas de outros passos
+STEP_REF_FIELDS = ("input", "prompt")
+
+
+class StepExecutionError(Exception):
+    """Falha de um passo durante a execução do grafo."""
+
+    def __init__(self, step_index: int, cause: Exception):
+        super().__init__(str(cause))
+        self.step_index = step_index
+        self.cause = cause
+
+
+def _collect_step_refs(value: Any, refs: Set[int]):
+    """Percorre strings, listas e dicts coletando os índices '$.steps[i]'."""
+    if isinstance(value, str):
+        refs.update(int(match) for match in STEP_REF_PATTERN.findall(value))
+    elif isinstance(value, list):
+        for item in value:
+            _collect_step_refs(item, refs)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect_step_refs(item, refs)
+
+
+def extract_step_dependencies(step_config: dict) -> Set[int]:
+    """Retorna os índices dos passos dos quais 'step_config' depende."""
+    refs: Set[int] = set()
+    for field in STEP_REF_FIELDS:
+        _collect_step_refs(step_config.get(field), refs)
+    return refs
+
+
+def build_step_graph(steps: List[dict]) -> List[Set[int]]:
+    """
+    Monta a lista de dependências (um conjunto de índices por passo).
+    Um passo só pode depender de passos anteriores a ele; isso garante
+    que o grafo é acíclico e que a ordem do YAML é uma ordem topológica.
+    """
+    graph = []
+    for index, step_config in enumerate(steps):
+        deps = extract_step_dependencies(step_config)
+        invalid = sorted(dep for dep in deps if dep >= index)
+        if invalid:
+            raise ValueError(
+                f"Passo {index + 1} ('{step_config.get('name')}') referencia passos "
+                f"que não o antecedem: {['$.steps[%d]' % dep for dep in invalid]}"
+            )
+        graph.append(deps)
+    return graph
+
+
+def step_levels(graph: List[Set[int]]) -> List[List[int]]:
+    """
+    Agrupa os passos em níveis: o nível de um passo é 1 + o maior nível
+    das suas dependências. Passos do mesmo nível são independentes entre si.
+    """
+    levels: List[int] = []
+    for deps in graph:
+        levels.append(1 + max((levels[dep] for dep in deps), default=-1))
+    grouped: List[List[int]] = [[] for _ in range(max(levels, default=-1) + 1)]
+    for index, level in enumerate(levels):
+        grouped[level].append(index)
+    return grouped
+
+
+def _dependents_of(graph: List[Set[int]]) -> List[List[int]]:
+    """Inverte o grafo: para cada passo, quem depende dele."""
+    dependents = [[] for _ in graph]
+    for index, deps in enumerate(graph):
+        for dep in deps:
+            dependents[dep].append(index)
+    return dependents
+
+
+def run_dag(graph: List[Set[int]], execute: Callable[[int], Any], max_parallel: int = 1):
+    """
+    Executa 'execute(index)' para cada passo respeitando o grafo.
+
+    Passos prontos são disparados na ordem do YAML, até 'max_parallel'
+    ao mesmo tempo. Com 'max_parallel=1' o comportamento é idêntico à
+    execução sequencial original. Se um passo falha, nenhum passo novo
+    é iniciado; os que já estão rodando terminam e o erro é propagado
+    como StepExecutionError.
+    """
+    max_parallel = max(1, int(max_parallel))
+    remaining = [set(deps) for deps in graph]
+    dependents = _dependents_of(graph)
+
+    ready = [index for index, deps in enumerate(remaining) if not deps]
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="atomic-step") as pool:
+        running = {}
+        while running or (ready and failure is None):
+            while ready and failure is None and len(running) < max_parallel:
+                index = ready.pop(0)
+                # Cada thread roda em uma cópia do contexto (ex: o span atual do tracing)
+                running[pool.submit(contextvars.copy_context().run, execute, index)] = index
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=running.get):
+                index = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    # Mantém o primeiro erro (na ordem do YAML) de forma determinística
+                    if failure is None or index < failure.step_index:
+                        failure = StepExecutionError(index, error)
+                    continue
+                for dependent in dependents[index]:
+                    remaining[dependent].discard(index)
+                    if not remaining[dependent]:
+                        ready.append(dependent)
+            ready.sort()
+
+    if failure is not None:
+        raise failure
+
+
+async def arun_dag(graph: List[Set[int]], execute: Callable[[int], Awaitable[Any]], max_parallel: int = 1):
+    """
+    Versão asyncio de 'run_dag': 'execute(index)' é uma corrotina e os
+    passos prontos viram tasks no event loop (sem threads).
+    """
+    max_parallel = max(1, int(max_parallel))
+    remaining = [set(deps) for deps in graph]
+    dependents = _dependents_of(graph)
+
+    ready = [index for index, deps in enumerate(remaining) if not deps]
+    failure = None
+    running = {}
+
+    while running or (ready and failure is None):
+        while ready and failure is None and len(running) < max_parallel:
+            index = ready.pop(0)
+            running[asyncio.ensure_future(execute(index))] = index
+
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in sorted(done, key=running.get):
+            index = running.pop(task)
+            error = task.exception()
+            if error is not None:
+                if failure is None or index < failure.step_index:
+                    failure = StepExecutionError(index, error)
+                continue
+            for dependent in dependents[index]:
+                remaining[dependent].discard(index)
+                if not remaining[dependent]:
+                    ready.append(dependent)
+        ready.sort()
+
+    if failure is not None:
+        raise failure
@@ -0,0 +1,439 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Cache Semântico de Respostas do LLM
+# core/semantic_cache.py
+# -----------------------------------------------------------------
+#
+# O cache de core/llm_cache.py só acerta com o prompt idêntico. Aqui,
+# pedidos parecidos reaproveitam a resposta guardada:
+#
+#   1. o texto comparado é normalizado e vira um vetor (embedding);
+#   2. busca-se o vizinho mais próximo entre as respostas do mesmo
+#      "espaço" (hash do que precisa ser idêntico);
+#   3. similaridade (cosseno) >= 'threshold' do Organismo -> a resposta
+#      guardada volta sem chamar o modelo.
+#
+# O que é comparado ('match'):
+#   task   - só a tarefa do passo; o contexto (os dados) entra no espaço
+#            e precisa ser idêntico (padrão). Seguro para extração e
+#            validação: CPFs ou datas diferentes nunca se confundem;
+#   prompt - a mensagem do usuário inteira (tarefa + contexto). Só para
+#            Organismos de FAQ, em que o contexto é a pergunta: dados
+#            quase iguais ("123.456.789-00" e "123.456.789-09") passam
+#            de 0.96 de similaridade e receberiam a mesma resposta.
+#
+# Cada Organismo liga o cache e escolhe o limiar:
+#
+#   llm_config:
+#     semantic_cache:
+#       enabled: true
+#       match: "task"
+#       threshold: 0.95
+#       ttl_s: 86400
+#
+# Embeddings (ATOMIC_SEMANTIC_CACHE_EMBEDDER):
+#   hash           - "hashing trick" de palavras e pares de palavras
+#                    (padrão; sem modelo, pega quase-duplicatas);
+#   ollama:<model> - embeddings do Ollama (ex: ollama:nomic-embed-text),
+#                    pegam também paráfrases.
+#
+# Índice (ATOMIC_SEMANTIC_CACHE_BACKEND):
+#   local  - índice vetorial em memória (numpy), com TTL e limite de
+#            entradas (padrão);
+#   qdrant - coleção no Qdrant (ATOMIC_QDRANT_URL), compartilhada entre
+#            processos. Se o Qdrant cair, usa o índice local.
+#
+# A métrica 'atomic_semantic_cache_similarity' (acertos e erros) mostra
+# quão perto os pedidos chegam das respostas guardadas: é por ela que
+# se ajusta o 'threshold'.
+#
+# -----------------------------------------------------------------
+
+import os
+import re
+import time
+import uuid
+import zlib
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from core.metrics import (
+    SEMANTIC_CACHE_REQUESTS, SEMANTIC_CACHE_SIMILARITY, SEMANTIC_CACHE_EVICTIONS, SEMANTIC_CACHE_ENTRIES
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # sem numpy, o cache semântico fica desligado
+
+SEMANTIC_CACHE_BACKEND = os.environ.get("ATOMIC_SEMANTIC_CACHE_BACKEND", "local")
+SEMANTIC_CACHE_EMBEDDER = os.environ.get("ATOMIC_SEMANTIC_CACHE_EMBEDDER", "hash")
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("ATOMIC_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_S = int(os.environ.get("ATOMIC_SEMANTIC_CACHE_TTL_S", "86400"))
+# Limite do índice local (as menos usadas saem primeiro)
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("ATOMIC_SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+# Dimensão dos vetores do embedder 'hash'
+SEMANTIC_CACHE_HASH_DIM = int(os.environ.get("ATOMIC_SEMANTIC_CACHE_HASH_DIM", "1024"))
+QDRANT_URL = os.environ.get("ATOMIC_QDRANT_URL", "http://localhost:6333")
+QDRANT_COLLECTION_PREFIX = "atomic_semantic_cache"
+# Intervalo entre as limpezas das entradas vencidas no Qdrant
+QDRANT_PURGE_S = 300
+# Depois de uma falha do Qdrant, espera este tempo antes de tentar de novo
+QDRANT_RETRY_S = 30
+
+SEMANTIC_CACHE_MATCHES = ("task", "prompt")
+
+WORD_PATTERN = re.compile(r"\w+")
+SPACE_PATTERN = re.compile(r"\s+")
+
+
+def semantic_cache_settings(agent_config: dict) -> Optional[dict]:
+    """
+    Lê 'llm_config.semantic_cache' do Organismo. Retorna None se estiver
+    desligado (o padrão); senão, {'match', 'threshold', 'ttl_s'}.
+    """
+    setting = (agent_config.get("llm_config") or {}).get("semantic_cache", False)
+    if isinstance(setting, bool):
+        setting = {"enabled": setting}
+    if not setting.get("enabled", True):
+        return None
+    match = setting.get("match", "task")
+    if match not in SEMANTIC_CACHE_MATCHES:
+        raise ValueError(f"'semantic_cache.match' inválido: {match!r} (use {', '.join(SEMANTIC_CACHE_MATCHES)}).")
+    return {
+        "match": match,
+        "threshold": float(setting.get("threshold", SEMANTIC_CACHE_THRESHOLD)),
+        "ttl_s": int(setting.get("ttl_s", SEMANTIC_CACHE_TTL_S)),
+    }
+
+
+def normalize_prompt(text: str) -> str:
+    """Minúsculas, Unicode NFKC e espaços colapsados (o que não muda o sentido)."""
+    return SPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+# --- Embedders ---
+
+class HashingEmbedder:
+    """
+    Vetor de palavras e pares de palavras ("hashing trick", com sinal),
+    normalizado. Determinístico e sem modelo: textos com quase as mesmas
+    palavras ficam próximos.
+    """
+
+    def __init__(self, dim: int = SEMANTIC_CACHE_HASH_DIM):
+        self.dim = dim
+        self.name = f"hash{dim}"
+
+    def embed(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = WORD_PATTERN.findall(text)
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            code = zlib.crc32(feature.encode("utf-8"))
+            vector[code % self.dim] += 1.0 if code & 0x80000000 else -1.0
+        return _unit(vector)
+
+
+class OllamaEmbedder:
+    """Embeddings de um modelo do Ollama (pelo pool de hosts do motor)."""
+
+    def __init__(self, model: str, pool_getter: Callable):
+        self.model = model
+        self.pool_getter = pool_getter
+        self.name = f"ollama-{re.sub(r'[^a-z0-9]+', '-', model.lower())}"
+
+    def embed(self, text: str):
+        pool = self.pool_getter()
+        if pool is None:
+            raise ConnectionError("Ollama indisponível para os embeddings do cache semântico.")
+        response = pool.embed(model=self.model, input=text)
+        return _unit(np.asarray(response["embeddings"][0], dtype=np.float32))
+
+
+def _unit(vector):
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def create_embedder(spec: str, pool_getter: Callable):
+    """'hash' ou 'ollama:<modelo>' (ATOMIC_SEMANTIC_CACHE_EMBEDDER)."""
+    if spec == "hash":
+        return HashingEmbedder()
+    if spec.startswith("ollama:"):
+        return OllamaEmbedder(spec.split(":", 1)[1], pool_getter)
+    raise ValueError(f"ATOMIC_SEMANTIC_CACHE_EMBEDDER inválido: {spec!r} (use 'hash' ou 'ollama:<modelo>')")
+
+
+# --- Índices ---
+
+class _Space:
+    """As entradas de um espaço (modelo + sistema + options) em uma matriz."""
+
+    def __init__(self, dim: int):
+        self.matrix = np.zeros((16, dim), dtype=np.float32)
+        self.keys = []  # linha -> chave
+        self.rows: Dict[str, int] = {}  # chave -> linha
+        self.entries: Dict[str, tuple] = {}  # chave -> (resposta, expira_em)
+
+    def put(self, key: str, vector, response: str, expires_at: float):
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.matrix):
+                self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+            self.keys.append(key)
+            self.rows[key] = row
+        self.matrix[row] = vector
+        self.entries[key] = (response, expires_at)
+
+    def remove(self, key: str):
+        # A última linha ocupa o lugar da removida
+        row = self.rows.pop(key)
+        last_key = self.keys.pop()
+        if last_key != key:
+            self.matrix[row] = self.matrix[len(self.keys)]
+            self.keys[row] = last_key
+            self.rows[last_key] = row
+        del self.entries[key]
+
+
+class LocalVectorIndex:
+    """Índice em memória: busca exata (produto escalar), TTL e limite de entradas (LRU)."""
+
+    backend_name = "local"
+
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._spaces: Dict[str, _Space] = {}
+        self._lru: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, space: str, vector) -> Optional[Tuple[float, str]]:
+        """(similaridade, resposta) do vizinho mais próximo ainda válido, ou None."""
+        with self._lock:
+            entries = self._spaces.get(space)
+            if entries is None or not entries.keys:
+                return None
+            scores = entries.matrix[:len(entries.keys)] @ vector
+            now = time.time()
+            # Quase sempre o mais próximo está válido; a ordenação completa só se não estiver
+            best = int(np.argmax(scores))
+            rows = [best] if entries.entries[entries.keys[best]][1] >= now else np.argsort(-scores)
+            for row in rows:
+                key = entries.keys[row]
+                response, expires_at = entries.entries[key]
+                if expires_at >= now:
+                    self._lru.move_to_end((space, key))
+                    return float(scores[row]), response
+            return None
+
+    def add(self, space: str, key: str, vector, response: str, ttl_s: int):
+        with self._lock:
+            entries = self._spaces.get(space)
+            if entries is None:
+                entries = self._spaces[space] = _Space(len(vector))
+            entries.put(key, vector, response, time.time() + ttl_s)
+            self._lru[(space, key)] = None
+            self._lru.move_to_end((space, key))
+            if len(self._lru) > self.max_entries:
+                self._evict()
+            SEMANTIC_CACHE_ENTRIES.set(len(self._lru))
+
+    def _remove(self, space: str, key: str):
+        entries = self._spaces[space]
+        entries.remove(key)
+        if not entries.keys:
+            del self._spaces[space]
+        del self._lru[(space, key)]
+
+    def _evict(self):
+        """Primeiro as entradas vencidas; se não bastar, as menos usadas."""
+        now = time.time()
+        expired = [
+            (space, key) for space, entries in self._spaces.items()
+            for key, (_, expires_at) in entries.entries.items() if expires_at < now
+        ]
+        for space, key in expired:
+            self._remove(space, key)
+        SEMANTIC_CACHE_EVICTIONS.labels(reason="ttl").inc(len(expired))
+        while len(self._lru) > self.max_entries:
+            self._remove(*next(iter(self._lru)))
+            SEMANTIC_CACHE_EVICTIONS.labels(reason="capacity").inc()
+
+
+class QdrantVectorIndex:
+    """
+    Coleção no Qdrant (uma por embedder). O espaço e a validade vão no
+    payload; as entradas vencidas são apagadas a cada QDRANT_PURGE_S.
+    """
+
+    backend_name = "qdrant"
+
+    def __init__(self, url: str = QDRANT_URL):
+        from qdrant_client import QdrantClient, models
+        self.client = QdrantClient(url=url)
+        self.models = models
+        self._collections = set()
+        self._purged_at = time.time()
+        self._lock = threading.Lock()
+
+    def _collection(self, embedder_name: str, dim: int) -> str:
+        name = f"{QDRANT_COLLECTION_PREFIX}_{embedder_name}"
+        if name not in self._collections:
+            with self._lock:
+                if name not in self._collections:
+                    if not self.client.collection_exists(name):
+                        self.client.create_collection(
+                            name, vectors_config=self.models.VectorParams(size=dim, distance=self.models.Distance.COSINE)
+                        )
+                        self.client.create_payload_index(name, "space", self.models.PayloadSchemaType.KEYWORD)
+                    self._collections.add(name)
+        return name
+
+    def search(self, embedder_name: str, space: str, vector) -> Optional[Tuple[float, str]]:
+        models = self.models
+        collection = self._collection(embedder_name, len(vector))
+        points = self.client.search(
+            collection, query_vector=vector.tolist(), limit=1, with_payload=True,
+            query_filter=models.Filter(must=[
+                models.FieldCondition(key="space", match=models.MatchValue(value=space)),
+                models.FieldCondition(key="expires_at", range=models.Range(gte=time.time())),
+            ]),
+        )
+        return (points[0].score, points[0].payload["response"]) if points else None
+
+    def add(self, embedder_name: str, space: str, key: str, vector, response: str, ttl_s: int):
+        collection = self._collection(embedder_name, len(vector))
+        self.client.upsert(collection, points=[self.models.PointStruct(
+            id=str(uuid.UUID(key[:32])), vector=vector.tolist(),
+            payload={"space": space, "response": response, "expires_at": time.time() + ttl_s},
+        )])
+        if time.time() - self._purged_at >= QDRANT_PURGE_S:
+            self._purged_at = time.time()
+            self.purge(collection)
+
+    def purge(self, collection: str):
+        """Apaga as entradas vencidas da coleção."""
+        models = self.models
+        expired = models.Filter(must=[models.FieldCondition(key="expires_at", range=models.Range(lt=time.time()))])
+        count = self.client.count(collection, count_filter=expired, exact=True).count
+        if count:
+            self.client.delete(collection, points_selector=models.FilterSelector(filter=expired))
+            SEMANTIC_CACHE_EVICTIONS.labels(reason="ttl").inc(count)
+
+
+# --- Cache ---
+
+class SemanticLookup:
+    """O resultado de uma busca; guarda o vetor para gravar a resposta sem recalcular."""
+
+    def __init__(self, model: str, space: str, key: str, vector, similarity: Optional[float], content: Optional[str]):
+        self.model = model
+        self.space = space
+        self.key = key
+        self.vector = vector
+        self.similarity = similarity
+        self.content = content
+
+
+class SemanticCache:
+    """Qdrant (se configurado) ou o índice local; o local também é o fallback do Qdrant."""
+
+    def __init__(self, pool_getter: Callable, backend_name: str = SEMANTIC_CACHE_BACKEND,
+                 embedder_spec: str = SEMANTIC_CACHE_EMBEDDER):
+        self.pool_getter = pool_getter
+        self.backend_name = backend_name
+        self.embedder_spec = embedder_spec
+        self.local = LocalVectorIndex()
+        self._embedder = None
+        self._qdrant = None
+        self._qdrant_down_until = 0.0
+        self._warned = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        if np is None and not self._warned:
+            self._warned = True
+            print("⚠️ Cache semântico: numpy não está instalado (pip install -r requirements.txt). "
+                  "Cache semântico desligado.")
+        return np is not None
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = create_embedder(self.embedder_spec, self.pool_getter)
+        return self._embedder
+
+    def _qdrant_index(self) -> Optional[QdrantVectorIndex]:
+        """O índice do Qdrant, ou None (backend 'local' ou Qdrant fora do ar)."""
+        if self.backend_name != "qdrant" or time.monotonic() < self._qdrant_down_until:
+            return None
+        if self._qdrant is None:
+            with self._lock:
+                if self._qdrant is None:
+                    self._qdrant = QdrantVectorIndex()
+        return self._qdrant
+
+    def _qdrant_failed(self, error: Exception):
+        print(f"⚠️ Cache semântico: Qdrant indisponível ({error}). Usando o índice local por {QDRANT_RETRY_S}s.")
+        self._qdrant_down_until = time.monotonic() + QDRANT_RETRY_S
+
+    def lookup(self, model: str, messages: list, options: Optional[dict], settings: dict,
+               task: str = "") -> SemanticLookup:
+        """
+        Busca uma resposta para um pedido parecido. O espaço é o hash do
+        que não pode mudar (modelo, mensagens de sistema, options e, com
+        'match: task', o resto da mensagem do usuário: o contexto); o vetor
+        vem do texto comparado ('task' ou a mensagem inteira), normalizado.
+        """
+        system = "\n".join(m["content"] for m in messages if m["role"] != "user")
+        user = "\n".join(m["content"] for m in messages if m["role"] == "user")
+        if settings.get("match", "task") == "task":
+            # Só a tarefa varia; o contexto (exato) faz parte do espaço
+            space = _digest(model, system, repr(sorted((options or {}).items())), user.replace(task, "\0", 1))
+            prompt = normalize_prompt(task)
+        else:
+            space = _digest(model, system, repr(sorted((options or {}).items())))
+            prompt = normalize_prompt(user)
+        key = _digest(space, prompt)
+        vector = self.embedder.embed(prompt)
+
+        found, backend = None, "local"
+        try:
+            qdrant = self._qdrant_index()
+            if qdrant is not None:
+                found, backend = qdrant.search(self.embedder.name, space, vector), "qdrant"
+        except Exception as e:
+            self._qdrant_failed(e)
+        if backend == "local":
+            found = self.local.search(space, vector)
+
+        similarity, content = found if found else (None, None)
+        if similarity is not None:
+            similarity = min(1.0, float(similarity))  # arredondamento do float32/Qdrant
+        result = "hit" if similarity is not None and similarity >= settings["threshold"] else "miss"
+        SEMANTIC_CACHE_REQUESTS.labels(model=model, result=result, backend=backend).inc()
+        if similarity is not None:
+            SEMANTIC_CACHE_SIMILARITY.labels(model=model, result=result).observe(similarity)
+        return SemanticLookup(model, space, key, vector, similarity, content if result == "hit" else None)
+
+    def store(self, lookup: SemanticLookup, content: str, ttl_s: int):
+        """Grava a resposta nova no espaço e com o vetor da busca."""
+        try:
+            qdrant = self._qdrant_index()
+            if qdrant is not None:
+                qdrant.add(self.embedder.name, lookup.space, lookup.key, lookup.vector, content, ttl_s)
+                return
+        except Exception as e:
+            self._qdrant_failed(e)
+        self.local.add(lookup.space, lookup.key, lookup.vector, content, ttl_s)
@@ -0,0 +1,233 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Extração em Pedaços (Map-Reduce)
+# core/text_chunking.py
+# -----------------------------------------------------------------
+#
+# Documentos longos não cabem (ou demoram a processar) em um prompt
+# só. Com 'llm_config.chunking' no Organismo, o texto é dividido nos
+# títulos do Markdown, cada pedaço vai em um prompt curto (em
+# paralelo, limitado por 'max_parallel') e os JSONs são juntados:
+#
+#   map    -> split_sections(texto)        : pedaços de até 'max_chars'
+#   reduce -> merge_extractions([json, ...]): um JSON no formato pedido
+#
+# Conflitos (o mesmo campo com valores diferentes em pedaços
+# diferentes) são resolvidos por votação; no empate, vence o pedaço
+# que vem antes no documento. Listas são concatenadas sem repetição
+# e objetos são juntados campo a campo.
+#
+# Usado pelo motor (passos 'llm_chat') e por 'run_text_struct.py'.
+# O parse/serialização usa o orjson (quando instalado).
+#
+# -----------------------------------------------------------------
+
+import os
+import re
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CHUNK_MAX_CHARS = int(os.environ.get("ATOMIC_CHUNK_MAX_CHARS", "6000"))
+CHUNK_MAX_PARALLEL = int(os.environ.get("ATOMIC_CHUNK_MAX_PARALLEL", "4"))
+# Campo com o texto quando o contexto é um objeto (a saída do run_ocr.py)
+CHUNK_TEXT_FIELD = "raw_markdown_content"
+
+# Vai na tarefa de cada pedaço (igual em todos: o prefixo do prompt continua compartilhado)
+CHUNK_INSTRUCTION = (
+    "O contexto abaixo é um TRECHO de um documento maior. Extraia só o que "
+    "aparece neste trecho e use null para os campos que não aparecem."
+)
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+\S", re.MULTILINE)
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def chunking_settings(agent_config: dict) -> Optional[dict]:
+    """
+    Lê 'llm_config.chunking' do Organismo. Retorna None se estiver
+    desligado; senão, {'max_chars', 'max_parallel', 'fields', 'text_field'}.
+    """
+    setting = (agent_config.get("llm_config") or {}).get("chunking", False)
+    if isinstance(setting, bool):
+        setting = {"enabled": setting}
+    if not setting.get("enabled", True):
+        return None
+    return {
+        "max_chars": max(500, int(setting.get("max_chars", CHUNK_MAX_CHARS))),
+        "max_parallel": max(1, int(setting.get("max_parallel", CHUNK_MAX_PARALLEL))),
+        "fields": setting.get("fields"),
+        "text_field": setting.get("text_field", CHUNK_TEXT_FIELD),
+    }
+
+
+# --- JSON (orjson quando disponível) ---
+
+def loads(text):
+    """json.loads via orjson. Os erros são json.JSONDecodeError nos dois casos."""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def canonical(value) -> bytes:
+    """Serialização estável (chaves ordenadas): compara valores de pedaços diferentes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass  # ex: inteiros maiores que 64 bits
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def parse_json_object(content: str) -> Optional[dict]:
+    """O objeto JSON da resposta de um pedaço (aceita cercas ```json). None se não for um objeto."""
+    try:
+        value = loads(FENCE_PATTERN.sub("", content.strip()))
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+# --- Map: divisão nos títulos ---
+
+def _sections(markdown: str) -> List[Tuple[List[str], str]]:
+    """
+    Seções do Markdown: (títulos acima da seção, texto da seção).
+    O texto antes do primeiro título vira uma seção sem título.
+    """
+    starts = [match.start() for match in HEADING_PATTERN.finditer(markdown)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = []
+    stack: List[Tuple[int, str]] = []  # (nível, linha do título)
+    for start, end in zip(starts, starts[1:] + [len(markdown)]):
+        text = markdown[start:end]
+        match = HEADING_PATTERN.match(text)
+        if match:
+            level = len(match.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            parents = [line for _, line in stack]
+            stack.append((level, text.split("\n", 1)[0]))
+        else:
+            parents = []
+        if text.strip():
+            sections.append((parents, text))
+    return sections
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Seção maior que 'max_chars': corta nos parágrafos e, em último caso, a cada 'max_chars'."""
+    pieces, current = [], ""
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sections(markdown: str, max_chars: int = CHUNK_MAX_CHARS) -> List[str]:
+    """
+    Divide o Markdown nos títulos ('#' a '######'), juntando seções
+    vizinhas até 'max_chars'. Cada pedaço começa com os títulos acima
+    dele (ex: '## Dados do Responsável' antes de '- **Nome:** ...'),
+    para o modelo saber de quem é cada campo.
+    """
+    if len(markdown) <= max_chars:
+        return [markdown]
+
+    chunks, current = [], ""
+    for parents, text in _sections(markdown):
+        heading = text.split("\n", 1)[0] if HEADING_PATTERN.match(text) else None
+        # Continuações de uma seção longa repetem também o título dela
+        continued = parents + [heading] if heading else parents
+        room = max_chars - len("\n".join(continued)) - 1
+        if room < max_chars // 2:
+            # Títulos demais para caber: pedaços sem eles
+            parents, continued, room = [], [], max_chars
+        for number, piece in enumerate(_split_long(text, room)):
+            separator = "" if current.endswith("\n") else "\n"
+            if current and len(current) + len(separator) + len(piece) <= max_chars:
+                current += separator + piece
+                continue
+            if current:
+                chunks.append(current)
+            breadcrumb = "\n".join(continued if number else parents)
+            current = f"{breadcrumb}\n{piece}" if breadcrumb else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --- Reduce: junção com resolução de conflitos ---
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _merge_values(values: List[Any], path: str, conflicts: Dict[str, list]):
+    values = [value for value in values if not _is_empty(value)]
+    if not values:
+        return None
+
+    if all(isinstance(value, dict) for value in values):
+        return _merge_objects(values, path, conflicts)
+
+    if all(isinstance(value, list) for value in values):
+        merged, seen = [], set()
+        for items in values:
+            for item in items:
+                key = canonical(item)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(item)
+        return merged
+
+    # Escalares (ou tipos diferentes): votação; empate -> o primeiro no documento
+    keys = [canonical(value) for value in values]
+    votes = Counter(keys)
+    if len(votes) == 1:
+        return values[0]
+    conflicts[path] = [values[keys.index(key)] for key in votes]
+    best = max(votes.values())
+    return next(value for value, key in zip(values, keys) if votes[key] == best)
+
+
+def _merge_objects(objects: List[dict], path: str, conflicts: Dict[str, list]) -> dict:
+    fields: Dict[str, list] = {}
+    for obj in objects:
+        for field, value in obj.items():
+            fields.setdefault(field, []).append(value)
+    return {
+        field: _merge_values(values, f"{path}.{field}" if path else field, conflicts)
+        for field, values in fields.items()
+    }
+
+
+def merge_extractions(results: List[dict], fields: Optional[List[str]] = None) -> Tuple[dict, Dict[str, list]]:
+    """
+    Junta os JSONs dos pedaços (na ordem do documento). Retorna
+    (resultado, conflitos), com conflitos = {'campo': [valores, ...]}.
+    Com 'fields', o resultado tem exatamente esses campos (null se nenhum
+    pedaço trouxe o campo).
+    """
+    conflicts: Dict[str, list] = {}
+    merged = _merge_objects([result for result in results if isinstance(result, dict)], "", conflicts)
+    if fields:
+        merged = {field: merged.get(field) for field in fields}
+    return merged, conflicts
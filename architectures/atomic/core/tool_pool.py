@@ -0,0 +1,277 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Pool de Workers das Ferramentas Locais
+# core/tool_pool.py
+# -----------------------------------------------------------------
+#
+# Mantém os scripts de 'organisms/tools/' abertos em modo worker
+# (`python run_ocr.py --worker`) em vez de criar um processo novo a
+# cada passo. O protocolo (NDJSON pelo stdin/stdout) está descrito em
+# 'organisms/tools/worker_protocol.py'. Ferramentas em streaming (ex:
+# o OCR página a página) mandam linhas {"id", "chunk"} antes da
+# resposta final; elas vão para o 'on_chunk' do pedido.
+#
+# Cada ferramenta tem o seu pool, configurado no Organismo:
+#
+#   local_tool_config:
+#     script_path: "run_ocr.py"
+#     worker_pool:
+#       enabled: true        # false = um subprocesso por passo (modo antigo)
+#       size: 2              # workers simultâneos desta ferramenta
+#       max_requests: 500    # recicla o worker depois de N pedidos
+#       timeout_s: 300       # tempo máximo de cada pedido
+#       health_check_s: 30   # 'ping' antes de reusar um worker parado há mais tempo
+#
+# -----------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import itertools
+import threading
+import subprocess
+from typing import Dict, List, Optional
+
+from core.metrics import TOOL_SPAWN_DURATION
+
+DEFAULT_POOL_SIZE = int(os.environ.get("ATOMIC_TOOL_POOL_SIZE", "2"))
+DEFAULT_MAX_REQUESTS = int(os.environ.get("ATOMIC_TOOL_POOL_MAX_REQUESTS", "500"))
+DEFAULT_HEALTH_CHECK_S = float(os.environ.get("ATOMIC_TOOL_POOL_HEALTH_CHECK_S", "30"))
+# Tempo para um worker recém-criado responder ao primeiro 'ping'
+STARTUP_TIMEOUT_S = float(os.environ.get("ATOMIC_TOOL_POOL_STARTUP_TIMEOUT_S", "30"))
+
+
+class ToolWorkerError(Exception):
+    """O worker morreu, não respondeu a tempo ou quebrou o protocolo."""
+
+
+class ToolWorker:
+    """Um processo de ferramenta em modo '--worker'."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, script_path: str):
+        self.script_path = script_path
+        self.requests_served = 0
+        self.last_used = time.monotonic()
+        self.process = subprocess.Popen(
+            [sys.executable, script_path, "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,  # logs da ferramenta vão para o stderr do servidor
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            cwd=os.path.dirname(script_path),
+        )
+        # Uma thread lê o stdout para que possamos esperar com timeout
+        self._responses: "queue.Queue[Optional[str]]" = queue.Queue()
+        threading.Thread(
+            target=self._read_stdout, name=f"tool-worker-{os.path.basename(script_path)}", daemon=True
+        ).start()
+
+    def _read_stdout(self):
+        for line in self.process.stdout:
+            self._responses.put(line)
+        self._responses.put(None)  # EOF: o processo terminou
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _exchange(self, message: dict, timeout: float, on_chunk=None) -> dict:
+        if not self.is_alive():
+            raise ToolWorkerError(f"Worker de {os.path.basename(self.script_path)} não está rodando.")
+        try:
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise ToolWorkerError(f"Falha ao enviar pedido ao worker: {e}")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                line = self._responses.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                raise ToolWorkerError(
+                    f"Worker de {os.path.basename(self.script_path)} excedeu {timeout}s."
+                )
+            if line is None:
+                raise ToolWorkerError(f"Worker de {os.path.basename(self.script_path)} terminou inesperadamente.")
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                raise ToolWorkerError(f"Resposta inválida do worker: {line[:200]!r}")
+            # Respostas atrasadas de pedidos anteriores são descartadas
+            if response.get("id") != message["id"]:
+                continue
+            if "chunk" in response:
+                if on_chunk is not None:
+                    on_chunk(response["chunk"])
+                continue
+            self.last_used = time.monotonic()
+            return response
+
+    def ping(self, timeout: float) -> bool:
+        try:
+            return bool(self._exchange({"id": str(next(self._ids)), "op": "ping"}, timeout).get("ok"))
+        except ToolWorkerError:
+            return False
+
+    def request(self, input_data, timeout: float, on_chunk=None) -> dict:
+        response = self._exchange({"id": str(next(self._ids)), "input": input_data}, timeout, on_chunk)
+        self.requests_served += 1
+        return response
+
+    def close(self):
+        if self.is_alive():
+            try:
+                self.process.stdin.close()  # o worker sai ao ver EOF
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+
+class ToolWorkerPool:
+    """Pool de workers de UM script, com tamanho, reciclagem e health check."""
+
+    def __init__(self, script_path: str, size: int = DEFAULT_POOL_SIZE,
+                 max_requests: int = DEFAULT_MAX_REQUESTS, timeout_s: float = 300,
+                 health_check_s: float = DEFAULT_HEALTH_CHECK_S):
+        self.script_path = script_path
+        self.size = max(1, int(size))
+        self.max_requests = max(1, int(max_requests))
+        self.timeout_s = float(timeout_s)
+        self.health_check_s = float(health_check_s)
+        # Workers parados (o último devolvido sai primeiro) e quantos existem.
+        # A Condition acorda quem espera sempre que um worker volta ou sai do pool.
+        self._idle: List[ToolWorker] = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _spawn(self) -> ToolWorker:
+        started = time.monotonic()
+        worker = ToolWorker(self.script_path)
+        if not worker.ping(STARTUP_TIMEOUT_S):
+            worker.close()
+            raise ToolWorkerError(
+                f"{os.path.basename(self.script_path)} não respondeu ao 'ping' do modo worker."
+            )
+        TOOL_SPAWN_DURATION.labels(tool=os.path.basename(self.script_path), mode="worker").observe(
+            time.monotonic() - started
+        )
+        return worker
+
+    def _acquire(self) -> ToolWorker:
+        deadline = time.monotonic() + self.timeout_s
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise ToolWorkerError(f"Pool de {os.path.basename(self.script_path)} já foi fechado.")
+                    if self._idle:
+                        worker, spawn = self._idle.pop(), False
+                        break
+                    # Reciclado ou descartado: a vaga liberada permite criar outro
+                    if self._created < self.size:
+                        self._created += 1
+                        worker, spawn = None, True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ToolWorkerError(
+                            f"Nenhum worker livre de {os.path.basename(self.script_path)} em {self.timeout_s}s."
+                        )
+                    self._cond.wait(remaining)
+
+            if spawn:
+                try:
+                    return self._spawn()
+                except Exception:
+                    self._discard(None)
+                    raise
+
+            # Health check: processo vivo e, se ficou parado muito tempo, responde ao 'ping'
+            healthy = worker.is_alive()
+            if healthy and time.monotonic() - worker.last_used > self.health_check_s:
+                healthy = worker.ping(STARTUP_TIMEOUT_S)
+            if healthy:
+                return worker
+            self._discard(worker)
+
+    def _release(self, worker: ToolWorker):
+        with self._cond:
+            if not self._closed and worker.requests_served < self.max_requests:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+        self._discard(worker)  # reciclagem: o próximo pedido cria um worker novo
+
+    def _discard(self, worker: Optional[ToolWorker]):
+        if worker is not None:
+            worker.close()
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def call(self, input_data, on_chunk=None) -> dict:
+        """
+        Envia um pedido a um worker livre e retorna a resposta do protocolo.
+        'on_chunk' (opcional) recebe os resultados parciais, na ordem.
+        """
+        worker = self._acquire()
+        completed = False
+        try:
+            response = worker.request(input_data, self.timeout_s, on_chunk)
+            completed = True
+            return response
+        finally:
+            if completed:
+                self._release(worker)
+            else:
+                # Timeout, processo morto ou erro no meio do pedido (ex: no 'on_chunk'):
+                # o worker pode estar com a resposta pela metade, sai do pool
+                self._discard(worker)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for worker in idle:
+            self._discard(worker)
+
+
+class ToolPoolManager:
+    """Um ToolWorkerPool por script, criado no primeiro uso."""
+
+    def __init__(self, default_timeout_s: float = 300):
+        self.default_timeout_s = default_timeout_s
+        self._pools: Dict[str, ToolWorkerPool] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get_pool(self, script_path: str, pool_config: dict) -> ToolWorkerPool:
+        with self._lock:
+            pool = self._pools.get(script_path)
+            if pool is None:
+                pool = ToolWorkerPool(
+                    script_path,
+                    size=pool_config.get("size", DEFAULT_POOL_SIZE),
+                    max_requests=pool_config.get("max_requests", DEFAULT_MAX_REQUESTS),
+                    timeout_s=pool_config.get("timeout_s", self.default_timeout_s),
+                    health_check_s=pool_config.get("health_check_s", DEFAULT_HEALTH_CHECK_S),
+                )
+                self._pools[script_path] = pool
+            return pool
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,260 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Tracing das Cadeias
+# core/tracing.py
+# -----------------------------------------------------------------
+#
+# Um trace por execução de cadeia, com um span por passo e spans
+# filhos para a montagem do prompt, a chamada ao modelo, o
+# SchemeAdapter, o I/O das ferramentas locais e as escritas no banco.
+#
+# Sem coletor externo: os traces terminados ficam em um buffer
+# circular em memória (ATOMIC_TRACE_BUFFER) e, opcionalmente, são
+# gravados em JSONL (ATOMIC_TRACE_FILE). A API mostra a "cascata"
+# em /api/v1/debug/traces/{trace_id}.
+#
+# O span atual fica em um 'contextvars.ContextVar': tasks do asyncio
+# e 'asyncio.to_thread' herdam o contexto sozinhos; o 'run_dag' copia
+# o contexto para as threads do ThreadPoolExecutor.
+#
+# -----------------------------------------------------------------
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+TRACING_ENABLED = os.environ.get("ATOMIC_TRACING", "1") == "1"
+TRACE_BUFFER_SIZE = int(os.environ.get("ATOMIC_TRACE_BUFFER", "200"))
+# Traces com mais spans que isso (ex: lotes grandes) são truncados
+TRACE_MAX_SPANS = int(os.environ.get("ATOMIC_TRACE_MAX_SPANS", "2000"))
+TRACE_FILE = os.environ.get("ATOMIC_TRACE_FILE", "")
+
+WATERFALL_WIDTH = 60
+
+
+class Span:
+    """Um trecho cronometrado de uma execução."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes",
+                 "start_time", "_started", "duration_ms", "status", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "offset_ms": round((self.start_time - self.trace.root.start_time) * 1000, 3),
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """Os spans de uma execução; o primeiro é a raiz."""
+
+    def __init__(self, name: str, attributes: dict):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+        self.root = self.add_span(name, None, attributes)
+
+    def add_span(self, name: str, parent_id: Optional[str], attributes: dict) -> Optional[Span]:
+        with self._lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped_spans += 1
+                return None
+            span = Span(self, name, parent_id, attributes)
+            self.spans.append(span)
+            return span
+
+    def summary(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "attributes": self.root.attributes,
+            "start_time": self.root.start_time,
+            "duration_ms": self.root.duration_ms,
+            "status": self.root.status,
+            "spans": len(self.spans),
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {**self.summary(), "dropped_spans": self.dropped_spans, "spans": spans}
+
+
+class TraceStore:
+    """Buffer circular dos traces terminados (+ exportação JSONL opcional)."""
+
+    def __init__(self, max_traces: int = TRACE_BUFFER_SIZE, export_path: str = TRACE_FILE):
+        self.max_traces = max_traces
+        self.export_path = export_path
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+            if self.export_path:
+                try:
+                    with open(self.export_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n")
+                except OSError as e:
+                    print(f"⚠️ Tracing: não foi possível gravar em {self.export_path}: {e}")
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        return [trace.summary() for trace in reversed(traces)]
+
+
+trace_store = TraceStore()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("atomic_current_span", default=None)
+
+
+# --- API de spans ---
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """Abre um trace novo (span raiz). Ao sair, o trace vai para o 'trace_store'."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(name, attributes)
+    try:
+        with _activate(trace.root):
+            yield trace.root
+    finally:
+        trace_store.add(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Abre um span filho do span atual. Sem trace ativo (ou com o tracing
+    desligado) não faz nada e retorna None.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.trace.add_span(name, parent.span_id, attributes)
+    if child is None:
+        yield None
+        return
+    with _activate(child):
+        yield child
+
+
+@contextmanager
+def _activate(current: Span):
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = str(e) or type(e).__name__
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+
+
+def traced_chain(func):
+    """
+    Decorador de 'run_chain'/'arun_chain': cada execução vira um trace
+    e o resultado ganha o 'trace_id'.
+    """
+    def finish(root: Optional[Span], result):
+        if root is not None and isinstance(result, dict):
+            result["trace_id"] = root.trace.trace_id
+            if "error" in result:
+                root.status = "error"
+                root.error = result["error"]
+        return result
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, chain_id, *args, **kwargs):
+            with start_trace("chain", chain_id=chain_id) as root:
+                return finish(root, await func(self, chain_id, *args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, chain_id, *args, **kwargs):
+        with start_trace("chain", chain_id=chain_id) as root:
+            return finish(root, func(self, chain_id, *args, **kwargs))
+    return wrapper
+
+
+# --- Visualização ---
+
+def render_waterfall(trace: dict) -> str:
+    """Cascata em texto de um trace ('Trace.to_dict()'), para o endpoint de debug."""
+    spans = trace["spans"]
+    total_ms = trace["duration_ms"] or max(
+        (s["offset_ms"] + (s["duration_ms"] or 0) for s in spans), default=0
+    ) or 1
+    children = {}
+    for s in spans:
+        children.setdefault(s["parent_id"], []).append(s)
+
+    lines = [
+        f"trace {trace['trace_id']}  {trace['name']} "
+        f"{json.dumps(trace['attributes'], ensure_ascii=False, default=str)}  {total_ms:.1f} ms",
+        "",
+    ]
+
+    def walk(parent_id, depth):
+        for s in sorted(children.get(parent_id, []), key=lambda item: item["offset_ms"]):
+            start = int(s["offset_ms"] / total_ms * WATERFALL_WIDTH)
+            width = max(1, int((s["duration_ms"] or 0) / total_ms * WATERFALL_WIDTH))
+            bar = " " * start + "█" * min(width, WATERFALL_WIDTH - start)
+            label = "  " * depth + s["name"]
+            details = " ".join(f"{k}={v}" for k, v in s["attributes"].items())
+            duration = f"{s['duration_ms']:.1f} ms" if s["duration_ms"] is not None else "aberto"
+            flag = f"  ⚠️ {s['error']}" if s["status"] == "error" else ""
+            lines.append(f"{label:<32} |{bar:<{WATERFALL_WIDTH}}| {s['offset_ms']:>9.1f} +{duration:>11} {details}{flag}")
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+    if trace.get("dropped_spans"):
+        lines.append(f"... {trace['dropped_spans']} spans descartados (ATOMIC_TRACE_MAX_SPANS)")
+    return "\n".join(lines) + "\n"
@@ -11,27 +11,34 @@
 # 2. Chama o 'mistral:7b-instruct' (simulado) para executar a tarefa.
 # 3. Imprime um JSON para o 'stdout'.
 #
+# Com '--worker', fica aberto atendendo vários pedidos (NDJSON),
+# conforme 'worker_protocol.py'.
+#
 # -----------------------------------------------------------------
 
 import sys
 import json
 import os
 
+from worker_protocol import is_worker_mode, serve_worker
+
 # Na implementação real, você importaria o cliente Ollama
 # import ollama
 
+def parse_input(input_data):
+    """Valida o input já decodificado e retorna o 'prompt'."""
+    if not isinstance(input_data, dict):
+        raise ValueError("Input (stdin) não é um objeto JSON.")
+        
+    if "prompt" not in input_data:
+        raise ValueError(f"Chave 'prompt' ausente no input do stdin.")
+    
+    return input_data['prompt']
+
 def read_input_from_stdin():
     """Lê e parseia o JSON vindo do stdin."""
     try:
-        input_data = json.loads(sys.stdin.read())
-        
-        if not isinstance(input_data, dict):
-            raise ValueError("Input (stdin) não é um objeto JSON.")
-            
-        if "prompt" not in input_data:
-            raise ValueError(f"Chave 'prompt' ausente no input do stdin.")
-        
-        return input_data['prompt']
+        return parse_input(json.loads(sys.stdin.read()))
         
     except json.JSONDecodeError as e:
         print(f"Erro de JSON no stdin: {e}", file=sys.stderr)
@@ -84,7 +91,26 @@ def write_output_to_stdout(data: dict):
         # Se falhar, envia um erro para o stderr
         print(json.dumps({"error": f"Falha ao serializar saída: {e}"}), file=sys.stderr)
 
+def handle_request(input_data):
+    """Processa um pedido (modo stdin ou worker) e retorna o dict de saída."""
+    prompt = parse_input(input_data)
+
+    # 2. Executa a tarefa do assistente
+    generated_text = perform_general_task(prompt)
+    
+    # 3. Prepara a saída (conforme esperado pelo 'atomic_engine')
+    # A 'output_variable' era 'summary_text' ou similar
+    return {
+        "raw_text": generated_text,
+        "original_prompt": prompt,
+        "model": "mistral:7b-instruct (simulado)"
+    }
+
 def main():
+    if is_worker_mode():
+        serve_worker(handle_request)
+        return
+
     prompt = read_input_from_stdin()
     
     if prompt is None:
@@ -92,16 +118,7 @@ def main():
         sys.exit(1)
 
     try:
-        # 2. Executa a tarefa do assistente
-        generated_text = perform_general_task(prompt)
-        
-        # 3. Prepara a saída (conforme esperado pelo 'atomic_engine')
-        # A 'output_variable' era 'summary_text' ou similar
-        output_data = {
-            "raw_text": generated_text,
-            "original_prompt": prompt,
-            "model": "mistral:7b-instruct (simulado)"
-        }
+        output_data = handle_request({"prompt": prompt})
         
         # 4. Envia o JSON para o stdout
         write_output_to_stdout(output_data)
@@ -11,11 +11,71 @@
 # 2. Executa a lógica de OCR (aqui simulada) no arquivo.
 # 3. Imprime um JSON para o 'stdout' (para o engine).
 #
+# Com '--worker', fica aberto atendendo vários pedidos (NDJSON),
+# conforme 'worker_protocol.py'.
+#
+# Resultados ficam guardados em disco pelo hash (sha256) do CONTEÚDO
+# do arquivo: reenviar o mesmo PDF (mesmo em outro caminho temporário)
+# devolve o Markdown guardado. Use 'force_refresh: true' para refazer.
+#
+# PDFs de várias páginas: cada página é renderizada e lida em um
+# processo do pool (ATOMIC_OCR_PROCESSES, padrão: um por núcleo). No
+# modo worker, cada página sai assim que fica pronta, NA ORDEM, como
+# uma linha {"id", "chunk": {"page", "page_count", "markdown"}}. A
+# imagem da página só existe no processo filho e é liberada logo após
+# o OCR; no máximo 2 páginas por processo ficam em voo.
+#
+# A renderização usa 'pypdfium2' (opcional). Sem ele, o documento é
+# tratado como uma página só.
+#
 # -----------------------------------------------------------------
 
 import sys
 import json
 import os
+import time
+import hashlib
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from worker_protocol import is_worker_mode, serve_worker
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+OCR_ENGINE = "nanonets-OCR2 (simulado)"
+
+# --- Cache de resultados (endereçado por conteúdo) ---
+OCR_CACHE_DIR = os.environ.get(
+    "ATOMIC_OCR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache")
+)
+OCR_CACHE_MAX_BYTES = int(os.environ.get("ATOMIC_OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# --- Páginas em paralelo ---
+OCR_PROCESSES = int(os.environ.get("ATOMIC_OCR_PROCESSES", "0")) or os.cpu_count() or 1
+# Páginas submetidas por processo (limita as imagens em memória)
+OCR_PAGES_IN_FLIGHT_PER_PROCESS = 2
+OCR_RENDER_SCALE = float(os.environ.get("ATOMIC_OCR_RENDER_SCALE", "2"))
+PAGE_SEPARATOR = "\n"
+
+def parse_input(input_data):
+    """
+    Valida o input já decodificado. Aceita o file_path direto (string)
+    ou um objeto {"file_path": "...", "force_refresh": true}.
+    Retorna (file_path, force_refresh).
+    """
+    if isinstance(input_data, str):
+        return input_data, False
+    if isinstance(input_data, dict):
+        file_path = input_data.get("file_path") or input_data.get("path")
+        if isinstance(file_path, str):
+            return file_path, bool(input_data.get("force_refresh"))
+    raise ValueError("Input (stdin) não é uma string JSON de caminho nem um objeto com 'file_path'.")
 
 def read_input_from_stdin():
     """Lê e parseia o JSON vindo do stdin."""
@@ -30,12 +90,8 @@ def read_input_from_stdin():
         # Atualização: O engine envia o 'input_data' como JSON.
         # ex: '"/tmp/doc.pdf"' (string JSON) ou '{"path": "/tmp/doc.pdf"}'
         
-        # Vamos tratar o input como o file_path direto (enviado como string JSON)
-        file_path = json.loads(input_str)
-        if not isinstance(file_path, str):
-            raise ValueError("Input (stdin) não é uma string JSON de caminho.")
-            
-        return file_path
+        # Aceitamos o file_path direto (string JSON) ou {"file_path": ..., "force_refresh": ...}
+        return parse_input(json.loads(input_str))
         
     except json.JSONDecodeError as e:
         print(f"Erro de JSON no stdin: {e}", file=sys.stderr)
@@ -44,14 +100,42 @@ def read_input_from_stdin():
         print(f"Erro de Valor no stdin: {e}", file=sys.stderr)
         return None
 
-def perform_semantic_ocr(file_path: str):
+def _is_pdf(file_path: str) -> bool:
+    return pdfium is not None and file_path.lower().endswith(".pdf") and os.path.isfile(file_path)
+
+def count_pages(file_path: str) -> int:
+    """Número de páginas do PDF. Imagens (ou sem 'pypdfium2'): 1."""
+    if not _is_pdf(file_path):
+        return 1
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def render_page(file_path: str, page_index: int):
+    """Renderiza UMA página como imagem (PIL). None se não for PDF."""
+    if not _is_pdf(file_path):
+        return None
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        page = pdf[page_index]
+        try:
+            return page.render(scale=OCR_RENDER_SCALE).to_pil()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+def perform_semantic_ocr(file_path: str, page_index: int = 0, image=None):
     """
-    Simula o 'nanonets-OCR2 3b' processando um arquivo.
+    Simula o 'nanonets-OCR2 3b' processando uma página do arquivo.
     
     Na implementação real, aqui você usaria a biblioteca
-    'nanonets' ou faria uma chamada de API para o modelo.
+    'nanonets' ou faria uma chamada de API para o modelo
+    com a 'image' da página.
     
-    Retorna o documento como Markdown limpo.
+    Retorna a página como Markdown limpo.
     """
     # Verifica se o arquivo (simulado) existe
     if not os.path.exists(file_path):
@@ -62,6 +146,8 @@ def perform_semantic_ocr(file_path: str):
     # --- SIMULAÇÃO ---
     # Simulamos o resultado do OCR para o 'proc_matricula_001.yaml'
     # Esta é a "mágica" do OCR semântico: ele já retorna Markdown.
+    if page_index > 0:
+        return f"\n<!-- Página {page_index + 1} -->\n"
     
     mock_markdown_output = """
 # Ficha de Matrícula - Aluno 123
@@ -79,6 +165,155 @@ def perform_semantic_ocr(file_path: str):
 """
     return mock_markdown_output
 
+def ocr_page(file_path: str, page_index: int) -> str:
+    """Renderiza, lê e libera UMA página (roda no processo do pool)."""
+    image = render_page(file_path, page_index)
+    try:
+        return perform_semantic_ocr(file_path, page_index, image)
+    finally:
+        if image is not None:
+            image.close()
+
+_page_pool = None
+
+def page_pool() -> ProcessPoolExecutor:
+    """O pool de processos (criado uma vez e reaproveitado no modo worker)."""
+    global _page_pool
+    if _page_pool is None:
+        _page_pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES)
+    return _page_pool
+
+def iter_pages(file_path: str, page_count: int):
+    """
+    Gera o Markdown de cada página NA ORDEM, assim que fica pronto.
+    As páginas seguintes continuam sendo lidas enquanto as primeiras
+    são consumidas (janela de OCR_PROCESSES * OCR_PAGES_IN_FLIGHT_PER_PROCESS).
+    """
+    if page_count <= 1 or OCR_PROCESSES <= 1:
+        for page_index in range(page_count):
+            yield ocr_page(file_path, page_index)
+        return
+
+    pool = page_pool()
+    page_indexes = iter(range(page_count))
+    pending = deque(
+        pool.submit(ocr_page, file_path, page_index)
+        for page_index in itertools.islice(page_indexes, OCR_PROCESSES * OCR_PAGES_IN_FLIGHT_PER_PROCESS)
+    )
+    try:
+        while pending:
+            markdown = pending.popleft().result()
+            page_index = next(page_indexes, None)
+            if page_index is not None:
+                pending.append(pool.submit(ocr_page, file_path, page_index))
+            yield markdown
+    finally:
+        # Erro em uma página (ou consumidor parou): não lê o resto à toa
+        for future in pending:
+            future.cancel()
+
+def run_pages(file_path: str, on_page=None) -> list:
+    """OCR de todas as páginas; 'on_page(page_index, page_count, markdown)' recebe cada uma."""
+    page_count = count_pages(file_path)
+    pages = []
+    for page_index, markdown in enumerate(iter_pages(file_path, page_count)):
+        pages.append(markdown)
+        if on_page:
+            on_page(page_index, page_count, markdown)
+    return pages
+
+def hash_file(file_path: str) -> str:
+    """sha256 do conteúdo, lido em blocos (sem carregar o arquivo inteiro)."""
+    digest = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK_BYTES)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+class OCRResultStore:
+    """
+    Guarda as páginas (Markdown) de cada documento em '<cache_dir>/<sha256>.json'.
+    O 'mtime' marca o último uso; quando o diretório passa de 'max_bytes',
+    os arquivos menos usados são apagados.
+    """
+
+    def __init__(self, cache_dir: str = OCR_CACHE_DIR, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def get(self, digest: str):
+        path = self._entry_path(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        # Resultado de outra versão do motor de OCR não vale
+        if entry.get("ocr_engine") != OCR_ENGINE:
+            return None
+        os.utime(path)  # marca como usado (LRU)
+        # Entradas antigas (antes das páginas) têm só o 'markdown'
+        return entry.get("pages") or [entry["markdown"]]
+
+    def put(self, digest: str, pages: list):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(digest)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": pages, "ocr_engine": OCR_ENGINE, "created_at": time.time()}, f)
+        os.replace(tmp_path, path)  # atômico: leitores nunca veem arquivo pela metade
+        self.evict()
+
+    def evict(self):
+        """Apaga os resultados menos usados até caber em 'max_bytes'."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+ocr_store = OCRResultStore()
+
+def ocr_with_store(file_path: str, force_refresh: bool = False, on_page=None):
+    """
+    Executa o OCR passando pelo cache. Retorna (pages, digest, status),
+    com status 'hit', 'miss', 'refresh' ou 'bypass' (arquivo inexistente).
+    'on_page' recebe as páginas na ordem (também as que vêm do cache).
+    """
+    if not os.path.isfile(file_path):
+        return run_pages(file_path, on_page), None, "bypass"
+
+    digest = hash_file(file_path)
+    if not force_refresh:
+        pages = ocr_store.get(digest)
+        if pages is not None:
+            if on_page:
+                for page_index, markdown in enumerate(pages):
+                    on_page(page_index, len(pages), markdown)
+            return pages, digest, "hit"
+
+    pages = run_pages(file_path, on_page)
+    ocr_store.put(digest, pages)
+    return pages, digest, "refresh" if force_refresh else "miss"
+
 def write_output_to_stdout(data: dict):
     """Envia o resultado para o stdout como uma string JSON."""
     try:
@@ -87,25 +322,47 @@ def write_output_to_stdout(data: dict):
         # Se falhar, envia um erro para o stderr
         print(json.dumps({"error": f"Falha ao serializar saída: {e}"}), file=sys.stderr)
 
+def handle_request(input_data, emit_chunk=None):
+    """
+    Processa um pedido (modo stdin ou worker) e retorna o dict de saída.
+    No modo worker, 'emit_chunk' manda cada página assim que fica pronta.
+    """
+    file_path, force_refresh = parse_input(input_data)
+
+    on_page = None
+    if emit_chunk is not None:
+        def on_page(page_index, page_count, markdown):
+            emit_chunk({"page": page_index + 1, "page_count": page_count, "markdown": markdown})
+
+    # 2. Executa o OCR (ou reaproveita o resultado do mesmo conteúdo)
+    pages, digest, cache_status = ocr_with_store(file_path, force_refresh, on_page)
+    
+    # 3. Prepara a saída (conforme esperado pelo 'atomic_engine')
+    # O engine espera um dict/JSON.
+    # A 'output_variable' era 'raw_markdown_content'.
+    return {
+        "raw_markdown_content": PAGE_SEPARATOR.join(pages),
+        "page_count": len(pages),
+        "source_file": file_path,
+        "ocr_engine": OCR_ENGINE,
+        "content_sha256": digest,
+        "ocr_cache": cache_status
+    }
+
 def main():
-    file_path = read_input_from_stdin()
+    if is_worker_mode():
+        serve_worker(handle_request, streaming=True)
+        return
+
+    request = read_input_from_stdin()
     
-    if file_path is None:
+    if request is None:
         write_output_to_stdout({"error": "Falha ao ler o caminho do arquivo do stdin."})
         sys.exit(1)
 
+    file_path, force_refresh = request
     try:
-        # 2. Executa o OCR
-        markdown_content = perform_semantic_ocr(file_path)
-        
-        # 3. Prepara a saída (conforme esperado pelo 'atomic_engine')
-        # O engine espera um dict/JSON.
-        # A 'output_variable' era 'raw_markdown_content'.
-        output_data = {
-            "raw_markdown_content": markdown_content,
-            "source_file": file_path,
-            "ocr_engine": "nanonets-OCR2 (simulado)"
-        }
+        output_data = handle_request({"file_path": file_path, "force_refresh": force_refresh})
         
         # 4. Envia o JSON para o stdout
         write_output_to_stdout(output_data)
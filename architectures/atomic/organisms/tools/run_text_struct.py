@@ -12,37 +12,67 @@
 #    formato JSON/YAML solicitado.
 # 3. Imprime um JSON para o 'stdout'.
 #
+# Com '--worker', fica aberto atendendo vários pedidos (NDJSON),
+# conforme 'worker_protocol.py'.
+#
+# Documentos longos: com 'chunking' no input ({"max_chars": 6000,
+# "max_parallel": 4, "fields": [...]}), o texto é dividido nos títulos
+# do Markdown, cada pedaço é estruturado em paralelo e os JSONs são
+# juntados (o mesmo 'core/text_chunking.py' do motor).
+#
+# Aceita 'blob_refs: true' no Organismo: 'text_content' pode chegar como
+# referência do blob store e é lido do disco (mmap) aqui.
+#
 # -----------------------------------------------------------------
 
 import sys
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+from worker_protocol import is_worker_mode, serve_worker, load_blob_handles
+
+# 'core/' fica dois níveis acima de 'organisms/tools/'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from core.text_chunking import (
+    chunking_settings, split_sections, merge_extractions, CHUNK_INSTRUCTION
+)
 
 # Na implementação real, você importaria o cliente Ollama
 # import ollama
 
+def parse_input(input_data):
+    """Valida o input já decodificado e retorna (text_content, prompt, chunking)."""
+    if not isinstance(input_data, dict):
+        raise ValueError("Input (stdin) não é um objeto JSON.")
+        
+    required_keys = ['text_content', 'prompt']
+    for key in required_keys:
+        if key not in input_data:
+            raise ValueError(f"Chave '{key}' ausente no input do stdin.")
+    
+    # Mesmo formato de 'llm_config.chunking' nos Organismos
+    chunking = chunking_settings({"llm_config": {"chunking": input_data.get('chunking', False)}})
+    # Com 'blob_refs', o texto grande chega como referência (lida do disco)
+    text_content = load_blob_handles(input_data['text_content'])
+    if not isinstance(text_content, str):
+        raise ValueError("'text_content' precisa ser um texto.")
+    return text_content, input_data['prompt'], chunking
+
 def read_input_from_stdin():
     """Lê e parseia o JSON vindo do stdin."""
     try:
         input_data = json.loads(sys.stdin.read())
-        
-        if not isinstance(input_data, dict):
-            raise ValueError("Input (stdin) não é um objeto JSON.")
-            
-        required_keys = ['text_content', 'prompt']
-        for key in required_keys:
-            if key not in input_data:
-                raise ValueError(f"Chave '{key}' ausente no input do stdin.")
-        
-        return input_data['text_content'], input_data['prompt']
+        parse_input(input_data)
+        return input_data
         
     except json.JSONDecodeError as e:
         print(f"Erro de JSON no stdin: {e}", file=sys.stderr)
-        return None, None
+        return None
     except ValueError as e:
         print(f"Erro de Valor no stdin: {e}", file=sys.stderr)
-        return None, None
+        return None
 
 def perform_text_structuring(text_content: str, prompt: str):
     """
@@ -104,6 +134,28 @@ def perform_text_structuring(text_content: str, prompt: str):
                         
     return mock_json_output
 
+def perform_chunked_structuring(text_content: str, prompt: str, chunking: dict):
+    """
+    Map-reduce: estrutura cada pedaço do texto em paralelo (até
+    'max_parallel' chamadas ao modelo) e junta os JSONs.
+    """
+    chunks = split_sections(text_content, chunking["max_chars"])
+    if len(chunks) == 1:
+        return perform_text_structuring(text_content, prompt)
+
+    chunk_prompt = f"{prompt}\n\n{CHUNK_INSTRUCTION}"
+    with ThreadPoolExecutor(max_workers=min(chunking["max_parallel"], len(chunks))) as pool:
+        results = list(pool.map(lambda chunk: perform_text_structuring(chunk, chunk_prompt), chunks))
+
+    # Pedaços que a simulação (ou o modelo) não entendeu não entram na junção
+    extracted = [result for result in results if isinstance(result, dict) and "error" not in result]
+    if not extracted:
+        return results[0]
+    merged, conflicts = merge_extractions(extracted, chunking["fields"])
+    if conflicts:
+        print(f"Conflitos entre pedaços (mantido o valor mais frequente): {', '.join(conflicts)}", file=sys.stderr)
+    return merged
+
 def write_output_to_stdout(data: dict):
     """Envia o resultado para o stdout como uma string JSON."""
     try:
@@ -113,16 +165,28 @@ def write_output_to_stdout(data: dict):
         # Se falhar, envia um erro para o stderr
         print(json.dumps({"error": f"Falha ao serializar saída JSON: {e}"}), file=sys.stderr)
 
+def handle_request(input_data):
+    """Processa um pedido (modo stdin ou worker) e retorna o dict de saída."""
+    text_content, prompt, chunking = parse_input(input_data)
+
+    # 2. Executa a estruturação do texto (em pedaços, se pedido)
+    if chunking is not None:
+        return perform_chunked_structuring(text_content, prompt, chunking)
+    return perform_text_structuring(text_content, prompt)
+
 def main():
-    text_content, prompt = read_input_from_stdin()
+    if is_worker_mode():
+        serve_worker(handle_request)
+        return
+
+    input_data = read_input_from_stdin()
     
-    if text_content is None or prompt is None:
+    if input_data is None:
         write_output_to_stdout({"error": "Falha ao ler o input (texto/prompt) do stdin."})
         sys.exit(1)
 
     try:
-        # 2. Executa a estruturação do texto
-        structured_data = perform_text_structuring(text_content, prompt)
+        structured_data = handle_request(input_data)
         
         # 3. Envia o JSON (o dicionário Python) para o stdout
         write_output_to_stdout(structured_data)
@@ -7,63 +7,309 @@
 # Este script é uma "ferramenta local" executada pelo AtomicEngine.
 # Ele é chamado pelo 'agent_vision.yaml' (type: "llm_chat", mas pode ser 'local_tool').
 #
-# 1. Recebe um JSON do 'stdin' (do engine) contendo o 'image_path' e uma 'question'.
-# 2. Executa a análise de visão (aqui simulada) usando um VLM.
-# 3. Imprime um JSON para o 'stdout' (para o engine).
+# 1. Recebe um JSON do 'stdin' (do engine) contendo o 'image_path' e
+#    uma 'question' (ou várias em 'questions').
+# 2. Prepara a imagem para o VLM (reduz ou divide em blocos) e a codifica.
+# 3. Executa a análise de visão (aqui simulada) usando um VLM.
+# 4. Imprime um JSON para o 'stdout' (para o engine).
+#
+# Com '--worker', fica aberto atendendo vários pedidos (NDJSON),
+# conforme 'worker_protocol.py'.
+#
+# Pré-processamento (precisa do Pillow; sem ele, a imagem vai como está):
+#   downscale - reduz o lado maior para ATOMIC_VISION_MAX_SIDE (a
+#               resolução nativa do modelo);
+#   tile      - uma visão geral reduzida + blocos de MAX_SIDE na
+#               resolução original (texto miúdo de scans continua legível);
+#   auto      - 'tile' se a imagem for mais que 2x maior que MAX_SIDE.
+#
+# As imagens codificadas ficam guardadas pelo hash (sha256) do CONTEÚDO
+# do arquivo + parâmetros do pré-processamento: em memória (modo
+# worker) e em disco. Várias perguntas sobre a mesma imagem vão em UM
+# pedido: a imagem é codificada (e enviada ao modelo) uma vez só.
 #
 # -----------------------------------------------------------------
 
 import sys
 import json
 import os
+import io
+import math
+import time
+import base64
+import hashlib
+from collections import OrderedDict
+
+from worker_protocol import is_worker_mode, serve_worker
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
 
 # Em um cenário real, você importaria o provedor Ollama/Dashscope aqui.
 # from organisms.providers_api.ollama_provider import run_qwen_vision # Exemplo
 # from organisms.providers_api.dashscope_provider import run_qwen_vision # Exemplo
 
+VLM_MODEL = "qwen:v2.5-8b (simulado)"
+
+# --- Pré-processamento ---
+VISION_MODE = os.environ.get("ATOMIC_VISION_MODE", "auto")
+# Lado maior (px) das imagens enviadas ao modelo
+VISION_MAX_SIDE = int(os.environ.get("ATOMIC_VISION_MAX_SIDE", "1024"))
+VISION_MAX_TILES = int(os.environ.get("ATOMIC_VISION_MAX_TILES", "6"))
+# Sobreposição entre blocos vizinhos (texto cortado na borda aparece inteiro em um deles)
+VISION_TILE_OVERLAP = 32
+VISION_JPEG_QUALITY = int(os.environ.get("ATOMIC_VISION_JPEG_QUALITY", "90"))
+VISION_MODES = ("auto", "downscale", "tile")
+
+# --- Cache das imagens codificadas ---
+VISION_CACHE_DIR = os.environ.get(
+    "ATOMIC_VISION_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vision_cache")
+)
+VISION_CACHE_MAX_BYTES = int(os.environ.get("ATOMIC_VISION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Entradas guardadas em memória no modo worker
+VISION_MEMORY_ENTRIES = 32
+HASH_CHUNK_BYTES = 1024 * 1024
+
+def parse_input(input_data):
+    """
+    Valida o input já decodificado. Exige 'image_path' e 'question'
+    (string) ou 'questions' (lista). Opcional: 'preprocess' com
+    'mode', 'max_side' e 'max_tiles'.
+    Retorna (image_path, questions, preprocess).
+    """
+    if not isinstance(input_data, dict):
+        raise ValueError("Input (stdin) não é um objeto JSON.")
+
+    if 'image_path' not in input_data:
+        raise ValueError("Chave 'image_path' ausente no input do stdin.")
+
+    questions = input_data.get('questions')
+    if questions is None:
+        if 'question' not in input_data:
+            raise ValueError("Chave 'question' (ou 'questions') ausente no input do stdin.")
+        questions = [input_data['question']]
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) for q in questions):
+        raise ValueError("'questions' deve ser uma lista não vazia de strings.")
+
+    preprocess = {
+        "mode": VISION_MODE,
+        "max_side": VISION_MAX_SIDE,
+        "max_tiles": VISION_MAX_TILES,
+        **(input_data.get('preprocess') or {}),
+    }
+    if preprocess["mode"] not in VISION_MODES:
+        raise ValueError(f"'preprocess.mode' inválido: {preprocess['mode']!r} (use {', '.join(VISION_MODES)}).")
+
+    return input_data['image_path'], questions, preprocess
+
 def read_input_from_stdin():
     """Lê e parseia o JSON vindo do stdin."""
     try:
-        input_data = json.loads(sys.stdin.read())
-        
-        if not isinstance(input_data, dict):
-            raise ValueError("Input (stdin) não é um objeto JSON.")
-            
-        required_keys = ['image_path', 'question']
-        for key in required_keys:
-            if key not in input_data:
-                raise ValueError(f"Chave '{key}' ausente no input do stdin.")
-        
-        return input_data
-        
+        return json.loads(sys.stdin.read())
+
     except json.JSONDecodeError as e:
         print(f"Erro de JSON no stdin: {e}", file=sys.stderr)
         return None
-    except ValueError as e:
-        print(f"Erro de Valor no stdin: {e}", file=sys.stderr)
-        return None
 
-def perform_vision_analysis(image_path: str, question: str):
+def hash_file(file_path: str) -> str:
+    """sha256 do conteúdo, lido em blocos (sem carregar o arquivo inteiro)."""
+    digest = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK_BYTES)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+# --- Pré-processamento ---
+
+def _encode(image) -> str:
+    """Imagem PIL -> JPEG em base64 (o formato do campo 'images' do Ollama)."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def _downscaled(image, max_side: int):
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+def _tile_boxes(width: int, height: int, max_side: int, max_tiles: int):
+    """Caixas (left, top, right, bottom) da grade de blocos, com sobreposição."""
+    columns = math.ceil(width / max_side)
+    rows = math.ceil(height / max_side)
+    # Grade grande demais: blocos maiores (reduzidos depois para 'max_side')
+    while columns * rows > max_tiles:
+        if columns >= rows:
+            columns -= 1
+        else:
+            rows -= 1
+    tile_width = math.ceil(width / columns)
+    tile_height = math.ceil(height / rows)
+    for row in range(rows):
+        for column in range(columns):
+            yield (
+                max(0, column * tile_width - VISION_TILE_OVERLAP),
+                max(0, row * tile_height - VISION_TILE_OVERLAP),
+                min(width, (column + 1) * tile_width + VISION_TILE_OVERLAP),
+                min(height, (row + 1) * tile_height + VISION_TILE_OVERLAP),
+            )
+
+def preprocess_image(image_path: str, mode: str, max_side: int, max_tiles: int) -> dict:
+    """
+    Abre, corrige a orientação (EXIF) e reduz/divide a imagem.
+    Retorna {'images': [base64, ...], 'layout': {...}}.
+    """
+    if Image is None:
+        # Sem Pillow: a imagem original, sem redução
+        with open(image_path, "rb") as f:
+            data = f.read()
+        return {"images": [base64.b64encode(data).decode("ascii")], "layout": {"mode": "original"}}
+
+    with Image.open(image_path) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+    width, height = image.size
+    layout = {"mode": "original", "original_size": [width, height], "tiles": 0}
+    if max(width, height) <= max_side:
+        return {"images": [_encode(image)], "layout": layout}
+
+    if mode == "auto":
+        mode = "tile" if max(width, height) > 2 * max_side else "downscale"
+
+    # Visão geral reduzida (em 'tile', vai antes dos blocos)
+    images = [_encode(_downscaled(image, max_side))]
+    layout["mode"] = mode
+    if mode == "tile":
+        for box in _tile_boxes(width, height, max_side, max_tiles):
+            tile = image.crop(box)
+            if max(tile.size) > max_side:
+                tile.thumbnail((max_side, max_side), Image.LANCZOS)
+            images.append(_encode(tile))
+            tile.close()
+        layout["tiles"] = len(images) - 1
+    image.close()
+    return {"images": images, "layout": layout}
+
+class EncodedImageStore:
     """
-    Simula o 'qwen 2.5 vision 8b' analisando uma imagem.
-    
+    Guarda as imagens codificadas em '<cache_dir>/<chave>.json' (chave =
+    sha256 do conteúdo + parâmetros) e as mais recentes em memória.
+    O 'mtime' marca o último uso; quando o diretório passa de 'max_bytes',
+    os arquivos menos usados são apagados.
+    """
+
+    def __init__(self, cache_dir: str = VISION_CACHE_DIR, max_bytes: int = VISION_CACHE_MAX_BYTES,
+                 memory_entries: int = VISION_MEMORY_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+
+    @staticmethod
+    def key(digest: str, mode: str, max_side: int, max_tiles: int) -> str:
+        params = f"{digest}:{mode}:{max_side}:{max_tiles}:{VISION_JPEG_QUALITY}:{Image is not None}"
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key: str, entry: dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        os.utime(path)  # marca como usado (LRU)
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: dict):
+        self._remember(key, entry)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**entry, "created_at": time.time()}, f)
+        os.replace(tmp_path, path)  # atômico: leitores nunca veem arquivo pela metade
+        self.evict()
+
+    def evict(self):
+        """Apaga as entradas menos usadas até caber em 'max_bytes'."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+image_store = EncodedImageStore()
+
+def prepare_images(image_path: str, preprocess: dict):
+    """
+    As imagens prontas para o VLM, passando pelo cache.
+    Retorna (entry, status), com status 'hit', 'miss' ou 'bypass' (arquivo inexistente).
+    """
+    if not os.path.isfile(image_path):
+        return {"images": [], "layout": {"mode": "original"}}, "bypass"
+
+    key = image_store.key(hash_file(image_path), preprocess["mode"], preprocess["max_side"], preprocess["max_tiles"])
+    entry = image_store.get(key)
+    if entry is not None:
+        return entry, "hit"
+
+    entry = preprocess_image(image_path, preprocess["mode"], preprocess["max_side"], preprocess["max_tiles"])
+    image_store.put(key, entry)
+    return entry, "miss"
+
+def perform_vision_analysis(image_path: str, images: list, questions: list):
+    """
+    Simula o 'qwen 2.5 vision 8b' respondendo às perguntas sobre uma imagem.
+
     Na implementação real, aqui você usaria o cliente Ollama para
-    chamar o modelo Qwen-VL.
-    
+    chamar o modelo Qwen-VL UMA vez, com as imagens já preparadas
+    e as perguntas numeradas:
+
     Ex:
-    response = ollama_client.generate(
+    response = ollama_client.chat(
         model='qwen:v2.5-8b',
-        prompt=question,
-        images=[image_path]
+        format='json',
+        messages=[{
+            'role': 'user',
+            'content': 'Responda em JSON {"1": ..., "2": ...}:\\n1. ...\\n2. ...',
+            'images': images,
+        }]
     )
-    return response['response']
+    return [json.loads(response['message']['content'])[str(i + 1)] for i in range(len(questions))]
     """
-    # Verifica se o arquivo (simulado) existe
-    if not os.path.exists(image_path):
-        # Em um cenário real, você faria a verificação.
-        # Como o engine já tem o path, vamos apenas simular.
-        pass
+    return [_simulated_answer(image_path, question) for question in questions]
 
+def _simulated_answer(image_path: str, question: str) -> str:
     # --- SIMULAÇÃO ---
     # Simula a resposta do Qwen-VL baseada na pergunta.
     if "o que você vê" in question.lower() or "descreva a imagem" in question.lower():
@@ -79,7 +325,7 @@ def perform_vision_analysis(image_path: str, question: str):
     else:
         mock_response = f"Simulação de análise visual para a pergunta: '{question}'. " \
                         "Parece uma bela paisagem natural."
-                        
+
     return mock_response
 
 def write_output_to_stdout(data: dict):
@@ -90,32 +336,47 @@ def write_output_to_stdout(data: dict):
         # Se falhar, envia um erro para o stderr
         print(json.dumps({"error": f"Falha ao serializar saída: {e}"}), file=sys.stderr)
 
+def handle_request(input_data):
+    """Processa um pedido (modo stdin ou worker) e retorna o dict de saída."""
+    image_path, questions, preprocess = parse_input(input_data)
+
+    # 2. Prepara a imagem (ou reaproveita a do mesmo conteúdo)
+    prepared, cache_status = prepare_images(image_path, preprocess)
+
+    # 3. Executa a análise de visão (todas as perguntas de uma vez)
+    answers = perform_vision_analysis(image_path, prepared["images"], questions)
+
+    # 4. Prepara a saída (conforme esperado pelo 'atomic_engine')
+    # A 'output_variable' era 'vision_description'.
+    output = {
+        "answers": [{"question": q, "answer": a} for q, a in zip(questions, answers)],
+        "source_image": image_path,
+        "vlm_model": VLM_MODEL,
+        "image_preprocessing": {**prepared["layout"], "images": len(prepared["images"]), "cache": cache_status},
+    }
+    if len(questions) == 1:
+        # Formato de uma pergunta só (compatível com as Moléculas existentes)
+        output["vision_description"] = answers[0]
+        output["question_asked"] = questions[0]
+    return output
+
 def main():
+    if is_worker_mode():
+        serve_worker(handle_request)
+        return
+
     input_data = read_input_from_stdin()
-    
+
     if input_data is None:
         write_output_to_stdout({"error": "Falha ao ler o input do stdin para visão."})
         sys.exit(1)
 
-    image_path = input_data['image_path']
-    question = input_data['question']
-
     try:
-        # 2. Executa a análise de visão
-        vision_analysis_result = perform_vision_analysis(image_path, question)
-        
-        # 3. Prepara a saída (conforme esperado pelo 'atomic_engine')
-        # A 'output_variable' era 'vision_description'.
-        output_data = {
-            "vision_description": vision_analysis_result,
-            "source_image": image_path,
-            "question_asked": question,
-            "vlm_model": "qwen:v2.5-8b (simulado)"
-        }
-        
-        # 4. Envia o JSON para o stdout
+        output_data = handle_request(input_data)
+
+        # 5. Envia o JSON para o stdout
         write_output_to_stdout(output_data)
-        
+
     except Exception as e:
         write_output_to_stdout({"error": f"Erro durante a análise de visão: {e}"})
         sys.exit(1)
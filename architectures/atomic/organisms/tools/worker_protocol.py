@@ -0,0 +1,110 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Protocolo do Modo Worker
+# organisms/tools/worker_protocol.py
+# -----------------------------------------------------------------
+#
+# Modo "worker" (processo de longa duração) das ferramentas locais.
+# Em vez de um processo por passo, o AtomicEngine mantém o script
+# aberto (`python run_ocr.py --worker`) e conversa com ele por
+# JSON delimitado por linha (NDJSON):
+#
+#   engine -> stdin : {"id": "42", "input": <mesmo input do modo stdin>}
+#   stdout -> engine: {"id": "42", "output": {...}}  ou  {"id": "42", "error": "..."}
+#
+# Ferramentas em streaming (serve_worker(..., streaming=True)) podem
+# mandar resultados parciais antes da resposta final, na ordem:
+#
+#   stdout -> engine: {"id": "42", "chunk": {...}}   (zero ou mais)
+#   stdout -> engine: {"id": "42", "output": {...}}
+#
+#   engine -> stdin : {"id": "43", "op": "ping"}
+#   stdout -> engine: {"id": "43", "ok": true}
+#
+# Logs e erros continuam indo para o stderr: o stdout é só do protocolo.
+#
+# Organismos com 'local_tool_config.blob_refs: true' mandam as saídas
+# grandes como referências do blob store (core/blob_store.py):
+#
+#   {"$blob": "<id>", "kind": "text"|"json", "size": ..., "path": "..."}
+#
+# A ferramenta chama 'load_blob_handles' só nos campos que usa: o
+# arquivo é lido com mmap direto do disco, sem passar pelo stdin.
+#
+# -----------------------------------------------------------------
+
+import sys
+import json
+import mmap
+
+WORKER_FLAG = "--worker"
+BLOB_REF_KEY = "$blob"
+
+
+def is_worker_mode() -> bool:
+    """O script foi iniciado com '--worker'?"""
+    return WORKER_FLAG in sys.argv[1:]
+
+
+def load_blob_handles(value):
+    """
+    Troca as referências de blob (em qualquer nível de dicts/listas) pelo
+    conteúdo, lido do 'path' com mmap. Outros valores voltam como estão.
+    """
+    if isinstance(value, dict) and BLOB_REF_KEY in value:
+        try:
+            with open(value["path"], "rb") as f:
+                if value.get("size") == 0:
+                    text = ""
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                        text = str(view, "utf-8")
+        except (KeyError, FileNotFoundError):
+            raise ValueError(f"Blob {value[BLOB_REF_KEY]} indisponível (sem 'path' ou já expirado).")
+        return json.loads(text) if value.get("kind") == "json" else text
+    if isinstance(value, dict):
+        return {key: load_blob_handles(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [load_blob_handles(item) for item in value]
+    return value
+
+
+def _reply(response: dict):
+    sys.stdout.write(json.dumps(response) + "\n")
+    sys.stdout.flush()
+
+
+def serve_worker(handle_request, streaming: bool = False):
+    """
+    Loop do worker: lê um pedido por linha do stdin e responde uma
+    linha no stdout. 'handle_request(input_data)' recebe o mesmo
+    input do modo stdin e retorna o dict de saída (ou lança erro).
+    Com 'streaming', é chamado como 'handle_request(input_data, emit_chunk)'
+    e cada 'emit_chunk(dict)' vira uma linha {"id", "chunk"}.
+    Termina quando o stdin é fechado.
+    """
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            _reply({"id": None, "error": f"Pedido inválido (JSON): {e}"})
+            continue
+
+        request_id = request.get("id")
+        if request.get("op") == "ping":
+            _reply({"id": request_id, "ok": True})
+            continue
+
+        try:
+            if streaming:
+                output = handle_request(
+                    request.get("input"), lambda chunk: _reply({"id": request_id, "chunk": chunk})
+                )
+            else:
+                output = handle_request(request.get("input"))
+            _reply({"id": request_id, "output": output})
+        except Exception as e:
+            _reply({"id": request_id, "error": str(e)})
@@ -0,0 +1,29 @@
+# -----------------------------------------------------------------
+# 🧩 Atomic Architecture - Configuração dos Testes (pytest)
+# tests/conftest.py
+# -----------------------------------------------------------------
+#
+# Rode a partir de 'architectures/atomic':
+#
+#   pip install -r requirements-dev.txt
+#   python -m pytest -q tests
+#
+# Os diretórios de estado (blobs, checkpoints, WAL, caches) vão para um
+# temporário: os testes nunca escrevem na árvore do projeto.
+#
+# -----------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+
+ATOMIC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ATOMIC_ROOT not in sys.path:
+    sys.path.insert(0, ATOMIC_ROOT)
+
+# Lidas na importação dos módulos do 'core': precisam vir antes
+_STATE_DIR = tempfile.mkdtemp(prefix="atomic_tests_")
+os.environ.setdefault("ATOMIC_BLOB_DIR", os.path.join(_STATE_DIR, "blobs"))
+os.environ.setdefault("ATOMIC_CHECKPOINT_DIR", os.path.join(_STATE_DIR, "checkpoints"))
+os.environ.setdefault("ATOMIC_GRAPH_WAL_DIR", os.path.join(_STATE_DIR, "graph_wal"))
+os.environ.setdefault("ATOMIC_HOT_RELOAD", "0")
@@ -0,0 +1,113 @@
+# Ferramentas locais com 'blob_refs: true': a saída grande chega como referência
+# e o run_text_struct.py a lê do disco (organisms/tools/worker_protocol.py).
+
+import os
+import sys
+import json
+
+import pytest
+import yaml
+
+from core.blob_store import DiskBlobBackend, blob_store, BLOB_THRESHOLD_BYTES, is_blob_ref
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "organisms", "tools"))
+from worker_protocol import load_blob_handles
+
+BIG_MARKDOWN = "# Ficha de Matrícula\n\n" + "\n\n".join(
+    f"## Seção {i}\n\n" + "conteúdo da ficha " * 200 for i in range(int(BLOB_THRESHOLD_BYTES / 3000) + 10)
+)
+
+TOOL_AGENT = {
+    "agent_id": "text_struct_tool",
+    "type": "local_tool",
+    "local_tool_config": {"script_path": "run_text_struct.py", "blob_refs": True,
+                          "worker_pool": {"enabled": True, "size": 1}},
+}
+
+MOLECULE = {
+    "chain_id": "blob_refs_chain",
+    "steps": [
+        {"step": 1, "name": "leitura", "agent": "text_struct_tool.yaml", "input": "$.input_trigger.doc",
+         "output_variable": "markdown"},
+        {"step": 2, "name": "estruturacao", "agent": "text_struct_tool.yaml",
+         "input": {"text_content": "$.steps[0].markdown", "prompt": "Extraia nome_aluno e cpf_aluno.",
+                   "chunking": {"max_chars": 6000}},
+         "output_variable": "dados"},
+    ],
+}
+
+
+def test_load_blob_handles_reads_text_and_json(tmp_path):
+    backend = DiskBlobBackend(str(tmp_path), prune_interval_s=10 ** 9)
+    backend.put("aa01", "texto grande".encode("utf-8"))
+    backend.put("bb02", json.dumps({"campo": [1, 2]}).encode("utf-8"))
+    value = {
+        "texto": {"$blob": "aa01", "kind": "text", "size": 12, "path": backend.path("aa01")},
+        "lista": [{"$blob": "bb02", "kind": "json", "size": 16, "path": backend.path("bb02")}],
+        "outro": 1,
+    }
+
+    assert load_blob_handles(value) == {"texto": "texto grande", "lista": [{"campo": [1, 2]}], "outro": 1}
+
+
+def test_load_blob_handles_missing_file(tmp_path):
+    with pytest.raises(ValueError):
+        load_blob_handles({"$blob": "cc03", "kind": "text", "path": str(tmp_path / "cc03")})
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    pytest.importorskip("ollama")  # o motor importa os clientes na carga
+    from core.atomic_engine import AtomicEngine
+    from core.registry import MoleculeRegistry
+
+    if not isinstance(blob_store.backend, DiskBlobBackend):
+        pytest.skip("requer o blob store em disco")
+    for name, content in (("molecules/blob_refs_chain.yaml", MOLECULE), ("organisms/text_struct_tool.yaml", TOOL_AGENT)):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(yaml.safe_dump(content, allow_unicode=True), encoding="utf-8")
+
+    engine = AtomicEngine()
+    engine.registry = MoleculeRegistry(str(tmp_path / "molecules"), str(tmp_path / "organisms"))
+    engine.tool_inputs = {}
+    dispatch = engine._dispatch_step
+
+    def spy(step, context, input_data):
+        engine.tool_inputs[step.name] = input_data
+        if step.name == "leitura":
+            return BIG_MARKDOWN  # no lugar do OCR: um texto maior que o limite do blob store
+        return dispatch(step, context, input_data)
+
+    monkeypatch.setattr(engine, "_dispatch_step", spy)
+    yield engine
+    engine.tool_pools.close()
+
+
+def test_tool_reads_large_input_from_blob_path(engine):
+    result = engine.run_chain("blob_refs_chain", {"doc": "ficha.pdf"})
+
+    assert result.get("status") == "success", result.get("error")
+    assert is_blob_ref(result["context"]["steps"][0]["markdown"])
+    handle = engine.tool_inputs["estruturacao"]["text_content"]
+    assert is_blob_ref(handle) and os.path.exists(handle["path"])  # o script recebeu só a referência
+    extracted = result["context"]["steps"][1]["dados"]
+    assert extracted["nome_aluno"] and extracted["cpf_aluno"]
+
+
+def test_run_text_struct_dereferences_the_handle(tmp_path):
+    from core.tool_pool import ToolWorkerPool
+
+    backend = DiskBlobBackend(str(tmp_path), prune_interval_s=10 ** 9)
+    backend.put("dd04", BIG_MARKDOWN.encode("utf-8"))
+    handle = {"$blob": "dd04", "kind": "text", "size": len(BIG_MARKDOWN.encode("utf-8")), "path": backend.path("dd04")}
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "organisms", "tools", "run_text_struct.py")
+    pool = ToolWorkerPool(script, size=1, timeout_s=30)
+    try:
+        # Prompt que a simulação não reconhece: ela devolve o começo do texto que leu
+        response = pool.call({"text_content": handle, "prompt": "Resuma."})
+    finally:
+        pool.close()
+
+    assert response["output"]["original_text"] == BIG_MARKDOWN[:50] + "..."
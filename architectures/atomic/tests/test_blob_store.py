@@ -0,0 +1,45 @@
+# Validade dos blobs em disco (core/blob_store.py): o prazo conta a partir do último uso.
+
+import os
+import time
+
+from core.blob_store import DiskBlobBackend, BlobNotFound
+
+import pytest
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+@pytest.fixture
+def backend(tmp_path):
+    # Intervalo enorme: o 'prune' só roda quando o teste chama
+    return DiskBlobBackend(str(tmp_path), ttl_s=60, prune_interval_s=10 ** 9)
+
+
+def test_prune_removes_only_unused_blobs(backend):
+    backend.put("aa11", b"velho")
+    backend.put("bb22", b"lido agora")
+    _age(backend.path("aa11"), 120)
+    _age(backend.path("bb22"), 120)
+
+    assert backend.read_text("bb22") == "lido agora"  # ler renova o prazo
+    backend.prune()
+
+    with pytest.raises(BlobNotFound):
+        backend.read_text("aa11")
+    assert backend.read_text("bb22") == "lido agora"
+
+
+def test_put_and_touch_renew_existing_blob(backend):
+    backend.put("cc33", b"x")
+    _age(backend.path("cc33"), 120)
+
+    backend.put("cc33", b"x")  # mesmo conteúdo: não regrava, só renova
+    backend.prune()
+    assert backend.touch("cc33") is True
+
+    os.remove(backend.path("cc33"))
+    assert backend.touch("cc33") is False
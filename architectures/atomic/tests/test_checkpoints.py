@@ -0,0 +1,105 @@
+# Checkpoints (core/checkpoints.py) pelo motor: opcionais por execução e retomada com 'resume'.
+
+import os
+
+import pytest
+import yaml
+
+pytest.importorskip("ollama")  # o motor importa os clientes na carga
+
+from core.atomic_engine import AtomicEngine
+from core.checkpoints import DiskCheckpointBackend, checkpoint_store
+from core.registry import MoleculeRegistry
+
+AGENT = {
+    "agent_id": "test_llm",
+    "type": "llm_chat",
+    "output_schema": "json",
+    "llm_config": {"model": "test-model", "system_prompt": "Agente de teste.", "cache": False},
+}
+
+MOLECULE = {
+    "chain_id": "resume_chain",
+    "steps": [
+        {"step": 1, "name": "extracao", "agent": "test_llm.yaml", "input": "$.input_trigger.doc",
+         "prompt": "Extraia.", "output_variable": "dados"},
+        {"step": 2, "name": "validacao", "agent": "test_llm.yaml", "input": "$.steps[0].dados",
+         "prompt": "Valide.", "output_variable": "validado"},
+        {"step": 3, "name": "gravacao", "agent": "test_llm.yaml", "input": "$.steps[1].validado",
+         "prompt": "Grave.", "output_variable": "gravado"},
+    ],
+}
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    for name, content in (("molecules/resume_chain.yaml", MOLECULE), ("organisms/test_llm.yaml", AGENT)):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(yaml.safe_dump(content, allow_unicode=True), encoding="utf-8")
+    monkeypatch.setattr(checkpoint_store, "_backend", DiskCheckpointBackend(str(tmp_path / "checkpoints")))
+
+    engine = AtomicEngine()
+    engine.registry = MoleculeRegistry(str(tmp_path / "molecules"), str(tmp_path / "organisms"))
+    engine.calls = []
+    engine.fail_at = None
+
+    def dispatch(step, context, input_data):
+        # No lugar do Ollama: registra a chamada e falha no passo pedido
+        engine.calls.append(step.name)
+        if step.name == engine.fail_at:
+            raise RuntimeError("Neo4j fora do ar")
+        return {"passo": step.name, "de": input_data}
+
+    monkeypatch.setattr(engine, "_dispatch_step", dispatch)
+    yield engine
+    engine.tool_pools.close()
+
+
+def test_without_run_id_nothing_is_recorded(engine, tmp_path):
+    result = engine.run_chain("resume_chain", {"doc": "a.pdf"})
+
+    assert "error" not in result
+    assert "run_id" not in result
+    assert os.listdir(tmp_path / "checkpoints") == []
+
+
+def test_resume_skips_completed_steps(engine):
+    engine.fail_at = "gravacao"
+    failed = engine.run_chain("resume_chain", {"doc": "a.pdf"}, run_id="run-1")
+    assert "error" in failed
+    assert failed["run_id"] == "run-1"
+
+    engine.fail_at, engine.calls = None, []
+    resumed = engine.run_chain("resume_chain", {"doc": "a.pdf"}, run_id="run-1", resume=True)
+
+    assert "error" not in resumed
+    assert engine.calls == ["gravacao"]  # extração e validação vieram do checkpoint
+
+
+def test_resume_with_other_input_reruns_everything(engine):
+    engine.run_chain("resume_chain", {"doc": "a.pdf"}, run_id="run-2")
+
+    engine.calls = []
+    engine.run_chain("resume_chain", {"doc": "b.pdf"}, run_id="run-2", resume=True)
+
+    assert engine.calls == ["extracao", "validacao", "gravacao"]
+
+
+def test_resume_without_run_id_is_rejected(engine):
+    result = engine.run_chain("resume_chain", {"doc": "a.pdf"}, resume=True)
+
+    assert "resume" in result["error"]
+    assert engine.calls == []  # nada rodou
+
+
+def test_api_rejects_resume_without_run_id():
+    pydantic = pytest.importorskip("pydantic")
+    pytest.importorskip("fastapi")
+    from core.main_api import ChainRequest, JobRequest
+
+    with pytest.raises(pydantic.ValidationError):
+        ChainRequest(chain_id="resume_chain", resume=True)
+    with pytest.raises(pydantic.ValidationError):
+        JobRequest(chain_id="resume_chain", resume=True)
+    assert ChainRequest(chain_id="resume_chain", run_id="run-3", resume=True).resume is True
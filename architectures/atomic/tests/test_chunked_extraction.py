@@ -0,0 +1,94 @@
+# proc_matricula_001 de ponta a ponta com um documento longo: o passo 2 recebe a
+# saída inteira do OCR e a extração precisa ir em pedaços (core/text_chunking.py).
+
+import re
+import json
+
+import pytest
+
+pytest.importorskip("ollama")  # o motor importa os clientes na carga
+
+from core.atomic_engine import AtomicEngine
+from core.llm_cache import LLMResponseCache
+from core.text_chunking import CHUNK_INSTRUCTION
+
+FIELD_PATTERN = re.compile(r"- \*\*(\w+):\*\* (.+)")
+
+
+def _filler(title):
+    return f"## {title}\n\n" + "\n\n".join("Texto corrido do formulário sem campos. " * 12 for _ in range(4))
+
+
+# ~10 mil caracteres: maior que o 'max_chars' (6000) do agent_text_struct.yaml
+LONG_MARKDOWN = "\n\n".join([
+    "# Ficha de Matrícula 2025",
+    "## Dados do Aluno\n\n- **nome_aluno:** Maria Souza\n- **cpf_aluno:** 123.456.789-00\n"
+    "- **data_nascimento:** 2010-05-15",
+    _filler("Histórico Escolar"),
+    _filler("Observações da Secretaria"),
+    "## Dados do Responsável\n\n- **nome_responsavel:** Ana Souza\n- **cpf_responsavel:** 987.654.321-00\n"
+    "- **telefone_contato:** (11) 99999-0000",
+    _filler("Termos e Autorizações"),
+    "## Contato de Emergência\n\n- **telefone_contato:** (11) 98888-1111",
+    _filler("Anexos"),
+    "## Atualização Cadastral\n\n- **telefone_contato:** (11) 99999-0000",
+])
+
+
+class FakeOllama:
+    """Extrai os campos '- **campo:** valor' do trecho; responde o resto sem modelo."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def chat(self, model, messages, **kwargs):
+        user = messages[-1]["content"]
+        if CHUNK_INSTRUCTION in user:
+            self.chunks.append(user)
+            content = json.dumps(dict(FIELD_PATTERN.findall(user)), ensure_ascii=False)
+        elif "is_valid" in user:
+            content = '{"is_valid": true, "errors": []}'
+        else:
+            content = "Matrícula de Maria Souza processada."
+        return {"message": {"content": content}}
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = AtomicEngine()
+    engine._llm_cache = LLMResponseCache()  # sem Redis: só o LRU local
+    fake = FakeOllama()
+    monkeypatch.setattr(AtomicEngine, "ollama_client", property(lambda self: fake))
+    engine.fake_ollama = fake
+
+    dispatch = engine._dispatch_step
+
+    def fake_dispatch(step, context, input_data):
+        if step.name == "leitura_OCR":
+            # A saída do run_ocr.py: o markdown é só um dos campos
+            return {"raw_markdown_content": LONG_MARKDOWN, "page_count": 3, "content_sha256": "abc"}
+        if step.name == "gravacao_banco":
+            return {"status": "success", "node_id": "4:n:1"}
+        return dispatch(step, context, input_data)
+
+    monkeypatch.setattr(engine, "_dispatch_step", fake_dispatch)
+    yield engine
+    engine.tool_pools.close()
+
+
+def test_long_ocr_output_is_extracted_in_chunks_and_merged(engine):
+    result = engine.run_chain("proc_matricula_001", {"file_path": "ficha.pdf"})
+
+    assert result.get("status") == "success", result.get("error")
+    assert len(engine.fake_ollama.chunks) > 1
+    assert all(len(chunk) < len(LONG_MARKDOWN) for chunk in engine.fake_ollama.chunks)
+
+    extracted = result["context"]["steps"][1]["structured_json_data"]
+    assert extracted == {
+        "nome_aluno": "Maria Souza",
+        "cpf_aluno": "123.456.789-00",
+        "data_nascimento": "2010-05-15",
+        "nome_responsavel": "Ana Souza",
+        "cpf_responsavel": "987.654.321-00",
+        "telefone_contato": "(11) 99999-0000",  # 2 votos contra 1
+    }
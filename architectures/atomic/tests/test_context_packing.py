@@ -0,0 +1,115 @@
+# Empacotamento do contexto (core/context_packing.py): JSON compacto, campos não citados e orçamento.
+
+import json
+
+import pytest
+
+from core.context_packing import (
+    estimate_tokens,
+    outline_text,
+    pack_context,
+    packing_settings,
+    shrink_json,
+    truncate_text,
+)
+
+PROMPT = "Extraia o nome e a data de nascimento do aluno."
+
+
+def _settings(max_tokens, **extra):
+    return packing_settings({"llm_config": {"context_budget": {"max_tokens": max_tokens, **extra}}})
+
+
+def _document(sections=5, words=200):
+    parts = ["# Ficha de Matrícula"]
+    for i in range(sections):
+        parts.append(f"## Seção {i}\n" + " ".join(f"palavra{i}" for _ in range(words)))
+    return "\n".join(parts)
+
+
+def test_settings():
+    assert packing_settings({}) is None
+    assert packing_settings({"llm_config": {"context_budget": 0}}) is None
+    assert packing_settings({"llm_config": {"context_budget": 300}}) == {
+        "max_tokens": 300, "drop_unreferenced": True, "overflow": "truncate",
+    }
+    with pytest.raises(ValueError):
+        _settings(300, overflow="resumo")
+
+
+def test_without_budget_context_is_compact_json():
+    context = {"nome": "Ana", "itens": [1, 2]}
+
+    text, stats = pack_context(context, PROMPT, None)
+
+    assert text == '{"nome":"Ana","itens":[1,2]}'
+    assert stats == {}
+    assert pack_context("texto livre", PROMPT, None)[0] == "texto livre"
+
+
+def test_unreferenced_fields_are_dropped():
+    context = {
+        "nome": "Ana",
+        "idade": 9,  # 'id' não casa com 'idade'
+        "aluno": {"nascimento": "2015-01-01", "cpf": "000"},
+        "metadata": {"pages": 3},
+    }
+
+    text, stats = pack_context(context, PROMPT + " Use o id.", _settings(1000))
+
+    assert json.loads(text) == {"nome": "Ana", "aluno": {"nascimento": "2015-01-01", "cpf": "000"}}
+    assert stats["dropped_fields"] and not stats["truncated"]
+    assert stats["tokens"] < stats["raw_tokens"]
+
+
+def test_nothing_dropped_when_prompt_names_no_field():
+    context = {"a": 1, "b": 2}
+
+    text, stats = pack_context(context, "Resuma o documento.", _settings(1000))
+
+    assert json.loads(text) == context
+    assert not stats["dropped_fields"]
+
+
+def test_truncate_keeps_head_and_tail_within_budget():
+    document = _document()
+
+    text = truncate_text(document, 100)
+
+    assert estimate_tokens(text) <= 100
+    assert text.startswith("# Ficha de Matrícula")
+    assert text.endswith("palavra4")
+    assert "tokens omitidos" in text
+    assert truncate_text(document, 100) == text  # determinístico (o cache do LLM continua valendo)
+
+
+def test_outline_keeps_every_heading_within_budget():
+    document = _document()
+
+    text = outline_text(document, 150)
+
+    assert estimate_tokens(text) <= 150
+    for i in range(5):
+        assert f"## Seção {i}\n" in text
+        assert f"palavra{i}" in text
+
+
+def test_pack_context_applies_overflow_mode():
+    document = _document()
+
+    outlined, stats = pack_context(document, PROMPT, _settings(150, overflow="outline"))
+    truncated, _ = pack_context(document, PROMPT, _settings(150))
+
+    assert stats["truncated"] and stats["tokens"] <= 150
+    assert "## Seção 2" in outlined and "## Seção 2" not in truncated
+
+
+def test_shrink_json_stays_valid_json_within_budget():
+    value = {"texto": "palavra " * 400, "itens": [{"valor": i} for i in range(200)]}
+
+    text = shrink_json(value, 120)
+
+    assert estimate_tokens(text) <= 120
+    shrunk = json.loads(text)
+    assert shrunk["texto"].endswith("…")
+    assert shrunk["itens"][-1].startswith("... (+")
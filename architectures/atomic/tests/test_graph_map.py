@@ -0,0 +1,198 @@
+# Mapa cognitivo (core/graph_map.py): páginas por cursor, deltas com 'since' e cache com ETag.
+
+import json
+import asyncio
+
+import pytest
+
+from core import graph_map
+from core.graph_map import (
+    EDGES_QUERY,
+    GraphMapCache,
+    GraphMapQuery,
+    GraphMapService,
+    build_nodes_query,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    parse_bbox,
+)
+
+
+class FakeRecord:
+    def __init__(self, data):
+        self._data = data
+
+    def data(self):
+        return dict(self._data)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self._rows:
+            yield FakeRecord(row)
+
+
+class FakeTx:
+    """Executa em memória o que o Cypher de build_nodes_query/EDGES_QUERY pede."""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def run(self, cypher, parameters=None, **kwargs):
+        parameters = {**(parameters or {}), **kwargs}
+        if cypher == EDGES_QUERY:
+            edges = [edge for edge in self.graph.edges if edge["source"] in parameters["ids"]]
+            return FakeResult(edges[:parameters["edge_limit"]])
+
+        rows = sorted(self.graph.nodes, key=lambda node: (node["changed_at"], node["id"]))
+        if "since" in parameters:
+            rows = [row for row in rows if row["changed_at"] > parameters["since"]]
+        if "after_id" in parameters:
+            after = (parameters["after_changed_at"], parameters["after_id"])
+            rows = [row for row in rows if (row["changed_at"], row["id"]) > after]
+        return FakeResult(rows[:parameters["limit"] + 1])
+
+
+class FakeSession:
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_read(self, work):
+        self.graph.reads += 1
+        return await work(FakeTx(self.graph))
+
+
+class FakeDriver:
+    def __init__(self, nodes, edges=()):
+        self.nodes = nodes
+        self.edges = list(edges)
+        self.reads = 0
+
+    def session(self):
+        return FakeSession(self)
+
+
+class FakeWriter:
+    generation = 0
+
+
+def _node(i, changed_at):
+    return {
+        "id": f"4:n:{i:03d}",
+        "labels": ["Aluno"],
+        "properties": {"nome": f"Aluno {i}", "_changed_at": changed_at},
+        "changed_at": changed_at,
+    }
+
+
+def _page(service, **query):
+    body, etag = asyncio.run(service.page(GraphMapQuery(**query)))
+    return json.loads(body), etag
+
+
+def test_cursor_round_trip_and_bad_cursor():
+    assert decode_cursor(encode_cursor(1700, "4:abc:1")) == (1700, "4:abc:1")
+    with pytest.raises(ValueError):
+        decode_cursor("não-é-cursor")
+
+
+def test_parse_bbox():
+    assert parse_bbox("0,0,10,5") == (0.0, 0.0, 10.0, 5.0)
+    with pytest.raises(ValueError):
+        parse_bbox("10,0,0,5")
+
+
+def test_nodes_query_parameters():
+    cypher, parameters = build_nodes_query(GraphMapQuery(
+        limit=10, cursor=encode_cursor(5, "x"), label="Aluno", since=10_000,
+    ))
+
+    assert "MATCH (n:Aluno)" in cypher
+    assert parameters["limit"] == 10
+    assert (parameters["after_changed_at"], parameters["after_id"]) == (5, "x")
+    assert parameters["since"] == 10_000 - graph_map.GRAPH_DELTA_OVERLAP_MS
+
+
+def test_cursor_walks_every_node_once():
+    # Vários nós com o mesmo _changed_at: o desempate é pelo elementId
+    nodes = [_node(i, changed_at=1000 + i // 3) for i in range(10)]
+    driver = FakeDriver(nodes, edges=[{
+        "id": "5:r:1", "source": "4:n:000", "target": "4:n:001", "type": "CURSA", "properties": {},
+    }])
+    service = GraphMapService(driver, cache=GraphMapCache(ttl_s=0))
+
+    seen, cursor, pages = [], None, []
+    while True:
+        page, _ = _page(service, limit=4, cursor=cursor)
+        pages.append(page)
+        seen += [node["id"] for node in page["nodes"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [node["id"] for node in nodes]
+    assert len(pages) == 3
+    assert pages[0]["edges"][0]["label"] == "CURSA"
+    assert pages[0]["nodes"][0]["data"]["properties"] == {"nome": "Aluno 0"}  # sem os campos internos
+    # A versão só avança na última página
+    assert [page["version"] for page in pages] == [0, 0, 1003]
+
+
+def test_delta_returns_only_recent_changes(monkeypatch):
+    monkeypatch.setattr(graph_map, "GRAPH_DELTA_OVERLAP_MS", 100)
+    nodes = [_node(0, 1000), _node(1, 5000), _node(2, 9000)]
+    service = GraphMapService(FakeDriver(nodes), cache=GraphMapCache(ttl_s=0))
+
+    page, _ = _page(service, since=8950)
+
+    assert [node["id"] for node in page["nodes"]] == ["4:n:002"]
+    assert page["delta"] is True
+    assert page["version"] == 9000
+
+    # A janela de sobreposição repete o que mudou logo antes de 'since'
+    page, _ = _page(service, since=9050)
+    assert [node["id"] for node in page["nodes"]] == ["4:n:002"]
+
+    page, _ = _page(service, since=9200)  # nada novo: a versão não volta
+    assert page["nodes"] == [] and page["version"] == 9200
+
+
+def test_pages_are_cached_until_the_writer_moves():
+    driver = FakeDriver([_node(0, 1000)])
+    writer = FakeWriter()
+    service = GraphMapService(driver, graph_writer=writer, cache=GraphMapCache(ttl_s=60))
+
+    _, etag = _page(service, limit=10)
+    _, etag_again = _page(service, limit=10)
+    assert driver.reads == 1
+    assert etag_again == etag
+
+    driver.nodes.append(_node(1, 2000))
+    writer.generation += 1  # o GraphWriter gravou um lote
+    page, new_etag = _page(service, limit=10)
+
+    assert driver.reads == 2
+    assert len(page["nodes"]) == 2
+    assert new_etag != etag
+
+
+def test_etag_matching():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc", "def"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"def"', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,94 @@
+# WAL do escritor em lote (core/graph_writer.py): um arquivo por processo,
+# reaplicação dos órfãos e truncagem só do próprio arquivo.
+
+import os
+import json
+
+import pytest
+
+from core import graph_writer
+from core.graph_writer import GraphWrite, GraphWriter, WriteAheadLog
+
+pytestmark = pytest.mark.skipif(graph_writer.fcntl is None, reason="requer fcntl (lock dos WALs)")
+
+
+class FakeDriver:
+    """Só o que o GraphWriter usa do driver Neo4j: session().execute_write(tx.run(...))."""
+
+    def __init__(self):
+        self.rows = []
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, work):
+        return work(self)
+
+    def run(self, query, rows):
+        self.rows.extend(rows)
+        return [{"i": row["i"], "node_id": f"n:{row['key']}"} for row in rows]
+
+
+def _write(seq, key):
+    return GraphWrite(seq, "Aluno", "cpf_aluno", key, {"nome": key}, "wal")
+
+
+def _wal_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".wal"))
+
+
+def test_orphan_wal_is_replayed_and_removed(tmp_path):
+    # WAL de um processo que caiu: o lock some junto com ele
+    crashed = WriteAheadLog(str(tmp_path))
+    crashed.append(_write(1, "111"))
+    crashed.append(_write(2, "222"))
+    crashed.mark_done([1])
+    crashed.close()
+
+    driver = FakeDriver()
+    writer = GraphWriter(driver, flush_interval_ms=1, wal_dir=str(tmp_path))
+    writer.close()
+
+    assert [row["key"] for row in driver.rows] == ["222"]
+    assert _wal_files(tmp_path) == []  # órfão adotado; o próprio apagado ao fechar sem pendências
+
+
+def test_live_wal_is_neither_replayed_nor_truncated(tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_writer, "GRAPH_WAL_MAX_BYTES", 0)  # trunca a cada lote
+    other = WriteAheadLog(str(tmp_path))  # outro processo, ainda vivo (lock preso)
+    other.append(_write(1, "pendente"))
+
+    driver = FakeDriver()
+    writer = GraphWriter(driver, flush_interval_ms=1, wal_dir=str(tmp_path))
+    assert writer.submit("Aluno", "cpf_aluno", "333", {}, ack="commit").result(timeout=5) == "n:333"
+
+    assert [row["key"] for row in driver.rows] == ["333"]
+    assert os.path.getsize(writer.wal.path) == 0  # o próprio WAL foi truncado
+    assert [record["key"] for record in other.pending()[0]] == ["pendente"]
+
+    writer.close()
+    assert _wal_files(tmp_path) == [os.path.basename(other.path)]
+    other.close()
+
+
+def test_adopted_entries_survive_a_second_crash(tmp_path):
+    legacy = tmp_path / "graph_writes.wal"  # nome do WAL único de antes
+    legacy.write_text(json.dumps({"seq": 7, "label": "Aluno", "primary_key": "cpf_aluno",
+                                  "key": "444", "data": {}}) + "\n", encoding="utf-8")
+
+    wal = WriteAheadLog(str(tmp_path))
+    adopted = wal.adopt_orphans(start_seq=0)
+    wal.close()  # cai antes de gravar no Neo4j
+
+    assert [(record["seq"], record["key"]) for record in adopted] == [(1, "444")]
+    assert not legacy.exists()
+
+    driver = FakeDriver()
+    GraphWriter(driver, flush_interval_ms=1, wal_dir=str(tmp_path)).close()
+    assert [row["key"] for row in driver.rows] == ["444"]
@@ -0,0 +1,92 @@
+# Fila de jobs (core/job_queue.py) sobre o fakeredis, com os scripts Lua de verdade.
+
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # os scripts Lua do fakeredis
+
+from core.job_queue import JobQueue, JobQueueFull, INFLIGHT_KEY
+
+
+@pytest.fixture
+def queue():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    return JobQueue(client, max_length=3, visibility_timeout_s=60, result_ttl_s=60, max_attempts=2)
+
+
+def test_claim_respects_priority_and_order(queue):
+    low = queue.submit("c", {"n": 1}, priority="low")
+    first = queue.submit("c", {"n": 2})
+    high = queue.submit("c", {"n": 3}, priority="high")
+
+    claimed = [queue.claim()["job_id"] for _ in range(3)]
+
+    assert claimed == [high, first, low]
+    assert queue.claim() is None
+    assert queue.depth() == {"high": 0, "normal": 0, "low": 0, "inflight": 3}
+
+
+def test_submit_rejects_when_full(queue):
+    for n in range(3):
+        queue.submit("c", {"n": n})
+    with pytest.raises(JobQueueFull):
+        queue.submit("c", {"n": 4})
+
+
+def test_claim_returns_input_and_run_id(queue):
+    job_id = queue.submit("c", {"file_path": "a.pdf"}, run_id="run-1")
+
+    job = queue.claim()
+
+    assert job == {"job_id": job_id, "chain_id": "c", "trigger_input": {"file_path": "a.pdf"},
+                   "run_id": "run-1", "resume": False}
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_expired_job_is_redelivered_with_resume_then_failed(queue):
+    job_id = queue.submit("c", {})
+    assert queue.claim()["run_id"] == job_id  # sem 'run_id': o próprio job_id
+
+    # O worker morreu: o prazo em 'inflight' vence
+    queue.redis_client.zadd(INFLIGHT_KEY, {job_id: time.time() - 1})
+    assert queue.requeue_expired() == 1
+    assert queue.get(job_id)["status"] == "queued"
+
+    redelivered = queue.claim()
+    assert redelivered["job_id"] == job_id
+    assert redelivered["resume"] is True  # retoma dos passos já concluídos
+
+    # Segunda tentativa também abandonada: atingiu 'max_attempts'
+    queue.redis_client.zadd(INFLIGHT_KEY, {job_id: time.time() - 1})
+    queue.requeue_expired()
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert queue.claim() is None
+
+
+def test_heartbeat_keeps_job_in_flight(queue):
+    job_id = queue.submit("c", {})
+    queue.claim()
+    queue.redis_client.zadd(INFLIGHT_KEY, {job_id: time.time() - 1})
+
+    queue.heartbeat(job_id)
+
+    assert queue.requeue_expired() == 0
+
+
+def test_complete_stores_result_and_chain_errors_fail(queue):
+    ok, broken = queue.submit("c", {}), queue.submit("c", {})
+    queue.claim(), queue.claim()
+
+    queue.complete(ok, {"output": 1})
+    queue.complete(broken, {"error": "passo 2 falhou"})
+
+    assert queue.get(ok)["status"] == "succeeded"
+    assert queue.get(ok)["result"] == {"output": 1}
+    assert queue.get(broken)["status"] == "failed"
+    assert queue.get(broken)["error"] == "passo 2 falhou"
+    assert queue.depth()["inflight"] == 0
+    assert queue.redis_client.ttl("atomic:job:" + ok) > 0
@@ -0,0 +1,149 @@
+# Limite por modelo e coalescência ("singleflight") de core/llm_limiter.py.
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from core.llm_limiter import ModelLimiter, model_concurrency
+
+
+def test_identical_sync_calls_share_one_upstream_call():
+    limiter = ModelLimiter()
+    calls, release = [], threading.Event()
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return "resposta"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(limiter.call("m", "k", 2, upstream)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)  # todos chegam enquanto o líder ainda espera
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [("resposta", False)] + [("resposta", True)] * 4
+
+
+def test_sync_semaphore_limits_concurrent_calls_per_model():
+    limiter = ModelLimiter()
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def upstream():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=limiter.call, args=("m", f"k{i}", 2, upstream)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+
+
+def test_sync_followers_get_the_leader_error():
+    limiter = ModelLimiter()
+    started = threading.Event()
+
+    def upstream():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("Ollama caiu")
+
+    errors = []
+
+    def follower():
+        started.wait(5)
+        try:
+            limiter.call("m", "k", 1, lambda: "nunca")
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=follower)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        limiter.call("m", "k", 1, upstream)
+    thread.join()
+
+    assert len(errors) == 1
+    assert limiter._flights == {}
+
+
+def test_identical_async_calls_share_one_upstream_call():
+    limiter = ModelLimiter()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "resposta"
+
+    async def main():
+        return await asyncio.gather(*(limiter.acall("m", "k", 2, upstream) for _ in range(4)))
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert sorted(results) == [("resposta", False)] + [("resposta", True)] * 3
+
+
+def test_async_state_is_per_event_loop():
+    limiter = ModelLimiter()
+
+    async def upstream():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def main():
+        # Vários pedidos do mesmo modelo: o semáforo precisa ser do loop corrente
+        return await asyncio.gather(*(limiter.acall("m", f"k{i}", 1, upstream) for i in range(3)))
+
+    # Dois 'asyncio.run' seguidos (ex: job_worker, testes): cada um com seu loop
+    assert asyncio.run(main()) == [("ok", False)] * 3
+    assert asyncio.run(main()) == [("ok", False)] * 3
+
+    # E um loop em outra thread ao mesmo tempo que este
+    results = []
+    thread = threading.Thread(target=lambda: results.append(asyncio.run(main())))
+    thread.start()
+    assert asyncio.run(main()) == [("ok", False)] * 3
+    thread.join()
+    assert results == [[("ok", False)] * 3]
+
+
+def test_async_cancelled_follower_does_not_cancel_the_leader():
+    limiter = ModelLimiter()
+
+    async def upstream():
+        await asyncio.sleep(0.05)
+        return "resposta"
+
+    async def main():
+        leader = asyncio.ensure_future(limiter.acall("m", "k", 1, upstream))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(limiter.acall("m", "k", 1, upstream))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(main()) == ("resposta", False)
+
+
+def test_model_concurrency():
+    assert model_concurrency({"llm_config": {"max_concurrency": 0}}) == 1
+    assert model_concurrency({"llm_config": {"max_concurrency": 3}}) == 3
@@ -0,0 +1,176 @@
+# Pool de hosts do Ollama (core/ollama_pool.py): roteamento, failover, ejeção e hedging.
+
+import time
+import asyncio
+from collections import deque
+
+import pytest
+
+pytest.importorskip("ollama")  # is_failover_error usa os erros do cliente
+pytest.importorskip("httpx")
+
+from core import ollama_pool
+from core.ollama_pool import OllamaPool, OllamaUnavailable
+
+MODEL = "mistral:latest"
+
+
+class FakeClient:
+    """Cliente síncrono e assíncrono de um host: 'delay_s' e 'error' por host."""
+
+    def __init__(self, url, hosts):
+        self.url = url
+        self.hosts = hosts
+        self.calls = 0
+
+    def _behaviour(self):
+        self.calls += 1
+        return self.hosts[self.url]
+
+    def chat(self, model, **kwargs):
+        behaviour = self._behaviour()
+        time.sleep(behaviour.get("delay_s", 0))
+        if behaviour.get("error"):
+            raise behaviour["error"]
+        return {"message": {"content": self.url}}
+
+
+class FakeAsyncClient(FakeClient):
+    async def chat(self, model, **kwargs):
+        behaviour = self._behaviour()
+        if kwargs.get("stream"):
+            return self._stream(behaviour)
+        await asyncio.sleep(behaviour.get("delay_s", 0))
+        if behaviour.get("error"):
+            raise behaviour["error"]
+        return {"message": {"content": self.url}}
+
+    async def _stream(self, behaviour):
+        if behaviour.get("error"):
+            raise behaviour["error"]
+        for piece in ("a", "b"):
+            yield {"message": {"content": f"{self.url}:{piece}"}}
+
+
+def _pool(hosts):
+    clients = {}
+
+    def factory(kind):
+        def create(url):
+            clients[(kind, url)] = kind(url, hosts)
+            return clients[(kind, url)]
+        return create
+
+    pool = OllamaPool(list(hosts), factory(FakeClient), factory(FakeAsyncClient))
+    pool.clients = clients
+    return pool
+
+
+def _content(response):
+    return response["message"]["content"]
+
+
+def test_routes_to_the_host_with_the_model_loaded():
+    pool = _pool({"http://a": {}, "http://b": {}})
+    pool.hosts[1].loaded_models.add(MODEL)
+
+    assert _content(pool.chat("mistral", messages=[])) == "http://b"
+
+
+def test_routes_by_latency_and_load():
+    pool = _pool({"http://a": {}, "http://b": {}})
+    for host in pool.hosts:
+        host.loaded_models.add(MODEL)
+    pool.hosts[0].latency_s[MODEL] = 0.1
+    pool.hosts[1].latency_s[MODEL] = 1.0
+    assert _content(pool.chat(MODEL, messages=[])) == "http://a"
+
+    pool.hosts[0].in_flight = 20  # a mais rápida, mas lotada
+    assert _content(pool.chat(MODEL, messages=[])) == "http://b"
+
+
+def test_connection_error_fails_over_and_ejects_the_host(monkeypatch):
+    monkeypatch.setattr(ollama_pool, "OLLAMA_EJECT_AFTER", 2)
+    pool = _pool({"http://a": {"error": ConnectionError("recusado")}, "http://b": {}})
+    pool.hosts[0].loaded_models.add(MODEL)  # a preferida é a que está fora do ar
+
+    assert _content(pool.chat(MODEL, messages=[])) == "http://b"
+    assert _content(pool.chat(MODEL, messages=[])) == "http://b"
+
+    assert pool.hosts[0].ejected_until > time.monotonic()  # 2 falhas seguidas
+    pool.chat(MODEL, messages=[])
+    assert pool.clients[(FakeClient, "http://a")].calls == 2  # ejetada: não é mais tentada
+
+
+def test_request_errors_do_not_fail_over():
+    pool = _pool({"http://a": {"error": ValueError("prompt inválido")}, "http://b": {}})
+    pool.hosts[0].loaded_models.add(MODEL)
+
+    with pytest.raises(ValueError):
+        pool.chat(MODEL, messages=[])
+    assert (FakeClient, "http://b") not in pool.clients
+
+
+def test_model_missing_everywhere():
+    pool = _pool({"http://a": {}})
+    pool.hosts[0].installed_models = {"outro:latest"}
+
+    with pytest.raises(OllamaUnavailable):
+        pool.chat(MODEL, messages=[])
+
+
+def _warm(pool, latency_s=0.05):
+    for host in pool.hosts:
+        host.loaded_models.add(MODEL)
+    pool._latencies[MODEL] = deque([latency_s] * ollama_pool.OLLAMA_HEDGE_MIN_SAMPLES)
+
+
+def test_hedged_call_returns_the_faster_host():
+    pool = _pool({"http://slow": {"delay_s": 1.0}, "http://fast": {"delay_s": 0.01}})
+    _warm(pool)
+    pool.hosts[1].in_flight = 1  # a lenta é escolhida primeiro
+
+    started = time.monotonic()
+    response = pool.chat(MODEL, hedge=True, messages=[])
+
+    assert _content(response) == "http://fast"
+    assert time.monotonic() - started < 0.8
+
+
+def test_no_hedging_without_enough_samples():
+    pool = _pool({"http://a": {"delay_s": 0.1}, "http://b": {}})
+    for host in pool.hosts:
+        host.loaded_models.add(MODEL)
+    pool.hosts[1].in_flight = 1
+
+    assert _content(pool.chat(MODEL, hedge=True, messages=[])) == "http://a"
+    assert (FakeClient, "http://b") not in pool.clients
+
+
+def test_async_hedged_call_returns_the_faster_host_and_cancels_the_other():
+    pool = _pool({"http://slow": {"delay_s": 1.0}, "http://fast": {"delay_s": 0.01}})
+    _warm(pool)
+    pool.hosts[1].in_flight = 1
+
+    async def main():
+        started = time.monotonic()
+        response = await pool.achat(MODEL, hedge=True, messages=[])
+        await asyncio.sleep(0)  # deixa o cancelamento do perdedor rodar
+        return response, time.monotonic() - started
+
+    response, elapsed = asyncio.run(main())
+
+    assert _content(response) == "http://fast"
+    assert elapsed < 0.8
+    assert pool.hosts[0].in_flight == 0  # o pedido cancelado foi contabilizado
+
+
+def test_async_stream_fails_over_before_the_first_chunk():
+    pool = _pool({"http://a": {"error": ConnectionError("recusado")}, "http://b": {}})
+    pool.hosts[0].loaded_models.add(MODEL)
+
+    async def main():
+        stream = await pool.achat(MODEL, messages=[], stream=True)
+        return [_content(chunk) async for chunk in stream]
+
+    assert asyncio.run(main()) == ["http://b:a", "http://b:b"]
@@ -0,0 +1,56 @@
+# Cache dos prompts de sistema (core/prompt_cache.py): reconstrói só quando um módulo muda no disco.
+
+import os
+
+from core.prompt_cache import MemoizedPromptBuilder
+
+
+class CountingBuilder:
+    """Faz o papel do PromptBuilder: lê os módulos do disco a cada 'build'."""
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.builds = 0
+
+    def build(self, modules):
+        self.builds += 1
+        parts = []
+        for module in modules:
+            with open(os.path.join(self.base_path, module), encoding="utf-8") as f:
+                parts.append(f.read())
+        return "\n".join(parts)
+
+
+def _setup(tmp_path):
+    (tmp_path / "persona.md").write_text("Você é um extrator.", encoding="utf-8")
+    (tmp_path / "regras.md").write_text("Responda em JSON.", encoding="utf-8")
+    builder = CountingBuilder(str(tmp_path))
+    return builder, MemoizedPromptBuilder(builder, str(tmp_path))
+
+
+def test_same_modules_are_built_once(tmp_path):
+    builder, cache = _setup(tmp_path)
+
+    first = cache.build(["persona.md", "regras.md"])
+    second = cache.build(["persona.md", "regras.md"])
+
+    assert first == second == "Você é um extrator.\nResponda em JSON."
+    assert builder.builds == 1
+
+    cache.build(["persona.md"])  # outra lista, outra entrada
+    assert builder.builds == 2
+
+
+def test_changed_module_is_rebuilt(tmp_path):
+    builder, cache = _setup(tmp_path)
+    cache.build(["persona.md", "regras.md"])
+
+    path = tmp_path / "regras.md"
+    path.write_text("Responda em YAML.", encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert cache.build(["persona.md", "regras.md"]).endswith("Responda em YAML.")
+    assert builder.builds == 2
+    cache.build(["persona.md", "regras.md"])
+    assert builder.builds == 2
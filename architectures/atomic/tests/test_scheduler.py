@@ -0,0 +1,131 @@
+# Escalonador de passos (core/scheduler.py): grafo de dependências, ordem e paralelismo.
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from core.scheduler import (
+    StepExecutionError, arun_dag, build_step_graph, extract_step_dependencies, run_dag, step_levels
+)
+
+# OCR -> (extração, resumo) em paralelo -> gravação, que usa os dois
+STEPS = [
+    {"name": "ocr", "input": "$.input_trigger.file_path"},
+    {"name": "extracao", "input": "$.steps[0].raw"},
+    {"name": "resumo", "input": "$.steps[0].raw", "prompt": "Resuma."},
+    {"name": "gravacao", "input": {"dados": "$.steps[1].json", "nota": ["$.steps[2].texto"]}},
+]
+
+
+def test_dependencies_come_from_input_and_prompt():
+    assert extract_step_dependencies({"input": ["$.steps[0].a", {"b": "$.steps[2].b"}],
+                                      "prompt": "Use {{ $.steps[1].c }}"}) == {0, 1, 2}
+    assert extract_step_dependencies({"input": "$.input_trigger.x"}) == set()
+
+
+def test_graph_and_levels():
+    graph = build_step_graph(STEPS)
+
+    assert graph == [set(), {0}, {0}, {1, 2}]
+    assert step_levels(graph) == [[0], [1, 2], [3]]
+
+
+def test_reference_to_a_later_step_is_rejected():
+    with pytest.raises(ValueError, match="não o antecedem"):
+        build_step_graph([{"name": "a", "input": "$.steps[1].x"}, {"name": "b"}])
+
+
+def _recorder(delays=None, fail=None):
+    events, lock = [], threading.Lock()
+
+    def execute(index):
+        with lock:
+            events.append(("start", index))
+        time.sleep((delays or {}).get(index, 0.02))
+        if index == fail:
+            raise RuntimeError(f"passo {index} falhou")
+        with lock:
+            events.append(("end", index))
+
+    return events, execute
+
+
+def _position(events, event):
+    return events.index(event)
+
+
+def test_steps_wait_for_their_dependencies_and_siblings_overlap():
+    events, execute = _recorder(delays={1: 0.1, 2: 0.1})
+
+    run_dag(build_step_graph(STEPS), execute, max_parallel=4)
+
+    assert _position(events, ("end", 0)) < _position(events, ("start", 1))
+    assert _position(events, ("end", 0)) < _position(events, ("start", 2))
+    # Extração e resumo rodam juntos
+    assert _position(events, ("start", 2)) < _position(events, ("end", 1))
+    assert _position(events, ("end", 1)) < _position(events, ("start", 3))
+    assert _position(events, ("end", 2)) < _position(events, ("start", 3))
+
+
+def test_max_parallel_one_is_the_yaml_order():
+    events, execute = _recorder()
+
+    run_dag(build_step_graph(STEPS), execute, max_parallel=1)
+
+    assert events == [(kind, index) for index in range(4) for kind in ("start", "end")]
+
+
+def test_max_parallel_is_respected():
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def execute(index):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.03)
+        with lock:
+            running[0] -= 1
+
+    run_dag([set() for _ in range(8)], execute, max_parallel=3)
+
+    assert peak[0] == 3
+
+
+def test_failure_stops_new_steps_and_reports_the_first_in_yaml_order():
+    events, execute = _recorder(delays={1: 0.05, 2: 0.01}, fail=2)
+
+    with pytest.raises(StepExecutionError) as error:
+        run_dag(build_step_graph(STEPS), execute, max_parallel=4)
+
+    assert error.value.step_index == 2
+    assert isinstance(error.value.cause, RuntimeError)
+    assert ("end", 1) in events  # o que já rodava termina
+    assert ("start", 3) not in events  # nada novo começa
+
+
+def test_async_dag_respects_dependencies_and_overlaps_siblings():
+    events = []
+
+    async def execute(index):
+        events.append(("start", index))
+        await asyncio.sleep(0.05 if index in (1, 2) else 0.01)
+        events.append(("end", index))
+
+    asyncio.run(arun_dag(build_step_graph(STEPS), execute, max_parallel=4))
+
+    assert events[:2] == [("start", 0), ("end", 0)]
+    assert set(events[2:4]) == {("start", 1), ("start", 2)}
+    assert events[-2:] == [("start", 3), ("end", 3)]
+
+
+def test_async_failure_is_step_execution_error():
+    async def execute(index):
+        if index == 1:
+            raise ValueError("quebrou")
+
+    with pytest.raises(StepExecutionError) as error:
+        asyncio.run(arun_dag(build_step_graph(STEPS), execute, max_parallel=2))
+
+    assert error.value.step_index == 1
@@ -0,0 +1,72 @@
+# Cache semântico (core/semantic_cache.py): dados quase iguais nunca recebem a resposta de outro.
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from core.semantic_cache import SemanticCache, semantic_cache_settings
+
+TASK = "Valide os dados do aluno e retorne JSON com 'valido' e 'erros'."
+
+
+def _messages(task, context):
+    return [
+        {"role": "system", "content": "Você valida dados de matrícula."},
+        {"role": "user", "content": f"Tarefa:\n{task}\n\nContexto para analisar:\n---\n{context}\n---"},
+    ]
+
+
+def _student(cpf="123.456.789-00", birth="2010-05-15", year="2010"):
+    return (f'{{"nome_aluno":"Maria Souza","cpf_aluno":"{cpf}","data_nascimento":"{birth}",'
+            f'"ano_ingresso":"{year}","responsavel":"Ana Souza"}}')
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(lambda: None, backend_name="local", embedder_spec="hash")
+
+
+def _answer(cache, settings, task, context):
+    """Busca; se errar, grava uma resposta que identifica o contexto."""
+    lookup = cache.lookup("m", _messages(task, context), None, settings, task)
+    if lookup.content is None:
+        cache.store(lookup, f"resposta para {context}", settings["ttl_s"])
+    return lookup
+
+
+@pytest.mark.parametrize("near_duplicate", [
+    _student(cpf="123.456.789-09"),
+    _student(birth="2010-05-35"),
+    _student(year="2011"),
+])
+def test_near_duplicate_data_misses(cache, near_duplicate):
+    settings = semantic_cache_settings({"llm_config": {"semantic_cache": {"enabled": True}}})
+    _answer(cache, settings, TASK, _student())
+
+    lookup = _answer(cache, settings, TASK, near_duplicate)
+
+    assert lookup.content is None
+
+
+def test_same_data_with_reworded_task_hits(cache):
+    settings = semantic_cache_settings({"llm_config": {"semantic_cache": {"enabled": True}}})
+    _answer(cache, settings, TASK, _student())
+
+    lookup = _answer(cache, settings, "  " + TASK.upper(), _student())
+
+    assert lookup.content == f"resposta para {_student()}"
+
+
+def test_prompt_match_compares_the_whole_message(cache):
+    # O motivo do padrão 'task': comparando a mensagem inteira, o CPF vizinho passaria do limiar
+    settings = semantic_cache_settings({"llm_config": {"semantic_cache": {"enabled": True, "match": "prompt"}}})
+    _answer(cache, settings, TASK, _student())
+
+    lookup = _answer(cache, settings, TASK, _student(cpf="123.456.789-09"))
+
+    assert lookup.similarity > settings["threshold"]
+
+
+def test_invalid_match_is_rejected():
+    with pytest.raises(ValueError):
+        semantic_cache_settings({"llm_config": {"semantic_cache": {"match": "tudo"}}})
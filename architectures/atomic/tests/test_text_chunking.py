@@ -0,0 +1,94 @@
+# Extração em pedaços (core/text_chunking.py): divisão nos títulos e junção dos JSONs.
+
+from core.text_chunking import chunking_settings, merge_extractions, split_sections
+
+
+def _document(sections=6, paragraph_chars=700):
+    parts = ["# Ficha de Matrícula"]
+    for i in range(sections):
+        parts.append(f"## Seção {i}\n\n" + ("texto " * (paragraph_chars // 6)).strip())
+    return "\n\n".join(parts)
+
+
+def test_short_text_is_one_chunk():
+    assert split_sections("# Título\n\ncurto", 500) == ["# Título\n\ncurto"]
+
+
+def test_chunks_respect_max_chars_and_keep_all_text():
+    document = _document()
+    chunks = split_sections(document, 1000)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    for i in range(6):
+        assert sum(f"## Seção {i}" in chunk for chunk in chunks) >= 1
+
+
+def test_chunks_carry_parent_headings():
+    chunks = split_sections(_document(), 1000)
+
+    # Cada pedaço depois do primeiro começa com o título do documento acima dele
+    assert all(chunk.startswith("# Ficha de Matrícula") for chunk in chunks)
+
+
+def test_long_section_is_cut_at_paragraphs_with_its_heading():
+    body = "\n\n".join("parágrafo " * 40 for _ in range(6))
+    chunks = split_sections(f"## Observações\n\n{body}", 900)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 900 for chunk in chunks)
+    assert all(chunk.startswith("## Observações") for chunk in chunks)
+
+
+def test_text_without_paragraphs_is_cut_hard():
+    chunks = split_sections("x" * 2500, 1000)
+    assert len(chunks) == 3
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert "".join(chunks) == "x" * 2500
+
+
+def test_merge_fills_fields_from_different_chunks():
+    merged, conflicts = merge_extractions([
+        {"nome_aluno": "Maria", "cpf_aluno": None},
+        {"nome_aluno": "", "cpf_aluno": "123.456.789-00"},
+    ])
+    assert merged == {"nome_aluno": "Maria", "cpf_aluno": "123.456.789-00"}
+    assert conflicts == {}
+
+
+def test_merge_votes_on_conflicts_and_ties_go_to_the_first_chunk():
+    merged, conflicts = merge_extractions([
+        {"telefone": "11 1111-1111", "turma": "A"},
+        {"telefone": "11 2222-2222", "turma": "B"},
+        {"telefone": "11 2222-2222"},
+    ])
+    assert merged == {"telefone": "11 2222-2222", "turma": "A"}
+    assert conflicts == {"telefone": ["11 1111-1111", "11 2222-2222"], "turma": ["A", "B"]}
+
+
+def test_merge_empty_values_never_win_or_conflict():
+    merged, conflicts = merge_extractions([{"a": None, "b": [], "c": {}}, {"a": "", "b": [], "c": {}}])
+    assert merged == {"a": None, "b": None, "c": None}
+    assert conflicts == {}
+
+
+def test_merge_lists_and_nested_objects():
+    merged, conflicts = merge_extractions([
+        {"disciplinas": ["mat", "port"], "responsavel": {"nome": "Ana", "cpf": None}},
+        {"disciplinas": ["port", {"x": 1}], "responsavel": {"nome": "Bia", "cpf": "1"}},
+        {"disciplinas": [{"x": 1}], "responsavel": {"nome": "Ana"}},
+    ])
+    assert merged == {"disciplinas": ["mat", "port", {"x": 1}], "responsavel": {"nome": "Ana", "cpf": "1"}}
+    assert list(conflicts) == ["responsavel.nome"]
+
+
+def test_merge_with_fields_fixes_the_result_keys():
+    merged, _ = merge_extractions([{"a": 1, "extra": 2}], fields=["a", "b"])
+    assert merged == {"a": 1, "b": None}
+
+
+def test_settings():
+    assert chunking_settings({"llm_config": {}}) is None
+    settings = chunking_settings({"llm_config": {"chunking": {"max_chars": 10}}})
+    assert settings["max_chars"] == 500  # mínimo
+    assert settings["text_field"] == "raw_markdown_content"
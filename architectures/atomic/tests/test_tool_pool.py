@@ -0,0 +1,118 @@
+# Pool de workers das ferramentas locais (core/tool_pool.py): reciclagem,
+# descarte e quem espera por um worker livre.
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+from core.tool_pool import ToolWorkerPool, ToolWorkerError
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "organisms", "tools")
+
+# Ferramenta de teste: dorme 'sleep_s', manda um chunk e responde com o pid;
+# 'die' derruba o processo no meio do pedido
+FAKE_TOOL = f"""
+import os, sys, time
+sys.path.insert(0, {TOOLS_DIR!r})
+from worker_protocol import serve_worker
+
+def handle(input_data, emit_chunk):
+    if input_data.get("die"):
+        os._exit(1)
+    time.sleep(input_data.get("sleep_s", 0))
+    emit_chunk({{"parcial": True}})
+    return {{"pid": os.getpid()}}
+
+serve_worker(handle, streaming=True)
+"""
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / "fake_tool.py"
+    path.write_text(FAKE_TOOL, encoding="utf-8")
+    return str(path)
+
+
+def _concurrent(pool, inputs):
+    results, errors = [None] * len(inputs), []
+
+    def run(i):
+        try:
+            results[i] = pool.call(inputs[i])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_waiter_gets_a_new_worker_when_one_is_recycled(script):
+    pool = ToolWorkerPool(script, size=1, max_requests=1, timeout_s=5)
+    try:
+        started = time.monotonic()
+        results, errors = _concurrent(pool, [{"sleep_s": 0.3}, {"sleep_s": 0.3}])
+        elapsed = time.monotonic() - started
+    finally:
+        pool.close()
+
+    assert errors == []
+    pids = {result["output"]["pid"] for result in results}
+    assert len(pids) == 2  # o primeiro worker saiu ao atingir 'max_requests'
+    assert elapsed < 4  # o segundo pedido não esperou o timeout inteiro
+
+
+def test_waiter_gets_a_new_worker_when_one_dies(script):
+    pool = ToolWorkerPool(script, size=1, timeout_s=5)
+    try:
+        started = time.monotonic()
+        results, errors = _concurrent(pool, [{"die": True}, {"sleep_s": 0.1}])
+        elapsed = time.monotonic() - started
+    finally:
+        pool.close()
+
+    assert len(errors) == 1 and isinstance(errors[0], ToolWorkerError)
+    assert sum(result is not None for result in results) == 1
+    assert elapsed < 4
+
+
+def test_caller_error_frees_the_slot(script):
+    pool = ToolWorkerPool(script, size=1, timeout_s=2)
+
+    def broken_chunk(chunk):
+        raise ValueError("consumidor quebrou")
+
+    try:
+        with pytest.raises(ValueError):
+            pool.call({}, on_chunk=broken_chunk)
+        # A vaga do worker descartado volta: o próximo pedido cria outro
+        assert "pid" in pool.call({})["output"]
+        assert pool._created == 1
+    finally:
+        pool.close()
+
+
+def test_idle_worker_is_reused(script):
+    pool = ToolWorkerPool(script, size=2, timeout_s=5)
+    try:
+        first = pool.call({})["output"]["pid"]
+        second = pool.call({})["output"]["pid"]
+    finally:
+        pool.close()
+
+    assert first == second
+    assert first != os.getpid()
+
+
+def test_closed_pool_rejects_calls(script):
+    pool = ToolWorkerPool(script, size=1, timeout_s=1)
+    pool.close()
+    with pytest.raises(ToolWorkerError):
+        pool.call({})
@@ -68,8 +68,10 @@ function App() {
   );
 
   // TODO: Adicionar lógica useEffect() para buscar nós/arestas da 'api_mcp'
+  // (GET /api/v1/graph/map é paginado: siga 'next_cursor' e, depois,
+  // consulte periodicamente com 'since=<version>' fazendo upsert por id)
   // useEffect(() => {
-  //   axios.get('/api/v1/cognitive-map').then((response) => {
+  //   axios.get('/api/v1/graph/map', { params: { limit: 500 } }).then((response) => {
   //     setNodes(response.data.nodes);
   //     setEdges(response.data.edges);
   //   });